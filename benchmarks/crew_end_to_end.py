@@ -0,0 +1,348 @@
+from benchmarks.fake_exa import FakeExaServer
+from benchmarks.fake_firecrawl import FakeFirecrawlServer
+from benchmarks.fake_llm import FakeChatServer
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Topic scenarios, each run in its own process with cold caches against the same fake servers
+SCENARIOS = {
+    # The default settings. The direct search overrides the fan-out, so this measures the direct search, not the agent sub-pipelines of fan_out_agent_search
+    "fan_out": {
+        "topic": "US Presidential Debate 2024 Harris vs Trump",
+        "settings": {},
+    },
+    "fan_out_map_reduce": {
+        "topic": "US Presidential Debate 2024 Harris vs Trump",
+        "settings": {"synthesis_mode": "map_reduce"},
+    },
+    "fan_out_unpipelined": {
+        "topic": "US Presidential Debate 2024 Harris vs Trump",
+        "settings": {"pipelined": False},
+    },
+    "fan_out_agent_search": {
+        "topic": "US Presidential Debate 2024 Harris vs Trump",
+        "settings": {"direct_search": False},
+    },
+    "sequential_bulk_scraping": {
+        "topic": "Federal Reserve interest rate decision",
+        "settings": {"fan_out": False, "direct_search": False},
+    },
+    "sequential_bulk_scraping_unpipelined": {
+        "topic": "Federal Reserve interest rate decision",
+        "settings": {"fan_out": False, "direct_search": False, "pipelined": False},
+    },
+    "sequential_agents": {
+        "topic": "Federal Reserve interest rate decision",
+        "settings": {"fan_out": False, "bulk_scraping": False},
+    },
+    "batch": {
+        "topics": [
+            "US Presidential Debate 2024 Harris vs Trump",
+            "Federal Reserve interest rate decision",
+            "Hurricane season forecast",
+            "Supreme Court immigration ruling",
+            "Student loan forgiveness plan",
+            "Electric vehicle tariffs on China",
+            "Border wall funding bill",
+            "Minimum wage increase proposal",
+        ],
+        "settings": {},
+        "max_parallel_topics": 4,
+    },
+}
+
+# API keys the crew reads from st.session_state, accepted by the fake servers
+FAKE_API_KEYS = ("aiml_api_key", "exa_api_key", "firecrawl_api_key")
+
+
+def run_crew_script(topic: str, settings: dict):
+    """
+    Runs the crew inside a Streamlit script run, so the crew and its worker threads can read st.session_state like in the app.
+
+    This function is executed as a standalone script by AppTest, so it imports everything it needs itself. The result is stored in st.session_state["benchmark_result"].
+
+    :param topic: The topic of the run.
+    :param settings: The keyword arguments of UnbiasedNewsCrew besides the topic and the country.
+    """
+
+    import streamlit as st
+    import time
+    from utils.crews import UnbiasedNewsCrew
+
+    start_time = time.time()
+
+    crew = UnbiasedNewsCrew(
+        topic=topic,
+        selected_country="United States",
+        on_token=lambda chunk: None,
+        **settings,
+    )
+
+    crew_response = crew.start_news_agents()
+
+    wall_ms = int((time.time() - start_time) * 1000)
+
+    st.session_state["benchmark_result"] = {
+        "wall_ms": wall_ms,
+        "output_chars": len(crew_response.raw),
+        "tokens": {
+            "total_tokens": crew_response.token_usage.total_tokens,
+            "prompt_tokens": crew_response.token_usage.prompt_tokens,
+            "completion_tokens": crew_response.token_usage.completion_tokens,
+            "successful_requests": crew_response.token_usage.successful_requests,
+        },
+        "run_details": {
+            key: value
+            for key, value in crew.run_details.items()
+            if isinstance(value, (int, float, str, bool, dict))
+        },
+        "spans": crew.tracer.summary(),
+    }
+
+
+def run_batch(topics: list, settings: dict, max_parallel_topics: int) -> dict:
+    """
+    Runs a batch of topics outside of a Streamlit script run, like a script or a cron job would, passing the API keys to the batch.
+
+    :param topics: The topics of the batch.
+    :param settings: The crew template of the batch.
+    :param max_parallel_topics: The maximum number of topics written at the same time.
+    :return: A dictionary with the wall time, the summary of the batch and the result of every topic.
+    """
+
+    from utils.batch import BatchNewsRun
+
+    batch = BatchNewsRun(
+        topics,
+        max_parallel_topics=max_parallel_topics,
+        crew_template=settings,
+        api_keys={key: "fake" for key in FAKE_API_KEYS},
+    )
+
+    # Record the topics in the order they complete
+    results = [
+        {
+            "topic": result["topic"],
+            "status": result["status"],
+            "error": result["error"],
+            "queued_ms": result["queued_ms"],
+            "elapsed_ms": result["elapsed_ms"],
+            "total_tokens": result["token_usage"].get("total_tokens", 0),
+        }
+        for result in batch.run()
+    ]
+
+    summary = batch.summary()
+
+    return {
+        "wall_ms": summary["wall_ms"],
+        "summary": summary,
+        "results": results,
+    }
+
+
+def run_scenario(name: str, timeout: int) -> dict:
+    """
+    Runs a scenario in the current process and returns its measurements.
+
+    :param name: The name of the scenario in SCENARIOS.
+    :param timeout: The maximum run time of the scenario in seconds.
+    :return: A dictionary with the wall time, output size, token usage, run details, spans per stage, task, LLM call and tool call, the rate limiter counters per provider, and the peak memory of the process. Batch scenarios report their summary and the result of every topic instead.
+    """
+
+    from streamlit.testing.v1 import AppTest
+    from utils.ratelimit import rate_limiters
+
+    scenario = SCENARIOS[name]
+
+    # Batch scenarios write all their topics through one BatchNewsRun, without the app
+    if "topics" in scenario:
+        result = run_batch(
+            scenario["topics"],
+            scenario["settings"],
+            scenario["max_parallel_topics"],
+        )
+    else:
+        app = AppTest.from_function(
+            run_crew_script,
+            args=(scenario["topic"], scenario["settings"]),
+            default_timeout=timeout,
+        )
+
+        for key in FAKE_API_KEYS:
+            app.session_state[key] = "fake"
+
+        app.run(timeout=timeout)
+
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+        result = dict(app.session_state["benchmark_result"])
+
+    result["rate_limits"] = {
+        provider: rate_limiter.stats()
+        for provider, rate_limiter in rate_limiters.items()
+    }
+
+    # Peak resident memory of the process, in kilobytes on Linux
+    result["peak_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+
+    return {"scenario": name, **scenario, **result}
+
+
+def run_scenario_process(name: str, servers: dict, args) -> dict:
+    """
+    Runs a scenario in a child process against the fake servers, with a fresh on-disk cache.
+
+    :param name: The name of the scenario in SCENARIOS.
+    :param servers: The running fake servers by API.
+    :param args: The parsed command line arguments.
+    :return: The measurements of the scenario, with the number of requests every fake server received and throttled.
+    """
+
+    requests_before = {api: server.requests for api, server in servers.items()}
+    throttled_before = {api: server.throttled for api, server in servers.items()}
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {
+            **os.environ,
+            "AIML_API_BASE": f"{servers['llm'].url}/v1",
+            "EXA_API_BASE": servers["exa"].url,
+            "FIRECRAWL_API_URL": servers["firecrawl"].url,
+            "CREW_NEWS_CACHE_PATH": os.path.join(cache_dir, "crew_news.sqlite3"),
+            "OTEL_SDK_DISABLED": "true",
+        }
+
+        if args.rate_limits:
+            env["CREW_NEWS_RATE_LIMITS"] = args.rate_limits
+
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.crew_end_to_end",
+                "--run-scenario",
+                name,
+                "--timeout",
+                str(args.timeout),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=args.timeout + 60,
+        )
+
+    if process.returncode != 0:
+        return {
+            "scenario": name,
+            "error": process.stderr.strip().splitlines()[-1:],
+        }
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+
+    result["requests"] = {
+        api: server.requests - requests_before[api] for api, server in servers.items()
+    }
+
+    result["throttled"] = {
+        api: server.throttled - throttled_before[api] for api, server in servers.items()
+    }
+
+    return result
+
+
+# Run the crew end to end against local fake servers, e.g.: python -m benchmarks.crew_end_to_end --output bench.json
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure UnbiasedNewsCrew end to end against local test doubles of the LLM, Exa and Firecrawl APIs."
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+    )
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--completion-tokens", type=int, default=600)
+    parser.add_argument("--max-searches", type=int, default=3)
+    parser.add_argument("--malformed-json-every", type=int, default=0)
+    parser.add_argument("--invalid-json-every", type=int, default=0)
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SECONDS",
+        help="Latency of a single model, overriding --llm-latency, e.g., to make the small model faster. Can be given several times.",
+    )
+    parser.add_argument("--exa-latency", type=float, default=0.3)
+    parser.add_argument("--exa-text-bytes", type=int, default=4000)
+    parser.add_argument("--firecrawl-latency", type=float, default=0.2)
+    parser.add_argument("--page-bytes", type=int, default=20000)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument(
+        "--rate-limits",
+        help='Optional rate limits of the crew, e.g., "aiml=20:40,exa=10:10".',
+    )
+    parser.add_argument("--timeout", type=int, default=600)
+    parser.add_argument("--output", help="Optional path of the JSON report.")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # Run a single scenario in this process, as a child of the benchmark
+    if args.run_scenario:
+        print(json.dumps(run_scenario(args.run_scenario, args.timeout)))
+
+        sys.exit(0)
+
+    with FakeChatServer(
+        latency_seconds=args.llm_latency,
+        completion_tokens=args.completion_tokens,
+        max_searches=args.max_searches,
+        malformed_json_every=args.malformed_json_every,
+        invalid_json_every=args.invalid_json_every,
+        model_latencies={
+            model: float(seconds)
+            for model, _, seconds in (
+                model_latency.rpartition("=") for model_latency in args.model_latency
+            )
+        },
+    ) as llm_server, FakeExaServer(
+        latency_seconds=args.exa_latency,
+        text_bytes=args.exa_text_bytes,
+    ) as exa_server, FakeFirecrawlServer(
+        latency_seconds=args.firecrawl_latency,
+        page_bytes=args.page_bytes,
+    ) as firecrawl_server:
+        servers = {"llm": llm_server, "exa": exa_server, "firecrawl": firecrawl_server}
+
+        # Throttle every n-th request of every API, to measure retries under rate limits
+        for server in servers.values():
+            server.throttle_every = args.throttle_every
+
+        start_time = time.time()
+
+        results = [run_scenario_process(name, servers, args) for name in args.scenarios]
+
+    report = {
+        "benchmark": "crew_end_to_end",
+        "config": {
+            key: value for key, value in vars(args).items() if key != "run_scenario"
+        },
+        "elapsed_s": round(time.time() - start_time, 3),
+        "scenarios": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+
+    print(json.dumps(report, indent=4))
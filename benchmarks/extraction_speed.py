@@ -0,0 +1,56 @@
+from utils.extraction import extract_article
+import argparse
+import json
+import time
+
+# Boilerplate and article paragraphs of a synthetic news page
+NAVIGATION = "\n".join(
+    f"* [Section {index}](https://news.example.com/section-{index})"
+    for index in range(30)
+)
+PARAGRAPH = "Lawmakers met on Tuesday to debate the proposal, with supporters arguing it would lower costs for families while critics warned about its long-term effect on the budget."
+FOOTER = "Subscribe to our newsletter\n\n© 2024 Example News. All rights reserved. [Privacy Policy](https://news.example.com/privacy) | [Terms of Use](https://news.example.com/terms)"
+
+# Measure the article extraction on one core, e.g.: python -m benchmarks.extraction_speed --pages 1000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the speed and savings of the local article extraction."
+    )
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=40)
+
+    args = parser.parse_args()
+
+    markdown = "\n\n".join(
+        [
+            NAVIGATION,
+            "# Lawmakers debate the proposal",
+            "By Jane Doe, Example News",
+            "Sep 10, 2024",
+            *[PARAGRAPH] * args.paragraphs,
+            NAVIGATION,
+            FOOTER,
+        ]
+    )
+
+    start_time = time.perf_counter()
+
+    for _ in range(args.pages):
+        article = extract_article(markdown, {"sourceURL": "https://news.example.com/a"})
+
+    elapsed_s = time.perf_counter() - start_time
+
+    print(
+        json.dumps(
+            {
+                "config": vars(args),
+                "results": {
+                    "page_bytes": len(markdown.encode("utf-8")),
+                    "pages_per_s": round(args.pages / elapsed_s, 1),
+                    "bytes_saved_per_page": article["bytes_saved"],
+                    "tokens_saved_per_page": article["tokens_saved"],
+                },
+            },
+            indent=4,
+        )
+    )
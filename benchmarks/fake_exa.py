@@ -0,0 +1,97 @@
+from benchmarks.fake_server import FakeServer
+import re
+import time
+
+# Domain names in a search query, e.g., "cnn.com"
+DOMAIN_PATTERN = re.compile(r"\b((?:[a-z0-9-]+\.)+[a-z]{2,})\b")
+
+
+class FakeExaServer(FakeServer):
+    def __init__(
+        self,
+        latency_seconds: float = 0.3,
+        text_bytes: int = 4000,
+        summary_bytes: int = 400,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initializes a local test double of the Exa search API that serves canned results.
+
+        Every POST /search request waits for the configured latency and returns the requested number of results, shaped like a real Exa response. If the request includes domains, or the query names a domain, e.g., "cnn.com", the results are URLs on that domain, so the scraped pages can be attributed to their media provider. POST /contents returns the text of the given URLs.
+
+        :param latency_seconds: How long every request takes in seconds.
+        :param text_bytes: The size of the full text of every result in bytes.
+        :param summary_bytes: The size of the summary of every result in bytes.
+        :param host: The host to listen on.
+        :param port: The port to listen on, 0 picks a free port.
+
+        :return: An instance of FakeExaServer.
+        """
+
+        super().__init__(host=host, port=port)
+
+        self.latency_seconds = latency_seconds
+        self.text_bytes = text_bytes
+        self.summary_bytes = summary_bytes
+
+    def _result(self, url: str, index: int) -> dict:
+        """
+        Returns a canned result for the given URL.
+
+        :param url: The URL of the result.
+        :param index: The rank of the result.
+        :return: The result, shaped like an Exa result.
+        """
+
+        sentence = f"Canned coverage of the topic published on {url}. "
+
+        return {
+            "id": url,
+            "url": url,
+            "title": f"Canned article {index + 1}",
+            "score": round(1 - index / 100, 2),
+            "publishedDate": "2024-09-11T00:00:00.000Z",
+            "author": "Canned Author",
+            "text": (sentence * (self.text_bytes // len(sentence) + 1))[
+                : self.text_bytes
+            ],
+            "summary": (sentence * (self.summary_bytes // len(sentence) + 1))[
+                : self.summary_bytes
+            ],
+        }
+
+    def handle_post(self, path: str, body: dict, handler) -> dict:
+        """
+        Answers a search or contents request with canned results.
+
+        :param path: The path of the request, "/search" or "/contents".
+        :param body: The JSON body of the request.
+        :param handler: The request handler.
+        :return: The search response.
+        """
+
+        time.sleep(self.latency_seconds)
+
+        if path.startswith("/contents"):
+            urls = body.get("ids", [])
+        else:
+            query = body.get("query", "").lower()
+
+            # Restrict the results to the first included domain, as a domain-filtered search does
+            domain_match = DOMAIN_PATTERN.search(query)
+            domain = (body.get("includeDomains") or [None])[0] or (
+                domain_match.group(1) if domain_match else "example.com"
+            )
+
+            slug = "-".join(re.findall(r"[a-z0-9]+", query))[:60]
+
+            urls = [
+                f"https://www.{domain.removeprefix('www.')}/news/{slug}-{index + 1}"
+                for index in range(body.get("numResults", 10))
+            ]
+
+        return {
+            "results": [self._result(url, index) for index, url in enumerate(urls)],
+            "resolvedSearchType": body.get("type", "neural"),
+        }
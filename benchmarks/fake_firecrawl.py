@@ -0,0 +1,60 @@
+from benchmarks.fake_server import FakeServer
+import time
+
+
+class FakeFirecrawlServer(FakeServer):
+    def __init__(
+        self,
+        latency_seconds: float = 0.2,
+        page_bytes: int = 20000,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initializes a local test double of the Firecrawl scrape API that serves canned pages.
+
+        Every POST /v1/scrape request waits for the configured latency and returns a markdown page of the configured size, shaped like a real Firecrawl response.
+
+        :param latency_seconds: How long every scrape request takes in seconds.
+        :param page_bytes: The size of the markdown of every page in bytes.
+        :param host: The host to listen on.
+        :param port: The port to listen on, 0 picks a free port.
+
+        :return: An instance of FakeFirecrawlServer.
+        """
+
+        super().__init__(host=host, port=port)
+
+        self.latency_seconds = latency_seconds
+        self.page_bytes = page_bytes
+
+    def handle_post(self, path: str, body: dict, handler) -> dict:
+        """
+        Answers a scrape request with a canned page of the configured size.
+
+        :param path: The path of the request.
+        :param body: The JSON body of the request, with the "url" to scrape.
+        :param handler: The request handler.
+        :return: The scrape response.
+        """
+
+        time.sleep(self.latency_seconds)
+
+        url = body.get("url", "")
+
+        paragraph = f"This is canned written content scraped from {url}. "
+        markdown = "# Canned article\n\n" + paragraph * (
+            self.page_bytes // len(paragraph) + 1
+        )
+
+        return {
+            "success": True,
+            "data": {
+                "markdown": markdown[: self.page_bytes],
+                "metadata": {
+                    "title": "Canned article",
+                    "sourceURL": url,
+                    "statusCode": 200,
+                },
+            },
+        }
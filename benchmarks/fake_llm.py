@@ -0,0 +1,243 @@
+from benchmarks.fake_server import FakeServer
+import json
+import re
+import time
+
+# Role of the agent in a CrewAI prompt, e.g., "You are Senior unbiased journalist."
+ROLE_PATTERN = re.compile(r"You are (Senior [\w ]+?)\.")
+
+# Domain names of media providers in a task description
+DOMAIN_PATTERN = re.compile(r"\b((?:[a-z0-9-]+\.)+(?:com|org|net|news|us))\b")
+
+# URLs in task context and written content
+URL_PATTERN = re.compile(r"https?://[^\s\"'\]\),]+")
+
+# URLs of the results listed by the Exa custom tool
+RESULT_URL_PATTERN = re.compile(r'"url":\s*"([^"]+)"')
+
+# Start of the agent's own scratchpad in a CrewAI prompt, after the task description
+SCRATCHPAD_MARKER = "Begin! This is VERY important to you"
+
+
+class FakeChatServer(FakeServer):
+    def __init__(
+        self,
+        latency_seconds: float = 1.0,
+        completion_tokens: int = 600,
+        max_searches: int = 3,
+        malformed_json_every: int = 0,
+        invalid_json_every: int = 0,
+        model_latencies: dict = None,
+        chunk_chars: int = 16,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initializes a local test double of an OpenAI-compatible chat completions API with scripted answers for the CrewNews agents.
+
+        The answer depends on the role of the agent in the prompt. The written content expert searches its media providers with the Exa custom tool, one search per media provider up to max_searches, and answers with the URLs it found. The text extraction expert scrapes the first URL of its task with the Firecrawl custom tool and answers with its written content. Every other agent, and every prompt sent outside of an agent, is answered with a canned article of the configured length that cites the URLs of its prompt. Streamed requests are answered as server-sent events.
+
+        :param latency_seconds: How long every completion takes before its first token in seconds.
+        :param completion_tokens: The approximate length of canned articles in tokens.
+        :param max_searches: The maximum number of searches of the written content expert per task.
+        :param malformed_json_every: If set, every n-th JSON answer is wrapped in prose and a markdown code fence and has a trailing comma, like LLMs sometimes answer.
+        :param invalid_json_every: If set, every n-th JSON answer is prose without any JSON, which can't be repaired locally.
+        :param model_latencies: Optional latency in seconds by model name, overriding latency_seconds, e.g., to make a small model faster.
+        :param chunk_chars: The number of characters per streamed chunk.
+        :param host: The host to listen on.
+        :param port: The port to listen on, 0 picks a free port.
+
+        :return: An instance of FakeChatServer.
+        """
+
+        super().__init__(host=host, port=port)
+
+        self.latency_seconds = latency_seconds
+        self.completion_tokens = completion_tokens
+        self.max_searches = max_searches
+        self.malformed_json_every = malformed_json_every
+        self.invalid_json_every = invalid_json_every
+        self.model_latencies = model_latencies or {}
+        self.json_answers = 0
+        self.chunk_chars = chunk_chars
+
+    def _answer(self, prompt: str) -> str:
+        """
+        Returns the scripted answer to a CrewAI prompt.
+
+        :param prompt: All messages of the request joined.
+        :return: The answer in the format the CrewAI agent parser expects.
+        """
+
+        role_match = ROLE_PATTERN.search(prompt)
+        role = role_match.group(1) if role_match else ""
+
+        task, _, scratchpad = prompt.partition(SCRATCHPAD_MARKER)
+        observations = scratchpad.count("Observation:")
+
+        if role == "Senior written content expert":
+            domains = [
+                domain
+                for domain in dict.fromkeys(DOMAIN_PATTERN.findall(task.lower()))
+                if "mediaprovider" not in domain
+            ]
+
+            if observations < min(len(domains), self.max_searches):
+                return (
+                    "Thought: I should search the next media provider.\n"
+                    "Action: Exa custom tool\n"
+                    f'Action Input: {{"question": "{domains[observations]} news"}}'
+                )
+
+            news_urls = list(dict.fromkeys(RESULT_URL_PATTERN.findall(scratchpad)))
+
+            return self._json_answer([{"news_urls": news_urls}])
+
+        if role == "Senior text extraction expert":
+            urls = [
+                url for url in URL_PATTERN.findall(task) if "mediaprovider" not in url
+            ]
+
+            if urls and not observations:
+                return (
+                    "Thought: I should scrape the first URL.\n"
+                    "Action: Firecrawl custom tool\n"
+                    f'Action Input: {{"url": "{urls[0]}"}}'
+                )
+
+            if observations:
+                return self._json_answer(
+                    [{"news_content": [scratchpad.split("Observation:")[-1].strip()]}]
+                )
+
+        # Write a canned article citing the URLs of the prompt
+        sources = list(
+            dict.fromkeys(
+                url.rstrip(".")
+                for url in URL_PATTERN.findall(prompt)
+                if "mediaprovider" not in url
+            )
+        )[:10]
+
+        sentence = (
+            "Canned unbiased coverage that weighs the views of every media provider. "
+        )
+        body = (sentence * (self.completion_tokens * 4 // len(sentence) + 1))[
+            : self.completion_tokens * 4
+        ]
+
+        # Answer prompts sent outside of a CrewAI agent, e.g., the streamed unbiased news, without the agent format
+        prefix = (
+            "Thought: I now can give a great answer\nFinal Answer: "
+            if SCRATCHPAD_MARKER in prompt
+            else ""
+        )
+
+        return (
+            prefix + body + "\n\nSources:\n" + "\n".join(f"- {url}" for url in sources)
+        )
+
+    def _json_answer(self, items: list) -> str:
+        """
+        Returns the final answer of an agent with the given JSON, malformed every malformed_json_every answers.
+
+        :param items: The JSON array of the answer.
+        :return: The answer in the format the CrewAI agent parser expects.
+        """
+
+        self.json_answers += 1
+
+        if self.invalid_json_every and self.json_answers % self.invalid_json_every == 0:
+            answer = "I couldn't find what you asked for, please try again later."
+        elif (
+            self.malformed_json_every
+            and self.json_answers % self.malformed_json_every == 0
+        ):
+            answer = f"Here is the JSON you asked for:\n```json\n{json.dumps(items)[:-1]},]\n```\nLet me know if you need anything else."
+        else:
+            answer = json.dumps(items)
+
+        return f"Thought: I now can give a great answer\nFinal Answer: {answer}"
+
+    def handle_post(self, path: str, body: dict, handler):
+        """
+        Answers a chat completion request, streamed or not.
+
+        :param path: The path of the request, e.g., "/v1/chat/completions".
+        :param body: The JSON body of the request.
+        :param handler: The request handler, to write streamed responses.
+        :return: The chat completion, or None if it was streamed.
+        """
+
+        time.sleep(self.model_latencies.get(body.get("model"), self.latency_seconds))
+
+        prompt = "\n".join(
+            str(message.get("content", "")) for message in body.get("messages", [])
+        )
+
+        answer = self._answer(prompt)
+
+        # Cut the answer at the first stop sequence, the way the real API does
+        for stop in body.get("stop") or []:
+            if stop in answer:
+                answer = answer[: answer.index(stop)]
+
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(answer) // 4,
+            "total_tokens": len(prompt) // 4 + len(answer) // 4,
+        }
+
+        completion = {
+            "id": "chatcmpl-fake",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+        }
+
+        if not body.get("stream"):
+            return {
+                **completion,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        # Stream the answer as server-sent events, with the usage last if it was asked for
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        events = [
+            {
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": answer[index : index + self.chunk_chars]},
+                        "finish_reason": None,
+                    }
+                ]
+            }
+            for index in range(0, len(answer), self.chunk_chars)
+        ]
+
+        events.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({"choices": [], "usage": usage})
+
+        for event in events:
+            handler.wfile.write(
+                f"data: {json.dumps({**completion, 'object': 'chat.completion.chunk', **event})}\n\n".encode(
+                    "utf-8"
+                )
+            )
+
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.close_connection = True
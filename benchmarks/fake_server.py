@@ -0,0 +1,141 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+
+class FakeServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initializes a local test double of an HTTP JSON API. Subclasses answer requests in handle_post.
+
+        The server keeps connections alive and counts requests and connections, so connection reuse can be measured. If throttle_every is set, every n-th request is answered with 429 Too Many Requests instead, so rate limiting and retries can be measured.
+
+        :param host: The host to listen on.
+        :param port: The port to listen on, 0 picks a free port.
+
+        :return: An instance of FakeServer.
+        """
+
+        self.requests = 0
+        self.connections = 0
+        self.throttled = 0
+
+        # Answer every n-th request with 429 and the given Retry-After header, 0 never throttles
+        self.throttle_every = 0
+        self.retry_after = "0"
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        Returns the base URL of the server, to be used as the API URL of the client.
+
+        :return: The base URL.
+        """
+
+        host, port = self._server.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+    def handle_post(self, path: str, body: dict, handler: BaseHTTPRequestHandler):
+        """
+        Answers a POST request. Subclasses either return a JSON-serializable response or write a streamed response to the handler themselves and return None.
+
+        :param path: The path of the request.
+        :param body: The JSON body of the request.
+        :param handler: The request handler, to write streamed responses.
+        :return: The JSON-serializable response, or None if the response was already written.
+        """
+
+        raise NotImplementedError
+
+    def _handler(self):
+        """
+        Returns the request handler class bound to this server.
+
+        :return: A BaseHTTPRequestHandler subclass.
+        """
+
+        server = self
+
+        class FakeHandler(BaseHTTPRequestHandler):
+            # Keep connections alive so connection reuse can be measured
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                body = json.loads(
+                    self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}"
+                )
+
+                with server._lock:
+                    server.requests += 1
+
+                    throttled = (
+                        server.throttle_every
+                        and server.requests % server.throttle_every == 0
+                    )
+
+                    if throttled:
+                        server.throttled += 1
+
+                if throttled:
+                    self.send_response(429)
+                    self.send_header("Retry-After", server.retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+                    return
+
+                response = server.handle_post(self.path, body, self)
+
+                if response is None:
+                    return
+
+                response = json.dumps(response).encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeHandler
+
+    def start(self):
+        """
+        Starts the server in a background thread.
+
+        :return: The server itself.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
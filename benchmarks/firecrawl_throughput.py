@@ -0,0 +1,80 @@
+from benchmarks.fake_firecrawl import FakeFirecrawlServer
+from utils.scraping import FirecrawlBulkScraper
+import argparse
+import json
+import time
+
+# Measure the bulk scraper against the local Firecrawl test double, e.g.: python -m benchmarks.firecrawl_throughput --urls 100
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of the bulk Firecrawl scraper against a local test double."
+    )
+    parser.add_argument("--urls", type=int, default=60)
+    parser.add_argument("--hosts", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--page-bytes", type=int, default=20000)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--per-host-limit", type=int, default=2)
+
+    args = parser.parse_args()
+
+    urls = [
+        f"https://news{index % args.hosts}.example.com/article-{index}"
+        for index in range(args.urls)
+    ]
+
+    results = {}
+
+    # Scrape one URL after another, the way the text extraction expert does
+    with FakeFirecrawlServer(args.latency, args.page_bytes) as server:
+        sequential_scraper = FirecrawlBulkScraper(
+            api_key="fake",
+            api_url=server.url,
+            max_workers=1,
+            per_host_limit=1,
+        )
+
+        start_time = time.time()
+
+        for url in urls:
+            sequential_scraper.scrape_url(url)
+
+        results["sequential"] = {
+            "elapsed_s": round(time.time() - start_time, 3),
+            "pages_per_s": round(len(urls) / (time.time() - start_time), 2),
+            "connections": server.connections,
+        }
+
+    # Scrape all URLs through the bulk scraper
+    with FakeFirecrawlServer(args.latency, args.page_bytes) as server:
+        bulk_scraper = FirecrawlBulkScraper(
+            api_key="fake",
+            api_url=server.url,
+            max_workers=args.max_workers,
+            per_host_limit=args.per_host_limit,
+        )
+
+        start_time = time.time()
+
+        first_page_s = None
+        failed = 0
+
+        for scraped_page in bulk_scraper.scrape_urls(urls, poll_interval=0.05):
+            if first_page_s is None:
+                first_page_s = round(time.time() - start_time, 3)
+
+            failed += "error" in scraped_page
+
+        results["bulk"] = {
+            "elapsed_s": round(time.time() - start_time, 3),
+            "first_page_s": first_page_s,
+            "pages_per_s": round(len(urls) / (time.time() - start_time), 2),
+            "connections": server.connections,
+            "failed": failed,
+        }
+
+    results["speedup"] = round(
+        results["sequential"]["elapsed_s"] / results["bulk"]["elapsed_s"], 2
+    )
+
+    print(json.dumps({"config": vars(args), "results": results}, indent=4))
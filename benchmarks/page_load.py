@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Main app file, so the page links of the sidebar resolve
+MAIN_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "1_Home.py"
+)
+
+# News Generator page, measured from a fresh process
+PAGE_PATH = os.path.join("pages", "2_News_Generator.py")
+
+# Modules that are expensive to import and only needed once a search is run
+HEAVY_MODULES = (
+    "crewai",
+    "crewai_tools",
+    "langchain_openai",
+    "agentops",
+    "exa_py",
+    "firecrawl",
+)
+
+# API keys the page reads from st.session_state
+FAKE_API_KEYS = ("aiml_api_key", "exa_api_key", "firecrawl_api_key", "agentops_api_key")
+
+
+def measure_page(reruns: int, timeout: int) -> dict:
+    """
+    Loads the News Generator page in the current process, which must be fresh, and reruns it the way every widget interaction does.
+
+    :param reruns: The number of reruns after the first load.
+    :param timeout: The maximum time of a single run in seconds.
+    :return: A dictionary with the time to import Streamlit, the time of the first load, the time of every rerun, the heavy modules imported by the page and the time the first search pays to import the crew.
+    """
+
+    start_time = time.perf_counter()
+
+    from streamlit.testing.v1 import AppTest
+
+    streamlit_import_ms = (time.perf_counter() - start_time) * 1000
+
+    app = AppTest.from_file(MAIN_PATH, default_timeout=timeout)
+
+    for key in FAKE_API_KEYS:
+        app.session_state[key] = "fake"
+
+    app.switch_page(PAGE_PATH)
+
+    start_time = time.perf_counter()
+
+    app.run()
+
+    first_load_ms = (time.perf_counter() - start_time) * 1000
+
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+    heavy_modules = [module for module in HEAVY_MODULES if module in sys.modules]
+
+    rerun_ms = []
+
+    for _ in range(reruns):
+        start_time = time.perf_counter()
+
+        app.run()
+
+        rerun_ms.append((time.perf_counter() - start_time) * 1000)
+
+    # Measure the import the first search pays for, in the background job
+    start_time = time.perf_counter()
+
+    import utils.crews
+
+    first_search_import_ms = (time.perf_counter() - start_time) * 1000
+
+    return {
+        "streamlit_import_ms": round(streamlit_import_ms, 1),
+        "first_load_ms": round(first_load_ms, 1),
+        "rerun_ms": [round(elapsed_ms, 1) for elapsed_ms in rerun_ms],
+        "heavy_modules_on_load": heavy_modules,
+        "first_search_import_ms": round(first_search_import_ms, 1),
+    }
+
+
+# Measure the cold start and warm reruns of the News Generator page, e.g.: python -m benchmarks.page_load --processes 5
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the cold start and warm rerun time of the News Generator page."
+    )
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--output", help="Optional path of the JSON report.")
+    parser.add_argument("--run-child", action="store_true", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # Measure the page in this process, as a child of the benchmark
+    if args.run_child:
+        print(json.dumps(measure_page(args.reruns, args.timeout)))
+
+        sys.exit(0)
+
+    # Start every measurement in a fresh process, so nothing is imported or initialized yet
+    runs = []
+
+    for _ in range(args.processes):
+        start_time = time.perf_counter()
+
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.page_load",
+                "--run-child",
+                "--reruns",
+                str(args.reruns),
+                "--timeout",
+                str(args.timeout),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=args.timeout * (args.reruns + 2) + 60,
+        )
+
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+        run = json.loads(process.stdout.strip().splitlines()[-1])
+        run["process_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+
+        runs.append(run)
+
+    all_rerun_ms = sorted(elapsed_ms for run in runs for elapsed_ms in run["rerun_ms"])
+
+    report = {
+        "benchmark": "page_load",
+        "config": {
+            key: value for key, value in vars(args).items() if key != "run_child"
+        },
+        "results": {
+            "cold_start_ms": statistics.median(
+                run["streamlit_import_ms"] + run["first_load_ms"] for run in runs
+            ),
+            "first_load_ms": statistics.median(run["first_load_ms"] for run in runs),
+            "warm_rerun_p50_ms": statistics.median(all_rerun_ms),
+            "warm_rerun_p95_ms": all_rerun_ms[int(len(all_rerun_ms) * 0.95) - 1],
+            "first_search_import_ms": statistics.median(
+                run["first_search_import_ms"] for run in runs
+            ),
+            "heavy_modules_on_load": sorted(
+                {module for run in runs for module in run["heavy_modules_on_load"]}
+            ),
+        },
+        "runs": runs,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+
+    print(json.dumps(report, indent=4))
@@ -1,6 +1,7 @@
 import streamlit as st
-from utils.crews import UnbiasedNewsCrew
-import agentops
+from utils.concurrency import DEFAULT_MAX_WORKERS
+from utils.quota import DEFAULT_URLS_PER_PROVIDER, DEFAULT_PROVIDERS_PER_LEANING
+from utils.registry import LEANINGS
 import time
 
 # Solve error when deploying Streamlit app on Streamlit Cloud: "Your system has an unsupported version of sqlite3. Chroma requires sqlite3 >= 3.35.0. Please visit https://docs.trychroma.com/troubleshooting#sqlite to learn how to upgrade."
@@ -9,6 +10,43 @@ import sys
 
 sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
 
+# How often the page polls a running news job in seconds
+JOB_POLL_INTERVAL_SECONDS = 1
+
+
+@st.cache_resource(show_spinner=False)
+def init_agentops(
+    api_key: str,
+):
+    """
+    Initializes AgentOps once per process and API key, instead of on every rerun.
+
+    AgentOps is imported here, so the page doesn't pay for importing it until the first search.
+
+    Parameters:
+        api_key (str): The AgentOps API key.
+
+    Returns:
+        module: The initialized agentops module.
+    """
+
+    import agentops
+
+    # Initialize AgentOps
+    agentops.init(
+        api_key=api_key,
+        default_tags=[
+            "agentops",
+            "llama-3.1-70b",
+            "exa",
+            "firecrawl",
+        ],
+        auto_start_session=False,
+        skip_auto_end_session=True,
+    )
+
+    return agentops
+
 
 def format_time(
     milliseconds: int,
@@ -38,6 +76,425 @@ def format_time(
         return f"{minutes}min {seconds}s"
 
 
+def render_cached_article(
+    cached_article: dict,
+):
+    """
+    Renders an unbiased news article served from the article cache.
+
+    Parameters:
+        cached_article (dict): The cached article as returned by ArticleCache.get_article.
+
+    Returns:
+        None
+    """
+
+    # Render status container
+    with st.status(
+        label="CrewNews found a fresh unbiased version of the news for a similar topic! ⚡",
+        state="complete",
+        expanded=True,
+    ):
+        # Render response
+        st.write(cached_article["raw"])
+
+        # Render divider
+        st.divider()
+
+        # Render article cache details, counted since the server started
+        from utils.jobs import article_cache
+
+        article_cache_stats = article_cache.stats()
+
+        # Reder run details
+        st.markdown(
+            body=f"""
+                <h4>Run Details</h4>
+                <div>
+                    Served from cache: yes, written {format_time(int((time.time() - cached_article["created_at"]) * 1000))} ago for "{cached_article["topic"]}" ({cached_article["similarity"]:.0%} topic match)<br>
+                    Tokens saved: {cached_article["token_usage"].get("total_tokens", 0)}<br>
+                </div>
+                <br>
+
+                <div>
+                    Article cache hits: {article_cache_stats["hits"]} ({article_cache_stats["hit_rate"]:.0%} hit rate)<br>
+                    Article cache size: {article_cache_stats["entries"]} articles, {article_cache_stats["bytes"] / 1024:.0f} KB<br>
+                    Tokens saved by the article cache: {article_cache_stats["tokens_saved"]}<br>
+                </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+
+def render_news_job(
+    job,
+):
+    """
+    Renders the status, progress and result of a background news job.
+
+    While the job is queued or running, the page renders what the job has produced so far and reruns itself
+    after a short interval to poll the job again. Reruns, e.g., from widget interactions, reattach to the
+    same job instead of restarting it.
+
+    Parameters:
+        job (NewsJob): The news job of the session.
+
+    Returns:
+        None
+    """
+
+    # Import the job manager here, since the page only needs it once the session has a job
+    from utils.jobs import (
+        job_manager,
+        AGENT_STOPPED_OUTPUT,
+        QUEUED,
+        FAILED,
+        CANCELLED,
+    )
+
+    # Render status container
+    with st.status(
+        label="Just a moment! I'm coordinating with my AI agent coworkers... Unfortunately, one of them seems to be on a coffee break. Just kidding! This might take us 2-3 minutes. Go grab yourself a coffee—just don't be surprised if I ask for a refill!",
+        state="running",
+        expanded=True,
+    ) as status:
+        # Render progress messages of the crew above the streamed response
+        for message in job.progress:
+            st.write(f"✔️ {message}")
+
+        response_placeholder = st.empty()
+
+        # If the job is still queued or running, render the response streamed so far and poll the job again
+        if not job.finished:
+            if job.status == QUEUED:
+                # Update status
+                status.update(
+                    label=f"Waiting for a free AI agent crew... {job_manager.queue_position(job.id)} run(s) ahead of yours.",
+                    state="running",
+                )
+
+            response_placeholder.markdown(job.streamed_text)
+
+            # Render cancel button
+            if st.button(label="Cancel ✋"):
+                job_manager.cancel(job.id)
+
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+            st.rerun()
+
+        # If the job was cancelled, update status
+        if job.status == CANCELLED:
+            status.update(
+                label="CrewNews run cancelled. ✋",
+                state="error",
+            )
+
+        # If the job failed, update status and render error
+        elif job.status == FAILED:
+            # Update status
+            status.update(
+                label="CrewNews failed. ☹️",
+                state="error",
+            )
+
+            # Render error
+            st.error(
+                body=f"CrewNews failed with the following error: {job.error}",
+                icon="❌",
+            )
+
+        # If any of the agents stopped due to iteration limit or time limit, update status and render error
+        elif job.result.raw == AGENT_STOPPED_OUTPUT:
+            # Update status
+            status.update(
+                label="CrewNews stopped due to iteration limit or time limit. ☹️",
+                state="error",
+            )
+
+            # Render error
+            st.error(
+                body=f"{AGENT_STOPPED_OUTPUT} If you see this error, it's likely because the topic or question you entered is phrased in a way that AI agents behind the CrewNews couldn't pass to the AI tools in a way to get meaningful results. Please try to rephrase the topic or question.",
+                icon="❌",
+            )
+
+        # If CrewNews generated an unbiased version of the news, update status and render response
+        else:
+            # The job has imported the crew by now, so importing its modules for the run details is free
+            from utils.tools import scrape_cache, search_cache
+            from utils.agents import completion_cache
+            from utils.clients import client_registry
+            from utils.ratelimit import rate_limiters
+            from utils.tracing import DEFAULT_TRACE_PATH
+
+            crew = job.crew
+
+            crew_response = job.result
+
+            # Stop timer
+            stop_time = job.elapsed_ms
+
+            # Update status
+            status.update(
+                label="CrewNews successfully generated an unbiased version of the news! 🎉",
+                state="complete",
+            )
+
+            # Render response, replacing the streamed one
+            response_placeholder.markdown(crew_response.raw)
+
+            # Render divider
+            st.divider()
+
+            # Render fan-out details, comparing the wall-clock time with running the media providers one after another
+            fan_out_details = ""
+
+            if crew.run_details.get("fan_out"):
+                fan_out_details = f"""
+                    <div>
+                        Media providers: {crew.run_details["media_providers"]} from the {crew.run_details["media_provider_source"]} (searched {crew.run_details["max_workers"]} at a time, {crew.run_details["skipped_media_providers"]} not needed for the quotas)<br>
+                        Discovery time: {format_time(crew.run_details["discovery_ms"])}<br>
+                        Search and scrape time: {format_time(crew.run_details["fan_out_ms"])} (vs. {format_time(crew.run_details["sequential_estimate_ms"])} one after another)<br>
+                        Synthesis time: {format_time(crew.run_details["synthesis_ms"])}<br>
+                    </div>
+                    <br>
+                """
+
+            # Render direct search details, comparing the search time with running the queries one after another
+            if crew.run_details.get("search_mode") == "direct":
+                fan_out_details = f"""
+                    <div>
+                        Media providers: {crew.run_details["media_providers"]} from the {crew.run_details["media_provider_source"]} (searched {crew.run_details["max_workers"]} at a time, {crew.run_details["skipped_media_providers"]} not needed for the quotas)<br>
+                        Discovery time: {format_time(crew.run_details["discovery_ms"])}<br>
+                        Search time: {format_time(crew.run_details["direct_search_ms"])} (slowest query {format_time(crew.run_details["slowest_query_ms"])}, vs. {format_time(crew.run_details["sequential_search_estimate_ms"])} one after another)<br>
+                        Synthesis time: {format_time(crew.run_details["synthesis_ms"])}<br>
+                    </div>
+                    <br>
+                """
+
+            # Render map-reduce synthesis details, with the latency of every level
+            if crew.run_details.get("synthesis_mode") == "map_reduce":
+                fan_out_details += f"""
+                    <div>
+                        Digests: {crew.run_details["digests"]} (written {crew.run_details["synthesis_workers"]} at a time)<br>
+                        Digest level time: {format_time(crew.run_details["synthesis_map_ms"])} (slowest digest {format_time(crew.run_details["synthesis_digest_max_ms"])})<br>
+                        Merge level time: {format_time(crew.run_details["synthesis_reduce_ms"])}<br>
+                    </div>
+                    <br>
+                """
+
+            # Render the coverage of every political leaning by the URLs kept for the quotas
+            if "coverage" in crew.run_details:
+                coverage_details = "".join(
+                    f"{leaning.capitalize()}-leaning coverage: {leaning_coverage['urls']} URLs from {leaning_coverage['providers']} media providers{'' if leaning_coverage['met'] else ' (quota not met)'}<br>"
+                    for leaning, leaning_coverage in crew.run_details[
+                        "coverage"
+                    ].items()
+                )
+
+                fan_out_details += f"""
+                    <div>
+                        URLs of written content: {crew.run_details["discovery_urls"]} ({"quotas met" if crew.run_details["discovery_quota_met"] else "quotas not met"})<br>
+                        {coverage_details}
+                    </div>
+                    <br>
+                """
+
+            # Render bulk scraping details, including what the article extraction cut from the synthesis prompt
+            scraping_details = ""
+
+            if "scraped_urls" in crew.run_details:
+                scraping_details = f"""
+                    <div>
+                        Scraped URLs: {crew.run_details["scraped_urls"]} ({crew.run_details["failed_urls"]} failed)<br>
+                        Boilerplate stripped: {crew.run_details["bytes_saved"] / 1024:.0f} KB (~{crew.run_details["tokens_saved"]} tokens)<br>
+                        Near-duplicates removed: {crew.run_details.get("duplicate_articles", 0)} articles in {crew.run_details.get("duplicate_clusters", 0)} clusters (~{crew.run_details.get("duplicate_tokens_removed", 0)} tokens, {crew.run_details.get("duplicate_tokens_removed_share", 0):.0%} of the synthesis input)<br>
+                    </div>
+                    <br>
+                """
+
+            # Render the validation of the task outputs, with the share of outputs the LLM had to convert again
+            validation_details = "".join(
+                f"{task_name}: {task_validation['outputs']} outputs ({task_validation['repaired']} repaired locally, {task_validation['escalations']} escalated, {task_validation['retried'] + task_validation['failed']} retried by the LLM, {task_validation['retry_rate']:.0%} retry rate)<br>"
+                for task_name, task_validation in crew.run_details.get(
+                    "output_validation", {}
+                ).items()
+            )
+
+            # Render the LLM calls, latency and tokens of every model tier, and how many tasks were escalated to the large model
+            model_tier_details = "".join(
+                f"{tier.capitalize()} model ({tier_details['model']}): {tier_details['calls']} calls, {format_time(tier_details['avg_latency_ms'])} average latency, {tier_details['prompt_tokens']} prompt tokens, {tier_details['completion_tokens']} completion tokens<br>"
+                for tier, tier_details in crew.run_details.get(
+                    "model_tiers", {}
+                ).items()
+            )
+
+            if crew.run_details.get("output_escalations"):
+                model_tier_details += f"Tasks escalated to the large model: {crew.run_details['output_escalations']}<br>"
+
+            # Render scrape and search cache details, counted since the server started
+            scrape_cache_stats = scrape_cache.stats()
+
+            search_cache_stats = search_cache.stats()
+
+            completion_cache_stats = completion_cache.stats()
+
+            # Render connection reuse of the session's pooled API clients
+            client_details = "".join(
+                f"{client_stats['kind'].capitalize()} client: {client_stats['requests']} requests over {client_stats['connections']} connections ({client_stats['reuse_rate']:.0%} reused)<br>"
+                for client_stats in client_registry.stats(
+                    api_keys=[
+                        st.session_state["aiml_api_key"],
+                        st.session_state["exa_api_key"],
+                        st.session_state["firecrawl_api_key"],
+                    ]
+                )
+            )
+
+            # Render throttling of the API providers, shared by all sessions
+            rate_limit_details = "".join(
+                f"{rate_limit_stats['provider'].capitalize()} rate limit: {rate_limit_stats['queued_requests']} of {rate_limit_stats['requests']} requests queued ({format_time(int(rate_limit_stats['queue_wait_seconds'] * 1000))} waited), {rate_limit_stats['throttled']} throttled, {rate_limit_stats['server_errors']} server errors, {rate_limit_stats['retries']} retries, circuit {rate_limit_stats['circuit'].replace('_', '-')}<br>"
+                for rate_limit_stats in (
+                    rate_limiter.stats() for rate_limiter in rate_limiters.values()
+                )
+            )
+
+            # Render time to the first progress message and the first streamed token
+            responsiveness_details = ""
+
+            if "first_progress_ms" in crew.run_details:
+                responsiveness_details += f"Time to first progress: {format_time(crew.run_details['first_progress_ms'])}<br>"
+
+            if "first_token_ms" in crew.run_details:
+                responsiveness_details += f"Time to first token: {format_time(crew.run_details['first_token_ms'])}<br>"
+
+            # Render background job details, shared by all sessions
+            job_stats = job_manager.stats()
+
+            # Reder run details
+            st.markdown(
+                body=f"""
+                    <h4>Run Details</h4>
+                    <p>
+                        Total elapsed time: {format_time(stop_time)}<br>
+                        {responsiveness_details}
+                    </p>
+
+                    {fan_out_details}
+
+                    {scraping_details}
+
+                    <div>
+                        Total tokens used: {crew_response.token_usage.total_tokens}<br>
+                        Prompt tokens used: {crew_response.token_usage.prompt_tokens}<br>
+                        Completion tokens used: {crew_response.token_usage.completion_tokens}<br>
+                        Successful requests: {crew_response.token_usage.successful_requests}<br>
+                        LLM calls served from cache: {crew.run_details.get("llm_cache_hits", 0)} ({crew.run_details.get("llm_cache_prompt_tokens", 0)} prompt tokens, {crew.run_details.get("llm_cache_completion_tokens", 0)} completion tokens not sent to the API)<br>
+                    </div>
+                    <br>
+
+                    <div>
+                        {model_tier_details}
+                    </div>
+                    <br>
+
+                    <div>
+                        {validation_details}
+                    </div>
+                    <br>
+
+                    <div>
+                        Scrape cache hits: {scrape_cache_stats["hits"]} ({scrape_cache_stats["hit_rate"]:.0%} hit rate)<br>
+                        Scrape cache misses: {scrape_cache_stats["misses"]}<br>
+                        Scrape cache size: {scrape_cache_stats["entries"]} pages, {scrape_cache_stats["bytes"] / 1024 / 1024:.1f} MB<br>
+                        Search cache hits: {search_cache_stats["hits"]} ({search_cache_stats["hit_rate"]:.0%} hit rate)<br>
+                        Search cache misses: {search_cache_stats["misses"]}<br>
+                        Completion cache hits: {completion_cache_stats["hits"]} ({completion_cache_stats["hit_rate"]:.0%} hit rate)<br>
+                        Completion cache size: {completion_cache_stats["entries"]} completions, {completion_cache_stats["bytes"] / 1024:.0f} KB<br>
+                        Tokens saved by the completion cache: {completion_cache_stats["tokens_saved"]}<br>
+                    </div>
+                    <br>
+
+                    <div>
+                        {client_details}
+                    </div>
+                    <br>
+
+                    <div>
+                        {rate_limit_details}
+                    </div>
+                    <br>
+
+                    <div>
+                        Queued runs: {job_stats["queue_depth"]} (up to {job_stats["max_concurrent_jobs"]} runs at a time, {job_stats["running"]} running)<br>
+                    </div>
+                """,
+                unsafe_allow_html=True,
+            )
+
+            # Render the timeline of the stages of the run, where pipelined stages overlap
+            timeline = crew.tracer.timeline()
+
+            if timeline:
+                st.markdown(
+                    body="<h5>Timeline</h5>"
+                    + (
+                        f"<p>Scraping overlapped the search for {format_time(crew.run_details['stage_overlap_ms'])} (search waited {format_time(crew.run_details['pipeline_backpressure_ms'])} for the scraping workers)</p>"
+                        if "stage_overlap_ms" in crew.run_details
+                        else ""
+                    ),
+                    unsafe_allow_html=True,
+                )
+
+                st.vega_lite_chart(
+                    data=timeline,
+                    spec={
+                        "mark": {"type": "bar", "tooltip": True},
+                        "encoding": {
+                            "y": {
+                                "field": "name",
+                                "type": "nominal",
+                                "sort": None,
+                                "title": None,
+                            },
+                            "x": {
+                                "field": "start_ms",
+                                "type": "quantitative",
+                                "title": "Milliseconds since the start of the run",
+                            },
+                            "x2": {"field": "end_ms"},
+                        },
+                    },
+                    use_container_width=True,
+                )
+
+            # Render per-stage breakdown of the spans of the run: stages, tasks, LLM calls and tool calls
+            st.markdown(
+                body=f"<h5>Stage Breakdown</h5><p>Trace {crew.tracer.trace_id}, exported to {DEFAULT_TRACE_PATH}</p>",
+                unsafe_allow_html=True,
+            )
+
+            st.dataframe(
+                data=[
+                    {
+                        "Kind": group["kind"],
+                        "Name": group["name"],
+                        "Calls": group["calls"],
+                        "Wall time": format_time(group["wall_ms"]),
+                        "Prompt tokens": group["prompt_tokens"],
+                        "Completion tokens": group["completion_tokens"],
+                        "KB in": round(group["bytes_in"] / 1024, 1),
+                        "KB out": round(group["bytes_out"] / 1024, 1),
+                        "Retries": group["retries"],
+                        "Errors": group["errors"],
+                    }
+                    for group in crew.tracer.summary()
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+
+
 def main():
     """
     The main function for the News Generator page.
@@ -93,19 +550,6 @@ def main():
         unsafe_allow_html=True,
     )
 
-    # Initialize AgentOps
-    agentops.init(
-        api_key=st.session_state["agentops_api_key"],
-        default_tags=[
-            "agentops",
-            "llama-3.1-70b",
-            "exa",
-            "firecrawl",
-        ],
-        auto_start_session=False,
-        skip_auto_end_session=True,
-    )
-
     # Render sidebar
     with st.sidebar:
         # Render Home page link
@@ -196,6 +640,62 @@ def main():
             help="CrewNews will provide an unbiased version of the news for a given topic you enter by combining content from media providers from the United States across the political spectrum.",
         )
 
+        # Render advanced settings
+        with st.expander(label="Advanced settings"):
+            # Render slider for the number of media providers searched at the same time
+            max_workers = st.slider(
+                label="Media providers searched in parallel:",
+                min_value=1,
+                max_value=10,
+                value=DEFAULT_MAX_WORKERS,
+                help="CrewNews searches and scrapes every media provider in its own sub-pipeline. More parallel sub-pipelines make a run faster, but hit the APIs harder.",
+            )
+
+            # Render sliders for the URL quotas of the discovery stage
+            urls_per_provider = st.slider(
+                label="Articles per media provider:",
+                min_value=1,
+                max_value=5,
+                value=DEFAULT_URLS_PER_PROVIDER,
+                help="CrewNews stops searching a media provider as soon as it has this many articles on the topic.",
+            )
+
+            providers_per_leaning = st.slider(
+                label="Media providers per political leaning:",
+                min_value=1,
+                max_value=8,
+                value=DEFAULT_PROVIDERS_PER_LEANING,
+                help="CrewNews stops searching as soon as it has enough articles from this many left-, center- and right-leaning media providers each. Fewer media providers make a run faster and cheaper.",
+            )
+
+            # Render toggle for the map-reduce synthesis mode
+            map_reduce_synthesis = st.toggle(
+                label="Write digests per media provider first",
+                value=False,
+                help="For busy topics, CrewNews can write a short digest per media provider in parallel and merge the digests into the final article, instead of writing it from all content at once. This avoids overflowing the LLM context window.",
+            )
+
+            # Render toggle for the direct search stage
+            direct_search = st.toggle(
+                label="Search all media providers at once",
+                value=True,
+                help="CrewNews searches every media provider with one query restricted to its website and to recent articles, all at the same time. Turn it off to let an agent write the search queries, one media provider after another.",
+            )
+
+            # Render toggle for the model tiers of the agents
+            use_small_models = st.toggle(
+                label="Use a small model for lookups and searches",
+                value=True,
+                help="CrewNews looks up media providers and routes searches and scrapes with a small, fast model, and writes the unbiased news with the large model. If the small model gives an answer CrewNews can't use, the step is run again with the large model.",
+            )
+
+            # Render toggle for serving articles of similar topics from the cache
+            use_article_cache = st.toggle(
+                label="Reuse recent articles on similar topics",
+                value=True,
+                help="If someone asked CrewNews about a similar topic in the last few hours, CrewNews shows that article right away instead of writing a new one.",
+            )
+
         # Render search button
         search_button = st.button(
             label="Search 🚀",
@@ -203,16 +703,31 @@ def main():
             use_container_width=True,
         )
 
-    # If search button is clicked and user enters a question, start news agents
+    # If search button is clicked and user enters a question, serve a cached article or submit a news job
     if search_button and user_question:
-        # Render status container
-        with st.status(
-            label="Just a moment! I'm coordinating with my AI agent coworkers... Unfortunately, one of them seems to be on a coffee break. Just kidding! This might take us 2-3 minutes. Go grab yourself a coffee—just don't be surprised if I ask for a refill!",
-            state="running",
-            expanded=True,
-        ) as status:
-            # Start AgentOps session
-            agentops.start_session(
+        # Import the job manager and the tracing on the first search, so page loads and reruns before it stay light
+        from utils.jobs import job_manager, article_cache
+        from utils.tracing import start_metrics_server
+
+        # Start the Prometheus metrics endpoint of the traced spans, once per process
+        start_metrics_server()
+
+        # Cancel the previous job of the session if it's still running
+        if "news_job_id" in st.session_state:
+            job_manager.cancel(st.session_state.pop("news_job_id"))
+
+        # Look up a recent article on a similar topic
+        st.session_state["cached_article"] = (
+            article_cache.get_article(user_question, "United States")
+            if use_article_cache
+            else None
+        )
+
+        if st.session_state["cached_article"] is None:
+            # Start AgentOps session, initializing AgentOps once per process and API key. The job ends it once it is finished or cancelled
+            agentops_session = init_agentops(
+                st.session_state["agentops_api_key"]
+            ).start_session(
                 tags=[
                     "agentops",
                     "llama-3.1-70b",
@@ -221,70 +736,39 @@ def main():
                 ],
             )
 
-            # Start timer
-            start_time = time.time()
-
-            # Create an instance of the UnbiasedNewsCrew class
-            crew = UnbiasedNewsCrew(
-                selected_country="United States",
-                topic=user_question,
+            # Submit the crew run to the background job manager and remember its ID across reruns
+            st.session_state["news_job_id"] = job_manager.submit(
+                {
+                    "selected_country": "United States",
+                    "topic": user_question,
+                    "max_workers": max_workers,
+                    "urls_per_provider": urls_per_provider,
+                    "providers_per_leaning": providers_per_leaning,
+                    "total_articles": urls_per_provider
+                    * providers_per_leaning
+                    * len(LEANINGS),
+                    "synthesis_mode": (
+                        "map_reduce" if map_reduce_synthesis else "single"
+                    ),
+                    "direct_search": direct_search,
+                    # Run every agent on the large model if the small model is turned off
+                    **({} if use_small_models else {"role_tiers": {}}),
+                },
+                agentops_session=agentops_session,
             )
 
-            # Start the news generation process using the initialized crew
-            crew_response = crew.start_news_agents()
+    # Render the cached article of the session
+    if st.session_state.get("cached_article"):
+        render_cached_article(st.session_state["cached_article"])
 
-            # If any of the agents stopped due to iteration limit or time limit, update status and render error
-            if (
-                crew_response.raw
-                == "Agent stopped due to iteration limit or time limit."
-            ):
-                # Update status
-                status.update(
-                    label="CrewNews stopped due to iteration limit or time limit. ☹️",
-                    state="error",
-                )
+    # Reattach to the news job of the session on every rerun
+    if "news_job_id" in st.session_state:
+        from utils.jobs import job_manager
 
-                # Render error
-                st.error(
-                    body="Agent stopped due to iteration limit or time limit. If you see this error, it's likely because the topic or question you entered is phrased in a way that AI agents behind the CrewNews couldn't pass to the AI tools in a way to get meaningful results. Please try to rephrase the topic or question.",
-                    icon="❌",
-                )
-
-            # If CrewNews generated an unbiased version of the news, update status and render response
-            else:
-                # Stop timer
-                stop_time = int((time.time() - start_time) * 1000)
-
-                # Update status
-                status.update(
-                    label="CrewNews successfully generated an unbiased version of the news! 🎉",
-                    state="complete",
-                )
-
-                # Render response
-                st.write(crew_response.raw)
-
-                # Render divider
-                st.divider()
-
-                # Reder run details
-                st.markdown(
-                    body=f"""
-                        <h4>Run Details</h4>
-                        <p>Total elapsed time: {format_time(stop_time)}</p>
-
-                        <div>
-                            Total tokens used: {crew_response.token_usage.total_tokens}<br>
-                            Prompt tokens used: {crew_response.token_usage.prompt_tokens}<br>
-                            Completion tokens used: {crew_response.token_usage.completion_tokens}<br>
-                            Successful requests: {crew_response.token_usage.successful_requests}<br>
-                        </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+        job = job_manager.get(st.session_state["news_job_id"])
 
-            # End AgentOps session
-            agentops.end_session(end_state="Success")
+        if job is not None:
+            render_news_job(job)
 
 
 # Run the app
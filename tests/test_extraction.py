@@ -0,0 +1,62 @@
+from utils.extraction import extract_article
+
+LEAD = "By Tuesday night, Senate leaders had secured enough votes to pass the budget bill before the recess."
+
+
+def test_extract_article_keeps_a_lead_starting_with_by():
+    article = extract_article(f"# Senate passes budget\n\n{LEAD}")
+
+    assert article["byline"] == ""
+    assert article["body"] == LEAD
+
+
+def test_extract_article_takes_the_byline_from_the_page():
+    article = extract_article(
+        f"# Senate passes budget\n\nBy Jane Doe and John Smith, CNN\n\n{LEAD}"
+    )
+
+    assert article["byline"] == "Jane Doe and John Smith"
+    assert article["body"] == LEAD
+
+
+def test_extract_article_keeps_short_quotes_and_facts():
+    markdown = "\n\n".join(
+        (
+            "# Senate passes budget",
+            LEAD,
+            '"We got it done," Schumer said.',
+            "The vote was 51-49.",
+        )
+    )
+
+    assert extract_article(markdown)["body"] == "\n\n".join(
+        (LEAD, '"We got it done," Schumer said.', "The vote was 51-49.")
+    )
+
+
+def test_extract_article_keeps_prose_mentioning_boilerplate_words():
+    paragraph = "Readers who subscribe to the newsletter of the budget office get its forecasts a week before they are published in the Federal Register."
+
+    assert extract_article(f"{LEAD}\n\n{paragraph}")["body"] == f"{LEAD}\n\n{paragraph}"
+
+
+def test_extract_article_drops_boilerplate_and_navigation():
+    markdown = "\n\n".join(
+        (
+            "[Politics](https://cnn.com/politics) [World](https://cnn.com/world) [Business](https://cnn.com/business)",
+            "# Senate passes budget",
+            "![Capitol](https://cnn.com/capitol.jpg)",
+            LEAD,
+            "Advertisement",
+            "Sign up for our newsletter to get the latest news.",
+            "[Read more](https://cnn.com/politics/budget)",
+            "Read more about the budget in [our explainer](https://cnn.com/explainer) of the bill.",
+            "© 2024 Cable News Network. All Rights Reserved.",
+        )
+    )
+
+    article = extract_article(markdown)
+
+    assert article["headline"] == "Senate passes budget"
+    assert article["body"] == LEAD
+    assert article["bytes_saved"] > 0
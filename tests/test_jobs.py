@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+import threading
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils.jobs import (
+    AGENT_STOPPED_OUTPUT,
+    CANCELLED,
+    FAILED,
+    JobManager,
+    NewsJob,
+    is_cacheable_article,
+)
+
+
+class FakeAgentOpsSession:
+    def __init__(self):
+        self.end_states = []
+
+    def end_session(self, end_state: str, end_state_reason: str = None):
+        self.end_states.append(end_state)
+
+
+def blocked_job_manager() -> tuple:
+    job_manager = JobManager(max_concurrent_jobs=1)
+    unblock = threading.Event()
+
+    # Keep the only worker busy, so submitted jobs stay queued
+    job_manager._executor.submit(unblock.wait)
+
+    return job_manager, unblock
+
+
+def test_job_ends_its_agentops_session_once():
+    agentops_session = FakeAgentOpsSession()
+
+    job = NewsJob({}, agentops_session)
+    job.status = FAILED
+
+    job.end_agentops_session()
+    job.end_agentops_session()
+
+    assert agentops_session.end_states == ["Fail"]
+
+
+def test_cancelling_a_queued_job_ends_its_agentops_session():
+    job_manager, unblock = blocked_job_manager()
+    agentops_session = FakeAgentOpsSession()
+
+    job = job_manager.get(job_manager.submit({}, agentops_session))
+
+    assert job_manager.cancel(job.id)
+    assert job.status == CANCELLED
+    assert agentops_session.end_states == ["Indeterminate"]
+
+    unblock.set()
+
+
+def test_cancelled_running_job_ends_its_agentops_session():
+    job_manager, unblock = blocked_job_manager()
+    agentops_session = FakeAgentOpsSession()
+
+    job = job_manager.get(job_manager.submit({}, agentops_session))
+
+    # Cancel the job once it is picked up by the worker, as if it was cancelled while running
+    job.cancel_event.set()
+    unblock.set()
+
+    job.future.result(timeout=10)
+
+    assert job.status == CANCELLED
+    assert agentops_session.end_states == ["Indeterminate"]
+
+
+def test_is_cacheable_article_only_takes_written_articles():
+    crew = SimpleNamespace(run_details={})
+    skipped_crew = SimpleNamespace(run_details={"synthesis_skipped": True})
+
+    assert is_cacheable_article(SimpleNamespace(raw="# Article"), crew)
+    assert not is_cacheable_article(SimpleNamespace(raw=""), crew)
+    assert not is_cacheable_article(SimpleNamespace(raw=AGENT_STOPPED_OUTPUT), crew)
+    assert not is_cacheable_article(SimpleNamespace(raw="# Article"), skipped_crew)
@@ -0,0 +1,62 @@
+from utils.parsing import parse_json_output, repair_json
+
+
+def test_repair_json_parses_valid_json():
+    assert repair_json('[{"name": "CNN", "domain": "cnn.com"}]') == [
+        {"name": "CNN", "domain": "cnn.com"}
+    ]
+
+
+def test_repair_json_takes_the_answer_over_brackets_in_the_prose():
+    raw = 'Sources [1], [2]. Answer: [{"news_urls": ["https://a.com/x"]}]'
+
+    assert repair_json(raw) == [{"news_urls": ["https://a.com/x"]}]
+
+
+def test_repair_json_takes_the_answer_over_brackets_after_it():
+    raw = 'Here it is: {"items": [1, 2]} (see [3])'
+
+    assert repair_json(raw) == {"items": [1, 2]}
+
+
+def test_repair_json_keeps_typographic_quotes_inside_strings():
+    raw = '[{"news_content": ["He said “no” today", "Trump’s plan"],}]'
+
+    assert repair_json(raw) == [
+        {"news_content": ["He said “no” today", "Trump’s plan"]}
+    ]
+
+
+def test_repair_json_replaces_typographic_quotes_around_strings():
+    raw = "[{“name”: “CNN”, “domain”: “cnn.com”}]"
+
+    assert repair_json(raw) == [{"name": "CNN", "domain": "cnn.com"}]
+
+
+def test_repair_json_strips_code_fences_and_trailing_commas():
+    raw = '```json\n[{"name": "CNN", "domain": "cnn.com"},]\n```'
+
+    assert repair_json(raw) == [{"name": "CNN", "domain": "cnn.com"}]
+
+
+def test_repair_json_parses_python_literals():
+    assert repair_json("[{'name': 'CNN', 'verified': True}]") == [
+        {"name": "CNN", "verified": True}
+    ]
+
+
+def test_repair_json_closes_truncated_output():
+    raw = '[{"name": "CNN", "domain": "cnn.com"}, {"name": "Fox'
+
+    assert repair_json(raw) == [
+        {"name": "CNN", "domain": "cnn.com"},
+        {"name": "Fox"},
+    ]
+
+
+def test_repair_json_returns_none_without_json():
+    assert repair_json("I couldn't find any media providers.") is None
+
+
+def test_parse_json_output_wraps_a_single_object():
+    assert parse_json_output('{"name": "CNN"}') == [{"name": "CNN"}]
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from urllib.parse import urlsplit
+import threading
+import time
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils.jobs import JobCancelledError
+from utils.pipeline import ScrapingPipeline
+
+# How long a fake scrape takes in seconds
+SCRAPE_SECONDS = 0.05
+
+
+class FakeScraper:
+    def __init__(self):
+        self.running_per_host = defaultdict(int)
+        self.max_running_per_host = defaultdict(int)
+        self.scraped_urls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url: str) -> dict:
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            self.running_per_host[host] += 1
+            self.max_running_per_host[host] = max(
+                self.max_running_per_host[host], self.running_per_host[host]
+            )
+
+        time.sleep(SCRAPE_SECONDS)
+
+        with self._lock:
+            self.running_per_host[host] -= 1
+            self.scraped_urls.append(url)
+
+        return {"url": url, "article": f"Article of {url}"}
+
+
+def urls_by_host(hosts: int = 3, urls_per_host: int = 8) -> list:
+    return [
+        f"https://host{host}.com/news/article-{i}"
+        for host in range(hosts)
+        for i in range(urls_per_host)
+    ]
+
+
+def test_pipeline_scrapes_every_url_once():
+    scraper = FakeScraper()
+    urls = urls_by_host()
+
+    with ScrapingPipeline(scraper, workers=8, per_host_limit=2) as pipeline:
+        pipeline.submit_all(urls + urls)
+        pipeline.join()
+
+    assert sorted(scraper.scraped_urls) == sorted(urls)
+    assert [page["url"] for page in pipeline.pages(urls)] == urls
+
+
+def test_pipeline_scrapes_other_hosts_while_one_is_saturated():
+    scraper = FakeScraper()
+    urls = urls_by_host()
+
+    start_time = time.time()
+
+    with ScrapingPipeline(scraper, workers=8, per_host_limit=2) as pipeline:
+        pipeline.submit_all(urls)
+        pipeline.join()
+
+    elapsed_seconds = time.time() - start_time
+
+    assert max(scraper.max_running_per_host.values()) == 2
+
+    # 3 hosts with 2 slots each scrape 24 URLs in 4 rounds, waiting on the first host would take 6 or more
+    assert elapsed_seconds < 6 * SCRAPE_SECONDS
+
+
+def test_pipeline_raises_the_error_of_on_page_and_skips_the_urls_left():
+    scraper = FakeScraper()
+    urls = urls_by_host()
+
+    def on_page(page: dict):
+        raise JobCancelledError("job")
+
+    with pytest.raises(JobCancelledError):
+        with ScrapingPipeline(
+            scraper, workers=2, per_host_limit=2, on_page=on_page
+        ) as pipeline:
+            pipeline.submit_all(urls)
+            pipeline.join()
+
+    assert len(scraper.scraped_urls) < len(urls)
+
+
+def test_pipeline_skips_the_urls_left_when_the_block_fails():
+    scraper = FakeScraper()
+    urls = urls_by_host()
+
+    with pytest.raises(RuntimeError):
+        with ScrapingPipeline(scraper, workers=2, per_host_limit=2) as pipeline:
+            pipeline.submit_all(urls[: pipeline.queue_size])
+
+            raise RuntimeError("Search failed")
+
+    assert len(scraper.scraped_urls) < pipeline.queue_size
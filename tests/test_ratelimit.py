@@ -0,0 +1,173 @@
+from types import SimpleNamespace
+from utils.ratelimit import CircuitBreaker, CircuitOpenError, RateLimiter
+import time
+import pytest
+
+# How long the circuit stays open in the tests, in seconds
+RESET_SECONDS = 0.05
+
+
+def response(status_code: int):
+    return SimpleNamespace(status_code=status_code, headers={})
+
+
+def responses(*status_codes):
+    pending = list(status_codes)
+
+    return lambda: response(pending.pop(0))
+
+
+class ExhaustedBucket:
+    def acquire(self):
+        raise TimeoutError("Timed out waiting for a token")
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_request()
+        breaker.record_failure()
+
+
+def rate_limiter(**kwargs) -> RateLimiter:
+    return RateLimiter(
+        "test",
+        rate=1000,
+        burst=1000,
+        base_delay=0,
+        failure_threshold=2,
+        reset_seconds=RESET_SECONDS,
+        **kwargs,
+    )
+
+
+def test_breaker_opens_after_the_failure_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=RESET_SECONDS)
+
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+
+    assert breaker.state == "closed"
+
+    breaker.before_request()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_breaker_success_resets_the_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=RESET_SECONDS)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == "closed"
+
+
+def test_breaker_lets_a_single_trial_through_after_the_reset():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    open_breaker(breaker)
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+
+    assert breaker.state == "half_open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_breaker_closes_when_the_trial_succeeds():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    open_breaker(breaker)
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+    breaker.record_success()
+
+    assert breaker.state == "closed"
+    breaker.before_request()
+
+
+def test_breaker_reopens_when_the_trial_fails():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    open_breaker(breaker)
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_breaker_release_lets_the_next_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    open_breaker(breaker)
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+    breaker.release()
+    breaker.before_request()
+
+    assert breaker.state == "half_open"
+
+
+def test_breaker_replaces_a_trial_that_never_reports_back():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=RESET_SECONDS)
+    open_breaker(breaker)
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+
+    time.sleep(RESET_SECONDS)
+    breaker.before_request()
+
+    assert breaker.state == "half_open"
+
+
+def test_rate_limiter_opens_the_circuit_on_server_errors():
+    limiter = rate_limiter(max_retries=1)
+
+    assert limiter.send(responses(503, 503)).status_code == 503
+    assert limiter.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        limiter.send(responses(200))
+
+    assert limiter.rejected == 1
+
+
+def test_rate_limiter_throttled_trial_does_not_wedge_the_circuit():
+    limiter = rate_limiter(max_retries=1)
+    limiter.send(responses(503, 503))
+
+    time.sleep(RESET_SECONDS)
+
+    # The retry after the throttled trial becomes the trial
+    assert limiter.send(responses(429, 200)).status_code == 200
+    assert limiter.breaker.state == "closed"
+    assert limiter.send(responses(200)).status_code == 200
+
+
+def test_rate_limiter_trial_timing_out_on_its_token_gives_its_slot_back():
+    limiter = rate_limiter(max_retries=1)
+    limiter.send(responses(503, 503))
+
+    time.sleep(RESET_SECONDS)
+
+    bucket, limiter.bucket = limiter.bucket, ExhaustedBucket()
+
+    with pytest.raises(TimeoutError):
+        limiter.send(responses(200))
+
+    limiter.bucket = bucket
+
+    assert limiter.send(responses(200)).status_code == 200
+    assert limiter.breaker.state == "closed"
@@ -0,0 +1,55 @@
+from utils.search import is_article_path, rank_news_urls
+
+
+def test_is_article_path_keeps_articles():
+    assert is_article_path("/2024/09/10/politics/debate/index.html")
+    assert is_article_path("/news/election-results-1")
+    assert is_article_path("/politics/senate-passes-budget-bill")
+    assert is_article_path("/news/articles/c4g0x8")
+    assert is_article_path("/politics/debate.html")
+
+
+def test_is_article_path_drops_the_homepage_and_section_fronts():
+    assert not is_article_path("")
+    assert not is_article_path("/")
+    assert not is_article_path("/politics")
+    assert not is_article_path("/world/europe/")
+    assert not is_article_path("/us-news")
+
+
+def test_rank_news_urls_ranks_by_score_then_published_date():
+    response = {
+        "results": [
+            {"url": "https://cnn.com/news/a-1", "score": 0.5},
+            {
+                "url": "https://cnn.com/news/b-2",
+                "score": 0.9,
+                "published_date": "2024-09-01",
+            },
+            {
+                "url": "https://cnn.com/news/c-3",
+                "score": 0.9,
+                "published_date": "2024-09-10",
+            },
+        ]
+    }
+
+    assert rank_news_urls(response, "cnn.com") == [
+        "https://cnn.com/news/c-3",
+        "https://cnn.com/news/b-2",
+        "https://cnn.com/news/a-1",
+    ]
+
+
+def test_rank_news_urls_drops_other_domains_section_fronts_and_fragments():
+    response = {
+        "results": [
+            {"url": "https://cnn.com/politics", "score": 0.9},
+            {"url": "https://www.cnn.com/", "score": 0.9},
+            {"url": "https://notcnn.com/news/a-1", "score": 0.9},
+            {"url": "https://edition.cnn.com/news/a-1#comments", "score": 0.8},
+            {"url": "https://edition.cnn.com/news/a-1", "score": 0.7},
+        ]
+    }
+
+    assert rank_news_urls(response, "cnn.com") == ["https://edition.cnn.com/news/a-1"]
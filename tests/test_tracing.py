@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from utils.tracing import Tracer
+
+
+def traced_run(spans: int = 3) -> Tracer:
+    tracer = Tracer()
+
+    for i in range(spans):
+        with tracer.span("tool", f"Tool {i}", payload="x" * 100):
+            pass
+
+    return tracer
+
+
+def read_spans(path: str) -> list:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_export_jsonl_appends_the_spans_of_every_run(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+
+    traced_run().export_jsonl(path)
+    traced_run().export_jsonl(path)
+
+    assert len(read_spans(path)) == 6
+
+
+def test_export_jsonl_rotates_the_file_once_it_is_full(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+
+    first_run, second_run = traced_run(), traced_run()
+
+    first_run.export_jsonl(path, max_bytes=1024)
+    second_run.export_jsonl(path, max_bytes=1024)
+
+    assert {span["trace_id"] for span in read_spans(f"{path}.1")} == {
+        first_run.trace_id
+    }
+    assert {span["trace_id"] for span in read_spans(path)} == {second_run.trace_id}
+
+
+def test_export_jsonl_keeps_the_lines_of_concurrent_runs_whole(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+
+    tracers = [traced_run(spans=50) for _ in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda tracer: tracer.export_jsonl(path), tracers))
+
+    spans = read_spans(path)
+
+    assert len(spans) == 400
+    assert not os.path.exists(f"{path}.1")
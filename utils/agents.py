@@ -1,23 +1,196 @@
 from crewai import Agent
+from pydantic import PrivateAttr
+from utils.cache import CompletionCache
 from utils.tools import UnbiasedNewsTools
-from langchain_openai import ChatOpenAI
-import streamlit as st
+from utils.clients import get_chat_llm, MODEL_TIERS
+from utils.concurrency import get_api_key
+from utils.tracing import LLMTracingHandler
 
-# Initialize Llama 3.1 70B LLM
-llm = ChatOpenAI(
-    openai_api_base="https://api.aimlapi.com/v1",
-    api_key=st.session_state["aiml_api_key"],
-    model_name="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
-)
+# Initialize the persistent cache of LLM completions, shared by all sessions
+completion_cache = CompletionCache()
 
-# Initialize search tools from the UnbiasedNewsTools utility
-search_tools = UnbiasedNewsTools().get_all_search_tools()
+# Roles whose completions are cached whatever the temperature, with the time to live of their completions in seconds. Media providers and their domains rarely change, while the search and scraping turns repeat only while their tool results stay the same
+DEFAULT_CACHED_ROLES = {
+    "Senior media expert": 7 * 24 * 60 * 60,
+    "Senior web domain expert": 7 * 24 * 60 * 60,
+    "Senior written content expert": 60 * 60,
+    "Senior text extraction expert": 24 * 60 * 60,
+}
 
-# Initialize scraping tools from the UnbiasedNewsTools utility
-scraping_tools = UnbiasedNewsTools().get_all_scraping_tools()
+# Model tier of every role. Looking up media providers and their domains and routing searches and scrapes to the tools are left to the small model, while writing is kept on the large one
+DEFAULT_ROLE_TIERS = {
+    "Senior media expert": "small",
+    "Senior web domain expert": "small",
+    "Senior written content expert": "small",
+    "Senior text extraction expert": "small",
+    "Senior news editor": "large",
+    "Senior unbiased journalist": "large",
+}
+
+
+def copy_llm(llm, **fields):
+    """
+    Returns a copy of the given chat model with the given fields replaced, sharing its pooled HTTP clients.
+
+    copy() leaves out the fields excluded from serialization, e.g., the OpenAI clients, callbacks and tags, so they are passed to the copy explicitly.
+
+    :param llm: The chat model, e.g., a ChatOpenAI.
+    :param fields: The fields to replace, e.g., callbacks.
+    :return: The copy of the chat model.
+    """
+
+    excluded_fields = {
+        name: getattr(llm, name)
+        for name, field in llm.__fields__.items()
+        if field.field_info.exclude
+    }
+
+    return llm.copy(update={**excluded_fields, **fields})
+
+
+class TieredAgent(Agent):
+    """
+    An Agent running on the LLM of its model tier, which can run a task again on the LLM of a larger tier, e.g., when its output fails validation.
+    """
+
+    _escalation_llm = PrivateAttr(default=None)
+
+    def set_escalation_llm(self, escalation_llm):
+        """
+        Sets the LLM tasks are escalated to.
+
+        :param escalation_llm: The LLM of the larger tier, or None to never escalate.
+        :return: The Agent, for chaining.
+        """
+
+        self._escalation_llm = escalation_llm
+
+        return self
+
+    def can_escalate(self) -> bool:
+        """
+        Returns whether the agent can escalate a task to a larger model.
+
+        :return: True if the agent has an escalation LLM other than its own, False otherwise.
+        """
+
+        return self._escalation_llm is not None and self._escalation_llm is not self.llm
+
+    def execute_task_escalated(self, task, context: str = None, tools: list = None):
+        """
+        Runs the task again on the escalation LLM. The agent goes back to its own LLM afterwards.
+
+        :param task: The Task to run.
+        :param context: The context from the previous tasks.
+        :param tools: The tools of the task.
+        :return: The raw output of the agent.
+        """
+
+        llm = self.llm
+
+        self.llm = self._escalation_llm
+
+        # Count the tokens of the escalation LLM in the usage of the crew
+        self._setup_llm_callbacks(self.llm.model_name)
+
+        try:
+            return self.execute_task(task=task, context=context, tools=tools)
+        finally:
+            self.llm = llm
 
 
 class UnbiasedNewsAgents:
+    def __init__(
+        self,
+        tracer=None,
+        cached_roles: dict = DEFAULT_CACHED_ROLES,
+        role_tiers: dict = DEFAULT_ROLE_TIERS,
+        escalation: bool = True,
+        api_keys: dict = None,
+    ):
+        """
+        Initializes the UnbiasedNewsAgents.
+
+        Every agent runs on the pooled LLM of its model tier, shared by all sessions with the same AIML API key. Roles without a tier run on the large model.
+
+        :param tracer: Optional Tracer of the run. If given, every agent gets its own copy of the LLM, sharing the pooled connections, that records a span per LLM call under the role of the agent, with the model and its tier.
+        :param cached_roles: The roles whose completions are served from the completion cache, with the time to live of their completions in seconds. Completions at temperature 0 are cached for every role.
+        :param role_tiers: The model tier of every role, "small" or "large".
+        :param escalation: Whether agents on the small model run a task again on the large model if their output fails validation.
+        :param api_keys: Optional API keys by name, e.g., {"aiml_api_key": ...}, for runs outside of the app. Otherwise, the API keys are read from st.session_state.
+
+        :return: An instance of UnbiasedNewsAgents.
+        """
+
+        # Get the shared LLM of every model tier
+        self.llms = {
+            tier: get_chat_llm(get_api_key("aiml_api_key", api_keys), model_name)
+            for tier, model_name in MODEL_TIERS.items()
+        }
+
+        self.llm = self.llms["large"]
+
+        self.tracer = tracer
+        self.cached_roles = cached_roles
+        self.role_tiers = role_tiers
+        self.escalation = escalation
+
+    def _llm(self, role: str, tier: str = None):
+        """
+        Returns the LLM of the agent with the given role.
+
+        :param role: The role of the agent.
+        :param tier: Optional model tier, defaults to the tier of the role.
+        :return: The shared LLM of the tier, or a copy of it that records LLM spans if a tracer is given and serves completions from the completion cache if the role is cached.
+        """
+
+        tier = tier or self.role_tiers.get(role, "large")
+
+        llm = self.llms[tier]
+
+        fields = {}
+
+        if self.tracer is not None:
+            fields["callbacks"] = [
+                LLMTracingHandler(
+                    self.tracer,
+                    role,
+                    attributes={"model": llm.model_name, "tier": tier},
+                )
+            ]
+
+        # Completions at temperature 0 are deterministic, so they are cached for every role
+        if role in self.cached_roles:
+            fields["cache"] = completion_cache.with_ttl(self.cached_roles[role])
+        elif llm.temperature == 0:
+            fields["cache"] = completion_cache
+
+        # Agents stream their completions by default, which bypasses the cache
+        if "cache" in fields:
+            fields["disable_streaming"] = True
+
+        if not fields:
+            return llm
+
+        return copy_llm(llm, **fields)
+
+    def _agent(self, **fields) -> TieredAgent:
+        """
+        Returns an Agent with the given fields on the LLM of its role's model tier.
+
+        :param fields: The fields of the Agent, e.g., role and goal.
+        :return: A TieredAgent that escalates to the large model if escalation is enabled and its role runs on a smaller tier.
+        """
+
+        role = fields["role"]
+
+        agent = TieredAgent(llm=self._llm(role), **fields)
+
+        if self.escalation and self.role_tiers.get(role, "large") != "large":
+            agent.set_escalation_llm(self._llm(role, "large"))
+
+        return agent
+
     def media_expert_agent(self):
         """
         Returns an Agent responsible for getting media providers, both left, centered, and right for a given country.
@@ -27,11 +200,10 @@ class UnbiasedNewsAgents:
         :return: An Agent with the given role, goal, backstory, and parameters.
         """
 
-        return Agent(
+        return self._agent(
             role="Senior media expert",
             goal=f"Get media providers, both left, centered, and right for a given country.",
             backstory="You're an expert on media providers for any given country.",
-            llm=llm,
             allow_delegation=False,
             verbose=True,
             max_iter=1,
@@ -46,54 +218,71 @@ class UnbiasedNewsAgents:
         :return: An Agent with the given role, goal, backstory, and parameters.
         """
 
-        return Agent(
+        return self._agent(
             role="Senior web domain expert",
             goal="Get the domain URL for a given media provider.",
             backstory="You're an expert on the domain URL for any given media provider.",
-            llm=llm,
             allow_delegation=False,
             verbose=True,
             max_iter=1,
         )
 
-    def written_content_expert_agent(self):
+    def written_content_expert_agent(self, max_iter: int = 20):
         """
         Returns an Agent responsible for getting URLs of written content for a given topic for a given media provider.
 
         This agent is responsible for getting URLs of written content for a given topic for a given media provider.
 
+        :param max_iter: The maximum number of iterations (searches and the final answer) of the agent, e.g., bounded by the URL quotas of the run.
         :return: An Agent with the given role, goal, backstory, and parameters.
         """
 
-        return Agent(
+        return self._agent(
             role="Senior written content expert",
             goal="Get URLs of written content for a given topic for a given media provider.",
             backstory="You're an expert on written content for any given topic for any given media provider.",
-            llm=llm,
-            tools=search_tools,
+            tools=UnbiasedNewsTools.get_all_search_tools(),
             allow_delegation=False,
             verbose=True,
-            max_iter=20,
+            max_iter=max_iter,
         )
 
-    def text_extraction_expert_agent(self):
+    def text_extraction_expert_agent(self, max_iter: int = 20):
         """
         Returns an Agent responsible for extracting all written content from a given content URL.
 
         This agent is responsible for extracting all written content from a given content URL.
 
+        :param max_iter: The maximum number of iterations (scrapes and the final answer) of the agent, e.g., bounded by the URL quotas of the run.
         :return: An Agent with the given role, goal, backstory, and parameters.
         """
 
-        return Agent(
+        return self._agent(
             role="Senior text extraction expert",
             goal="Get all written content for a given content URL.",
             backstory="You're an expert on written content for any given content URL. You know all the written content that the given content URL has.",
-            llm=llm,
-            tools=scraping_tools,
+            tools=UnbiasedNewsTools.get_all_scraping_tools(),
             allow_delegation=False,
             verbose=True,
-            max_iter=20,
+            max_iter=max_iter,
+        )
+
+    def news_digest_agent(self):
+        """
+        Returns an Agent responsible for condensing the written content of a group of media providers into a digest.
+
+        This agent is responsible for condensing the written content of a group of media providers into a digest that keeps every claim attributed to its media provider and source URL.
+
+        :return: An Agent with the given role, goal, backstory, and parameters.
+        """
+
+        return self._agent(
+            role="Senior news editor",
+            goal="Condense the written content of a group of media providers into a digest that keeps every claim attributed to its media provider and source URL.",
+            backstory="You're a news editor. You condense long coverage into short digests without losing any fact, view or attribution. You never mix up which media provider said what.",
+            allow_delegation=False,
+            verbose=True,
+            max_iter=1,
         )
 
     def unbiased_journalist_agent(self):
@@ -105,11 +294,10 @@ class UnbiasedNewsAgents:
         :return: An Agent with the given role, goal, backstory, and parameters.
         """
 
-        return Agent(
+        return self._agent(
             role="Senior unbiased journalist",
             goal="Write an ubiased comprehensive article based on all written content from multiple media providers.",
             backstory="You're an unbiased journalist. You know all the written content from multiple media providers. You hate when a news is biased meaning it only represents one view on the given topic. You know that there are left, centered and right media providers and they only represent one view on the given topic. You want to make all written content from multiple media providers for the given topic unbiased by emphasizing multiple views.",
-            llm=llm,
             allow_delegation=False,
             verbose=True,
             max_iter=1,
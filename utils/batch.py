@@ -0,0 +1,172 @@
+from concurrent.futures import as_completed
+from utils.concurrency import streamlit_thread_pool
+from utils.crews import UnbiasedNewsCrew
+from utils.jobs import article_cache, is_cacheable_article, SUCCEEDED, FAILED
+import statistics
+import time
+
+# Default number of topics written at the same time in a batch
+DEFAULT_MAX_PARALLEL_TOPICS = 4
+
+
+class BatchNewsRun:
+    def __init__(
+        self,
+        topics: list,
+        selected_country: str = "United States",
+        max_parallel_topics: int = DEFAULT_MAX_PARALLEL_TOPICS,
+        crew_template: dict = None,
+        use_article_cache: bool = True,
+        api_keys: dict = None,
+    ):
+        """
+        Initializes a batch run that writes the unbiased news of many topics concurrently, e.g., for a morning digest.
+
+        Every topic gets its own UnbiasedNewsCrew built from the same crew template, so all topics are written with the same settings. The runs share the pooled API clients and the scrape, search, completion and article caches of the process.
+
+        :param topics: The topics for which to get the unbiased news. Blank and repeated topics are skipped.
+        :param selected_country: The country for which to get the unbiased news.
+        :param max_parallel_topics: The maximum number of topics written at the same time.
+        :param crew_template: Optional keyword arguments of UnbiasedNewsCrew shared by all topics, besides the topic and the country, e.g., {"synthesis_mode": "map_reduce"}.
+        :param use_article_cache: Whether to serve topics from recent articles on similar topics instead of writing them again.
+        :param api_keys: Optional API keys by name ("aiml_api_key", "exa_api_key" and "firecrawl_api_key"), so the batch can run from a script or a cron job. Otherwise, the crews read the API keys from st.session_state, which only works inside the app.
+
+        :return: An instance of BatchNewsRun.
+        """
+
+        self.topics = list(
+            dict.fromkeys(topic.strip() for topic in topics if topic.strip())
+        )
+        self.selected_country = selected_country
+        self.max_parallel_topics = max(1, max_parallel_topics)
+        self.crew_template = crew_template or {}
+        self.use_article_cache = use_article_cache
+        self.api_keys = api_keys
+
+        self.results = []
+        self.started_at = None
+        self.finished_at = None
+
+    def _run_topic(self, topic: str) -> dict:
+        """
+        Writes the unbiased news of a single topic on a worker thread of the batch.
+
+        :param topic: The topic.
+        :return: A dictionary with the topic, its status, the article or the error, whether it was served from the article cache, its token usage and its timings in milliseconds.
+        """
+
+        start_time = time.time()
+
+        result = {
+            "topic": topic,
+            "status": SUCCEEDED,
+            "raw": None,
+            "error": None,
+            "cached": False,
+            "token_usage": {},
+            "run_details": {},
+            "queued_ms": int((start_time - self.started_at) * 1000),
+        }
+
+        try:
+            cached_article = (
+                article_cache.get_article(topic, self.selected_country)
+                if self.use_article_cache
+                else None
+            )
+
+            if cached_article is not None:
+                result.update({"raw": cached_article["raw"], "cached": True})
+            else:
+                crew = UnbiasedNewsCrew(
+                    topic=topic,
+                    selected_country=self.selected_country,
+                    **{"api_keys": self.api_keys, **self.crew_template},
+                )
+
+                crew_output = crew.start_news_agents()
+
+                result.update(
+                    {
+                        "raw": crew_output.raw,
+                        "token_usage": crew_output.token_usage.model_dump(),
+                        "run_details": crew.run_details,
+                    }
+                )
+
+                # Cache the finished article for the next runs of similar topics
+                if is_cacheable_article(crew_output, crew):
+                    article_cache.set_article(
+                        topic,
+                        self.selected_country,
+                        crew_output.raw,
+                        result["token_usage"],
+                    )
+        except Exception as e:
+            result.update({"status": FAILED, "error": str(e)})
+
+        result["elapsed_ms"] = int((time.time() - start_time) * 1000)
+
+        return result
+
+    def run(self):
+        """
+        Writes the unbiased news of all topics, at most max_parallel_topics at a time, and yields the result of every topic as soon as it completes.
+
+        A failed topic doesn't stop the batch, its result has the status "failed" and the error.
+
+        :return: A generator of dictionaries as returned by _run_topic, in the order the topics complete.
+        """
+
+        self.results = []
+        self.started_at = time.time()
+        self.finished_at = None
+
+        with streamlit_thread_pool(self.max_parallel_topics) as executor:
+            futures = [executor.submit(self._run_topic, topic) for topic in self.topics]
+
+            for future in as_completed(futures):
+                result = future.result()
+
+                self.results.append(result)
+
+                yield result
+
+        self.finished_at = time.time()
+
+    def summary(self) -> dict:
+        """
+        Returns the aggregate throughput of the topics completed so far.
+
+        Tokens per topic are averaged over the topics that were written, since topics served from the article cache use no tokens.
+
+        :return: A dictionary with the number of topics per status, the wall time, the topics per hour, the tokens in total and per written topic, and the median and slowest time of a topic.
+        """
+
+        wall_ms = int(((self.finished_at or time.time()) - self.started_at) * 1000)
+
+        succeeded = [result for result in self.results if result["status"] == SUCCEEDED]
+        written = [result for result in succeeded if not result["cached"]]
+
+        total_tokens = sum(
+            result["token_usage"].get("total_tokens", 0) for result in written
+        )
+
+        elapsed_ms = [result["elapsed_ms"] for result in self.results]
+
+        return {
+            "topics": len(self.topics),
+            "completed": len(self.results),
+            "succeeded": len(succeeded),
+            "failed": len(self.results) - len(succeeded),
+            "cached": len(succeeded) - len(written),
+            "max_parallel_topics": self.max_parallel_topics,
+            "wall_ms": wall_ms,
+            "topics_per_hour": (
+                round(len(succeeded) / (wall_ms / 3600000), 1) if wall_ms else 0.0
+            ),
+            "total_tokens": total_tokens,
+            "tokens_per_topic": (round(total_tokens / len(written)) if written else 0),
+            "topic_p50_ms": int(statistics.median(elapsed_ms)) if elapsed_ms else 0,
+            "topic_max_ms": max(elapsed_ms, default=0),
+        }
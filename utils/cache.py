@@ -0,0 +1,733 @@
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Default location of the on-disk cache, shared by all caches in the app, overridden by the CREW_NEWS_CACHE_PATH environment variable
+DEFAULT_CACHE_PATH = os.environ.get(
+    "CREW_NEWS_CACHE_PATH", os.path.join(".cache", "crew_news.sqlite3")
+)
+
+# Query parameters that only track where a visitor came from and never change the page
+TRACKING_QUERY_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "cmpid"}
+
+# Words that don't change what a search query is about
+QUERY_STOPWORDS = {
+    "a",
+    "about",
+    "an",
+    "and",
+    "at",
+    "by",
+    "for",
+    "from",
+    "in",
+    "is",
+    "of",
+    "on",
+    "or",
+    "the",
+    "to",
+    "vs",
+    "with",
+}
+
+# Minimum Jaccard similarity of the normalized words of two topics to share a cached article
+DEFAULT_TOPIC_SIMILARITY_THRESHOLD = 0.6
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Returns a canonical form of the given URL, so different spellings of the same page share a cache entry.
+
+    The scheme and host are lowercased, the "www." prefix, the fragment, the trailing slash and tracking query parameters (e.g., utm_source) are removed, and the remaining query parameters are sorted.
+
+    :param url: The URL to canonicalize.
+    :return: The canonical URL.
+    """
+
+    parts = urlsplit(url.strip())
+
+    host = parts.netloc.lower()
+
+    if host.startswith("www."):
+        host = host[len("www.") :]
+
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not name.lower().startswith("utm_")
+            and name.lower() not in TRACKING_QUERY_PARAMS
+        )
+    )
+
+    return urlunsplit(
+        (
+            (parts.scheme or "https").lower(),
+            host,
+            parts.path.rstrip("/") or "/",
+            query,
+            "",
+        )
+    )
+
+
+def normalize_query(query: str) -> str:
+    """
+    Returns a normalized form of the given search query, so near-identical queries share a cache entry.
+
+    The query is lowercased, split into words, stripped of stopwords and duplicate words, and the words are sorted. For example, "CNN Harris Trump debate" and "Harris Trump debate CNN" both become "cnn debate harris trump".
+
+    :param query: The search query to normalize.
+    :return: The normalized query.
+    """
+
+    words = re.findall(r"\w+", query.lower())
+
+    return " ".join(sorted(set(words) - QUERY_STOPWORDS)) or " ".join(words)
+
+
+class SQLiteCache:
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: int,
+        max_bytes: int,
+        path: str = DEFAULT_CACHE_PATH,
+    ):
+        """
+        Initializes a persistent key-value cache stored in SQLite.
+
+        Every entry expires after its TTL. When the stored content grows above the size cap, the least recently used entries are evicted. Content is stored once per content hash, so identical values under different keys take the space of one.
+
+        :param name: The name of the cache, used as the prefix of its tables.
+        :param ttl_seconds: The default time to live of an entry in seconds.
+        :param max_bytes: The maximum size of the stored content in bytes.
+        :param path: The path of the SQLite database file.
+
+        :return: An instance of SQLiteCache.
+        """
+
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.path = path
+
+        self._entries_table = f"{name}_entries"
+        self._contents_table = f"{name}_contents"
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+        # Create the database directory and tables on first use
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._connection = sqlite3.connect(
+            path,
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+
+        with self._lock:
+            self._connection.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self._contents_table} (
+                        content_hash TEXT PRIMARY KEY,
+                        content TEXT NOT NULL,
+                        size INTEGER NOT NULL
+                    )
+                """)
+            self._connection.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self._entries_table} (
+                        key TEXT PRIMARY KEY,
+                        content_hash TEXT NOT NULL,
+                        metadata TEXT,
+                        expires_at REAL NOT NULL,
+                        last_accessed REAL NOT NULL
+                    )
+                """)
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self._entries_table}_last_accessed ON {self._entries_table} (last_accessed)"
+            )
+
+    def get(self, key: str):
+        """
+        Returns the cached content and metadata for the given key.
+
+        :param key: The cache key.
+        :return: A tuple of the content and the metadata, or None if the key is missing or expired.
+        """
+
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                f"""
+                    SELECT contents.content, entries.metadata, entries.expires_at
+                    FROM {self._entries_table} AS entries
+                    JOIN {self._contents_table} AS contents USING (content_hash)
+                    WHERE entries.key = ?
+                """,
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self._counters["misses"] += 1
+
+                return None
+
+            content, metadata, expires_at = row
+
+            if expires_at <= now:
+                self._counters["misses"] += 1
+                self._counters["expired"] += 1
+
+                self._delete(key)
+
+                return None
+
+            self._counters["hits"] += 1
+
+            self._connection.execute(
+                f"UPDATE {self._entries_table} SET last_accessed = ? WHERE key = ?",
+                (now, key),
+            )
+
+        return content, metadata
+
+    def set(
+        self,
+        key: str,
+        content: str,
+        metadata: str = None,
+        ttl_seconds: int = None,
+    ):
+        """
+        Stores the content and metadata under the given key and evicts the least recently used entries if the cache is over its size cap.
+
+        :param key: The cache key.
+        :param content: The content to store.
+        :param metadata: Optional metadata stored next to the content, not deduplicated.
+        :param ttl_seconds: Optional time to live of the entry in seconds, defaults to the TTL of the cache.
+        """
+
+        now = time.time()
+
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            self._delete(key)
+
+            self._connection.execute(
+                f"INSERT OR IGNORE INTO {self._contents_table} (content_hash, content, size) VALUES (?, ?, ?)",
+                (content_hash, content, len(content.encode("utf-8"))),
+            )
+            self._connection.execute(
+                f"INSERT INTO {self._entries_table} (key, content_hash, metadata, expires_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    content_hash,
+                    metadata,
+                    now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds),
+                    now,
+                ),
+            )
+
+            self._counters["stores"] += 1
+
+            self._evict(now)
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache since the process started, together with its current size.
+
+        :return: A dictionary with the hits, misses, expired entries, stores, evictions, hit rate, entries and bytes of the cache.
+        """
+
+        with self._lock:
+            entries = self._connection.execute(
+                f"SELECT COUNT(*) FROM {self._entries_table}"
+            ).fetchone()[0]
+            size = self._connection.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM {self._contents_table}"
+            ).fetchone()[0]
+
+            stats = dict(self._counters)
+
+        lookups = stats["hits"] + stats["misses"]
+
+        stats.update(
+            {
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+        )
+
+        return stats
+
+    def _delete(self, key: str):
+        """
+        Deletes the entry with the given key and its content if no other entry shares it. The caller must hold the lock.
+
+        :param key: The cache key.
+        """
+
+        row = self._connection.execute(
+            f"SELECT content_hash FROM {self._entries_table} WHERE key = ?",
+            (key,),
+        ).fetchone()
+
+        if row is None:
+            return
+
+        self._connection.execute(
+            f"DELETE FROM {self._entries_table} WHERE key = ?",
+            (key,),
+        )
+        self._connection.execute(
+            f"""
+                DELETE FROM {self._contents_table}
+                WHERE content_hash = ?
+                AND NOT EXISTS (SELECT 1 FROM {self._entries_table} WHERE content_hash = ?)
+            """,
+            (row[0], row[0]),
+        )
+
+    def _evict(self, now: float):
+        """
+        Deletes expired entries, then the least recently used entries until the cache is within its size cap. The caller must hold the lock.
+
+        :param now: The current time.
+        """
+
+        for (key,) in self._connection.execute(
+            f"SELECT key FROM {self._entries_table} WHERE expires_at <= ?",
+            (now,),
+        ).fetchall():
+            self._delete(key)
+
+            self._counters["expired"] += 1
+
+        size = self._connection.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self._contents_table}"
+        ).fetchone()[0]
+
+        if size <= self.max_bytes:
+            return
+
+        for (key,) in self._connection.execute(
+            f"SELECT key FROM {self._entries_table} ORDER BY last_accessed"
+        ).fetchall():
+            self._delete(key)
+
+            self._counters["evictions"] += 1
+
+            size = self._connection.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM {self._contents_table}"
+            ).fetchone()[0]
+
+            if size <= self.max_bytes:
+                return
+
+
+class ScrapeCache(SQLiteCache):
+    def __init__(
+        self,
+        ttl_seconds: int = 24 * 60 * 60,
+        max_bytes: int = 256 * 1024 * 1024,
+        path: str = DEFAULT_CACHE_PATH,
+    ):
+        """
+        Initializes the cache of scraped pages, keyed by canonical URL.
+
+        :param ttl_seconds: The time to live of a scraped page in seconds.
+        :param max_bytes: The maximum size of the stored pages in bytes.
+        :param path: The path of the SQLite database file.
+
+        :return: An instance of ScrapeCache.
+        """
+
+        super().__init__(
+            name="scrape",
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            path=path,
+        )
+
+    def get_page(self, url: str):
+        """
+        Returns the cached scraped page for the given URL.
+
+        :param url: The URL of the page.
+        :return: A tuple of the markdown and the JSON-encoded metadata of the page, or None if the page is not cached.
+        """
+
+        return self.get(canonicalize_url(url))
+
+    def set_page(self, url: str, markdown: str, metadata: str = None):
+        """
+        Stores the scraped page for the given URL.
+
+        :param url: The URL of the page.
+        :param markdown: The markdown of the page, stored once for identical pages.
+        :param metadata: The JSON-encoded metadata of the page.
+        """
+
+        self.set(canonicalize_url(url), markdown, metadata)
+
+
+class SearchCache(SQLiteCache):
+    def __init__(
+        self,
+        bucket_seconds: int = 60 * 60,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: str = DEFAULT_CACHE_PATH,
+    ):
+        """
+        Initializes the cache of search responses, keyed by normalized query, search parameters and time bucket.
+
+        Every response expires at the end of the time bucket it was stored in, so news results never get older than one bucket.
+
+        :param bucket_seconds: The length of a time bucket in seconds.
+        :param max_bytes: The maximum size of the stored responses in bytes.
+        :param path: The path of the SQLite database file.
+
+        :return: An instance of SearchCache.
+        """
+
+        super().__init__(
+            name="search",
+            ttl_seconds=bucket_seconds,
+            max_bytes=max_bytes,
+            path=path,
+        )
+
+        self.bucket_seconds = bucket_seconds
+
+    def _key(self, query: str, params: dict) -> str:
+        """
+        Returns the cache key for the given query and search parameters in the current time bucket.
+
+        :param query: The search query.
+        :param params: The search parameters.
+        :return: The cache key.
+        """
+
+        bucket = int(time.time() // self.bucket_seconds)
+
+        return f"{bucket}:{normalize_query(query)}:{json.dumps(params, sort_keys=True)}"
+
+    def get_response(self, query: str, params: dict):
+        """
+        Returns the cached search response for the given query and search parameters.
+
+        :param query: The search query.
+        :param params: The search parameters.
+        :return: The search response as a dictionary, or None if it is not cached.
+        """
+
+        cached_response = self.get(self._key(query, params))
+
+        if cached_response is None:
+            return None
+
+        return json.loads(cached_response[0])
+
+    def set_response(self, query: str, params: dict, response: dict):
+        """
+        Stores the search response for the given query and search parameters until the end of the current time bucket.
+
+        :param query: The search query.
+        :param params: The search parameters.
+        :param response: The search response as a JSON-serializable dictionary.
+        """
+
+        self.set(
+            self._key(query, params),
+            json.dumps(response),
+            ttl_seconds=self.bucket_seconds - time.time() % self.bucket_seconds,
+        )
+
+
+class ArticleCache(SQLiteCache):
+    def __init__(
+        self,
+        bucket_seconds: int = 6 * 60 * 60,
+        max_bytes: int = 32 * 1024 * 1024,
+        similarity_threshold: float = DEFAULT_TOPIC_SIMILARITY_THRESHOLD,
+        path: str = DEFAULT_CACHE_PATH,
+    ):
+        """
+        Initializes the cache of finished unbiased news articles, keyed by country, time bucket and normalized topic.
+
+        Topics are matched by the Jaccard similarity of their normalized word sets, so differently phrased topics share an entry, e.g., "Harris vs Trump debate 2024" and "US Presidential Debate 2024 Harris vs Trump". Every article expires at the end of the time bucket it was stored in, and the least recently used articles are evicted when the cache grows above its size cap.
+
+        :param bucket_seconds: The length of a time bucket in seconds.
+        :param max_bytes: The maximum size of the stored articles in bytes.
+        :param similarity_threshold: The minimum Jaccard similarity of two topics to share an article.
+        :param path: The path of the SQLite database file.
+
+        :return: An instance of ArticleCache.
+        """
+
+        super().__init__(
+            name="article",
+            ttl_seconds=bucket_seconds,
+            max_bytes=max_bytes,
+            path=path,
+        )
+
+        self.bucket_seconds = bucket_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._counters["tokens_saved"] = 0
+
+    def _prefix(self, country: str) -> str:
+        """
+        Returns the prefix of the cache keys of the given country in the current time bucket.
+
+        :param country: The country of the article.
+        :return: The key prefix.
+        """
+
+        bucket = int(time.time() // self.bucket_seconds)
+
+        return f"{bucket}:{country.lower()}:"
+
+    def _find_key(self, topic: str, country: str):
+        """
+        Returns the cache key of the stored topic most similar to the given topic in the current time bucket.
+
+        :param topic: The topic of the article.
+        :param country: The country of the article.
+        :return: A tuple of the cache key and the similarity of its topic, or None if no stored topic is similar enough.
+        """
+
+        prefix = self._prefix(country)
+
+        topic_words = set(normalize_query(topic).split())
+
+        with self._lock:
+            keys = [
+                key
+                for (key,) in self._connection.execute(
+                    f"SELECT key FROM {self._entries_table} WHERE key >= ? AND key < ? AND expires_at > ?",
+                    (prefix, prefix + "\uffff", time.time()),
+                ).fetchall()
+            ]
+
+        best_match = None
+
+        for key in keys:
+            key_words = set(key[len(prefix) :].split())
+
+            if not topic_words | key_words:
+                continue
+
+            similarity = len(topic_words & key_words) / len(topic_words | key_words)
+
+            if similarity >= self.similarity_threshold and (
+                best_match is None or similarity > best_match[1]
+            ):
+                best_match = (key, similarity)
+
+        return best_match
+
+    def get_article(self, topic: str, country: str):
+        """
+        Returns the cached article for the given topic and country, or for the most similar topic stored in the current time bucket.
+
+        :param topic: The topic of the article.
+        :param country: The country of the article.
+        :return: A dictionary with the "raw" article, the cached "topic", its "similarity" to the given topic, the "token_usage" the cached article saved and when it was "created_at", or None if no similar topic is cached.
+        """
+
+        match = self._find_key(topic, country)
+
+        if match is None:
+            with self._lock:
+                self._counters["misses"] += 1
+
+            return None
+
+        key, similarity = match
+
+        cached_article = self.get(key)
+
+        if cached_article is None:
+            return None
+
+        raw, metadata = cached_article
+
+        article = {"raw": raw, "similarity": similarity, **json.loads(metadata)}
+
+        with self._lock:
+            self._counters["tokens_saved"] += article["token_usage"].get(
+                "total_tokens", 0
+            )
+
+        return article
+
+    def set_article(self, topic: str, country: str, raw: str, token_usage: dict):
+        """
+        Stores the finished article for the given topic and country until the end of the current time bucket.
+
+        :param topic: The topic of the article.
+        :param country: The country of the article.
+        :param raw: The unbiased news article.
+        :param token_usage: The token usage of the run that wrote the article, as a dictionary of UsageMetrics.
+        """
+
+        self.set(
+            self._prefix(country) + normalize_query(topic),
+            raw,
+            json.dumps(
+                {
+                    "topic": topic,
+                    "token_usage": token_usage,
+                    "created_at": time.time(),
+                }
+            ),
+            ttl_seconds=self.bucket_seconds - time.time() % self.bucket_seconds,
+        )
+
+
+class CompletionCache(SQLiteCache, BaseCache):
+    def __init__(
+        self,
+        ttl_seconds: int = 24 * 60 * 60,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: str = DEFAULT_CACHE_PATH,
+    ):
+        """
+        Initializes the cache of LLM completions, keyed by the model, its sampling parameters (e.g., temperature and stop sequences) and the messages.
+
+        It plugs into LangChain as the cache of a single chat model, e.g., ChatOpenAI(cache=completion_cache), so only the LLMs it is given to are cached. Completions served from the cache are marked with "cached" in their response metadata, so their tokens can be counted apart from the tokens sent to the API.
+
+        :param ttl_seconds: The default time to live of a completion in seconds.
+        :param max_bytes: The maximum size of the stored completions in bytes.
+        :param path: The path of the SQLite database file.
+
+        :return: An instance of CompletionCache.
+        """
+
+        super().__init__(
+            name="completion",
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            path=path,
+        )
+
+        self._counters["tokens_saved"] = 0
+
+    def with_ttl(self, ttl_seconds: int):
+        """
+        Returns a view of the cache that stores completions with another time to live, sharing the storage and counters of the cache.
+
+        :param ttl_seconds: The time to live of a completion in seconds.
+        :return: An instance of CompletionCache.
+        """
+
+        completion_cache = copy.copy(self)
+        completion_cache.ttl_seconds = ttl_seconds
+
+        return completion_cache
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        """
+        Returns the cache key for the given messages and model.
+
+        :param prompt: The serialized messages, as passed by LangChain.
+        :param llm_string: The serialized model and sampling parameters, as passed by LangChain.
+        :return: The cache key.
+        """
+
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        """
+        Returns the cached completions for the given messages and model.
+
+        :param prompt: The serialized messages, as passed by LangChain.
+        :param llm_string: The serialized model and sampling parameters, as passed by LangChain.
+        :return: A list of ChatGeneration, or None if the completion is not cached.
+        """
+
+        cached_completion = self.get(self._key(prompt, llm_string))
+
+        if cached_completion is None:
+            return None
+
+        generations = [
+            ChatGeneration(
+                message=AIMessage(
+                    content=generation["text"],
+                    response_metadata={
+                        **generation["response_metadata"],
+                        "cached": True,
+                    },
+                    usage_metadata=generation["usage_metadata"],
+                )
+            )
+            for generation in json.loads(cached_completion[0])
+        ]
+
+        with self._lock:
+            self._counters["tokens_saved"] += sum(
+                (generation.message.usage_metadata or {}).get("total_tokens", 0)
+                for generation in generations
+            )
+
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: list):
+        """
+        Stores the completions for the given messages and model. Empty completions are not stored.
+
+        :param prompt: The serialized messages, as passed by LangChain.
+        :param llm_string: The serialized model and sampling parameters, as passed by LangChain.
+        :param return_val: A list of ChatGeneration.
+        """
+
+        if not any(generation.text for generation in return_val):
+            return
+
+        self.set(
+            self._key(prompt, llm_string),
+            json.dumps(
+                [
+                    {
+                        "text": generation.text,
+                        "response_metadata": generation.message.response_metadata,
+                        "usage_metadata": generation.message.usage_metadata,
+                    }
+                    for generation in return_val
+                ],
+                default=str,
+            ),
+        )
+
+    def clear(self, **kwargs):
+        """
+        Deletes all cached completions.
+        """
+
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self._entries_table}")
+            self._connection.execute(f"DELETE FROM {self._contents_table}")
@@ -0,0 +1,377 @@
+from collections import OrderedDict
+from exa_py import Exa
+from langchain_openai import ChatOpenAI
+from utils.http import pooled_session, session_stats
+from utils.ratelimit import get_rate_limiter, RateLimiter
+from utils.scraping import FirecrawlBulkScraper, DEFAULT_FIRECRAWL_API_URL
+import httpx
+import os
+import threading
+import time
+import weakref
+
+# AIML API base URL, compatible with the OpenAI API, overridden by the AIML_API_BASE environment variable
+AIML_API_BASE = os.environ.get("AIML_API_BASE", "https://api.aimlapi.com/v1")
+
+# Exa API base URL, overridden by the EXA_API_BASE environment variable
+EXA_API_BASE = os.environ.get("EXA_API_BASE", "https://api.exa.ai")
+
+# Default LLM, used by the agents of the large model tier and to write the unbiased news
+DEFAULT_MODEL_NAME = "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo"
+
+# LLM of every model tier, overridden by the CREW_NEWS_SMALL_MODEL and CREW_NEWS_LARGE_MODEL environment variables
+MODEL_TIERS = {
+    "small": os.environ.get(
+        "CREW_NEWS_SMALL_MODEL", "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"
+    ),
+    "large": os.environ.get("CREW_NEWS_LARGE_MODEL", DEFAULT_MODEL_NAME),
+}
+
+# Default maximum number of connections kept alive per client
+DEFAULT_POOL_MAXSIZE = 16
+
+
+class PooledExa(Exa):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = EXA_API_BASE,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        rate_limiter: RateLimiter = None,
+    ):
+        """
+        Initializes an Exa client that sends all requests over one pooled HTTP session.
+
+        Exa sends every request through a new connection by default, paying a TLS handshake per search.
+
+        :param api_key: The Exa API key.
+        :param base_url: The Exa API base URL.
+        :param pool_maxsize: The maximum number of connections kept alive.
+        :param rate_limiter: Optional RateLimiter every request is sent through.
+
+        :return: An instance of PooledExa.
+        """
+
+        super().__init__(api_key=api_key, base_url=base_url)
+
+        self.session = pooled_session(
+            headers=self.headers,
+            pool_maxsize=pool_maxsize,
+            rate_limiter=rate_limiter,
+        )
+
+    def request(self, endpoint: str, data):
+        """
+        Sends a request to the Exa API over the pooled HTTP session.
+
+        :param endpoint: The endpoint of the Exa API, e.g., "/search".
+        :param data: The JSON body of the request.
+        :return: The JSON response.
+        """
+
+        response = self.session.post(self.base_url + endpoint, json=data)
+
+        if response.status_code != 200:
+            raise ValueError(
+                f"Request failed with status code {response.status_code}: {response.text}"
+            )
+
+        return response.json()
+
+    def connection_stats(self) -> dict:
+        """
+        Returns the connection statistics of the pooled HTTP session.
+
+        :return: A dictionary as returned by session_stats.
+        """
+
+        return session_stats(self.session)
+
+    def close(self):
+        """
+        Closes the pooled HTTP session.
+        """
+
+        self.session.close()
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    def __init__(self, rate_limiter: RateLimiter, **kwargs):
+        """
+        Initializes an httpx transport that sends every request through the shared rate limiter of its provider.
+
+        :param rate_limiter: The RateLimiter of the provider.
+        :param kwargs: The keyword arguments of httpx.HTTPTransport, e.g., limits.
+
+        :return: An instance of RateLimitedTransport.
+        """
+
+        super().__init__(**kwargs)
+
+        self.rate_limiter = rate_limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """
+        Sends a request, waiting for the rate limit and retrying it with backoff on 429 and 5xx responses.
+
+        :param request: The httpx request.
+        :return: The httpx response.
+        """
+
+        return self.rate_limiter.send(
+            lambda: super(RateLimitedTransport, self).handle_request(request),
+            close_response=lambda response: response.close(),
+        )
+
+
+class HttpxConnectionStats:
+    def __init__(self):
+        """
+        Initializes the connection statistics of an httpx client, collected through its response event hook.
+
+        :return: An instance of HttpxConnectionStats.
+        """
+
+        self.requests = 0
+        self.connections = 0
+
+        self._lock = threading.Lock()
+        self._network_streams = weakref.WeakSet()
+
+    def on_response(self, response: httpx.Response):
+        """
+        Counts the response and, if it came over a connection not seen before, the connection.
+
+        :param response: The httpx response.
+        """
+
+        network_stream = response.extensions.get("network_stream")
+
+        with self._lock:
+            self.requests += 1
+
+            if (
+                network_stream is not None
+                and network_stream not in self._network_streams
+            ):
+                self._network_streams.add(network_stream)
+
+                self.connections += 1
+
+    def as_dict(self) -> dict:
+        """
+        Returns the connection statistics in the same shape as session_stats.
+
+        :return: A dictionary with the number of requests sent, connections opened, open connections and the connection reuse rate.
+        """
+
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "idle_connections": len(self._network_streams),
+                "reuse_rate": (
+                    1 - self.connections / self.requests if self.requests else 0.0
+                ),
+            }
+
+
+class ClientRegistry:
+    def __init__(self, max_clients: int = 32, idle_seconds: int = 30 * 60):
+        """
+        Initializes a registry of long-lived API clients, shared by all sessions in the process and keyed by API key.
+
+        Clients keep their HTTP connections alive between tool calls and runs. The least recently used clients are dropped when the registry is full, and clients of tenants that have been idle for too long are dropped on the next lookup. A dropped client isn't closed, since running crews may still hold it: its connections are closed once nothing references it anymore, by the finalizer its factory registers.
+
+        :param max_clients: The maximum number of clients kept in the registry.
+        :param idle_seconds: How long an unused client is kept in the registry in seconds.
+
+        :return: An instance of ClientRegistry.
+        """
+
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self.evictions = 0
+
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, factory):
+        """
+        Returns the client with the given key, creating it with the factory if it doesn't exist.
+
+        :param key: The key of the client, starting with its kind and API key, e.g., ("exa", api_key).
+        :param factory: A function returning a tuple of the client and a function returning its connection statistics.
+        :return: The client.
+        """
+
+        now = time.time()
+
+        with self._lock:
+            # Drop clients of idle tenants
+            for idle_key in [
+                client_key
+                for client_key, entry in self._clients.items()
+                if now - entry["last_used"] > self.idle_seconds and client_key != key
+            ]:
+                self._evict(idle_key)
+
+            if key not in self._clients:
+                client, stats = factory()
+
+                self._clients[key] = {
+                    "client": client,
+                    "stats": stats,
+                    "created": now,
+                }
+
+            entry = self._clients[key]
+            entry["last_used"] = now
+
+            self._clients.move_to_end(key)
+
+            # Drop the least recently used clients if the registry is full
+            while len(self._clients) > self.max_clients:
+                self._evict(next(iter(self._clients)))
+
+            return entry["client"]
+
+    def stats(self, api_keys: list = None) -> list:
+        """
+        Returns the connection statistics of every client in the registry.
+
+        :param api_keys: Optional list of API keys. If given, only the clients of these API keys are returned, so a session never sees the clients of other tenants.
+        :return: A list of dictionaries with the kind, the masked API key, the idle time in seconds and the connection statistics of each client.
+        """
+
+        now = time.time()
+
+        with self._lock:
+            entries = list(self._clients.items())
+
+        return [
+            {
+                "kind": key[0],
+                "api_key": f"...{key[1][-4:]}",
+                "idle_s": int(now - entry["last_used"]),
+                **entry["stats"](),
+            }
+            for key, entry in entries
+            if api_keys is None or key[1] in api_keys
+        ]
+
+    def _evict(self, key: tuple):
+        """
+        Removes the client with the given key, leaving it open for the runs still holding it. The caller must hold the lock.
+
+        :param key: The key of the client.
+        """
+
+        del self._clients[key]
+
+        self.evictions += 1
+
+
+# Initialize the client registry, shared by all sessions
+client_registry = ClientRegistry()
+
+
+def get_exa_client(api_key: str, base_url: str = EXA_API_BASE) -> PooledExa:
+    """
+    Returns the shared Exa client for the given API key.
+
+    :param api_key: The Exa API key.
+    :param base_url: The Exa API base URL.
+    :return: An instance of PooledExa.
+    """
+
+    def factory():
+        exa = PooledExa(
+            api_key=api_key,
+            base_url=base_url,
+            rate_limiter=get_rate_limiter("exa"),
+        )
+
+        # Close the connections once the client is no longer used, even after it was dropped from the registry
+        weakref.finalize(exa, exa.session.close)
+
+        return exa, exa.connection_stats
+
+    return client_registry.get(("exa", api_key, base_url), factory)
+
+
+def get_firecrawl_client(
+    api_key: str,
+    api_url: str = DEFAULT_FIRECRAWL_API_URL,
+) -> FirecrawlBulkScraper:
+    """
+    Returns the shared Firecrawl client for the given API key.
+
+    :param api_key: The Firecrawl API key.
+    :param api_url: The Firecrawl API URL.
+    :return: An instance of FirecrawlBulkScraper.
+    """
+
+    def factory():
+        firecrawl = FirecrawlBulkScraper(
+            api_key=api_key,
+            api_url=api_url,
+            max_workers=DEFAULT_POOL_MAXSIZE,
+            rate_limiter=get_rate_limiter("firecrawl"),
+        )
+
+        # Close the connections once the client is no longer used, even after it was dropped from the registry
+        weakref.finalize(firecrawl, firecrawl.session.close)
+
+        return firecrawl, firecrawl.connection_stats
+
+    return client_registry.get(("firecrawl", api_key, api_url), factory)
+
+
+def get_chat_llm(
+    api_key: str,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_base: str = AIML_API_BASE,
+) -> ChatOpenAI:
+    """
+    Returns the shared ChatOpenAI LLM for the given API key and model, backed by a pooled httpx client.
+
+    Requests go through the shared AIML rate limiter, which retries 429 and 5xx responses with backoff, so the OpenAI client's own retries are turned off.
+
+    :param api_key: The AIML API key.
+    :param model_name: The name of the model.
+    :param api_base: The base URL of the OpenAI-compatible API.
+    :return: An instance of ChatOpenAI.
+    """
+
+    def factory():
+        connection_stats = HttpxConnectionStats()
+
+        transport = RateLimitedTransport(
+            get_rate_limiter("aiml"),
+            limits=httpx.Limits(
+                max_connections=DEFAULT_POOL_MAXSIZE,
+                max_keepalive_connections=DEFAULT_POOL_MAXSIZE,
+            ),
+        )
+
+        http_client = httpx.Client(
+            transport=transport,
+            event_hooks={"response": [connection_stats.on_response]},
+            timeout=httpx.Timeout(600, connect=10),
+        )
+
+        llm = ChatOpenAI(
+            openai_api_base=api_base,
+            api_key=api_key,
+            model_name=model_name,
+            http_client=http_client,
+            max_retries=0,
+        )
+
+        # Close the connections once no agent uses the httpx client anymore. The agents' copies of the LLM share it, so it outlives the LLM itself
+        weakref.finalize(http_client, transport.close)
+
+        return llm, connection_stats.as_dict
+
+    return client_registry.get(("aiml", api_key, model_name, api_base), factory)
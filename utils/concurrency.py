@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import streamlit as st
+import threading
+
+# Default number of media providers searched and scraped at the same time in the fan-out mode
+DEFAULT_MAX_WORKERS = 4
+
+# State of the crew run each thread works for, inherited by the worker threads of streamlit_thread_pool
+_thread_local = threading.local()
+
+
+@contextmanager
+def run_state_scope():
+    """
+    Gives the calling thread, and the worker threads of every streamlit_thread_pool it creates, a fresh run state until the block exits.
+
+    Without a run state of their own, concurrent runs of the same session (e.g., a batch of topics) would share the search state and the tracer kept in st.session_state.
+
+    :return: A context manager yielding the run state as a dictionary.
+    """
+
+    previous_run_state = getattr(_thread_local, "run_state", None)
+
+    _thread_local.run_state = {}
+
+    try:
+        yield _thread_local.run_state
+    finally:
+        _thread_local.run_state = previous_run_state
+
+
+def get_run_state():
+    """
+    Returns the state of the run the current thread works for.
+
+    :return: The run state of the current thread, or st.session_state outside of a run_state_scope.
+    """
+
+    run_state = getattr(_thread_local, "run_state", None)
+
+    return st.session_state if run_state is None else run_state
+
+
+def get_api_key(name: str, api_keys: dict = None) -> str:
+    """
+    Returns the API key with the given name.
+
+    Runs started outside of the Streamlit app, e.g., a batch run from a cron job, pass their API keys themselves instead of reading them from st.session_state.
+
+    :param name: The name of the API key, e.g., "exa_api_key".
+    :param api_keys: Optional API keys by name, e.g., the ones of a crew.
+    :return: The API key from the given API keys, else from the API keys of the current run, else from st.session_state.
+    """
+
+    if api_keys and api_keys.get(name):
+        return api_keys[name]
+
+    run_state = getattr(_thread_local, "run_state", None)
+
+    if run_state and run_state.get("api_keys", {}).get(name):
+        return run_state["api_keys"][name]
+
+    return st.session_state[name]
+
+
+def streamlit_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """
+    Returns a ThreadPoolExecutor whose worker threads share the Streamlit script run context and the run state of the calling thread.
+
+    Without the script run context, worker threads can't read st.session_state, where the API keys of the app's sessions are stored.
+
+    :param max_workers: The maximum number of worker threads.
+    :return: A ThreadPoolExecutor.
+    """
+
+    ctx = get_script_run_ctx()
+
+    run_state = getattr(_thread_local, "run_state", None)
+
+    def initializer():
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+        _thread_local.run_state = run_state
+
+    return ThreadPoolExecutor(
+        max_workers=max(1, max_workers),
+        initializer=initializer,
+    )
@@ -1,19 +1,202 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from crewai import Crew, Process
-from utils.agents import UnbiasedNewsAgents
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.task_output import TaskOutput
+from crewai.types.usage_metrics import UsageMetrics
+from utils.agents import UnbiasedNewsAgents, DEFAULT_ROLE_TIERS
 from utils.tasks import UnbiasedNewsTasks
-from langchain_openai import ChatOpenAI
-import streamlit as st
-
-# Initialize Llama 3.1 70B LLM
-llm = ChatOpenAI(
-    openai_api_base="https://api.aimlapi.com/v1",
-    api_key=st.session_state["aiml_api_key"],
-    model_name="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
+from utils.tools import UnbiasedNewsTools, DEFAULT_SCRAPING_WORKERS
+from utils.formatting import DEFAULT_SEARCH_TOKEN_BUDGET, estimate_tokens
+from utils.extraction import format_article
+from utils.concurrency import (
+    streamlit_thread_pool,
+    run_state_scope,
+    get_api_key,
+    DEFAULT_MAX_WORKERS,
 )
+from utils.parsing import parse_json_output
+from utils.outputs import (
+    MediaProvidersWithDomains,
+    NewsUrlsList,
+    NewsContentList,
+    VALID,
+    REPAIRED,
+    ESCALATED,
+    RETRIED,
+    FAILED,
+)
+from utils.quota import (
+    DiscoveryQuota,
+    interleave_by_leaning,
+    DEFAULT_URLS_PER_PROVIDER,
+    DEFAULT_PROVIDERS_PER_LEANING,
+    DEFAULT_TOTAL_ARTICLES,
+)
+from utils.registry import get_registry
+from utils.dedup import deduplicate_articles
+from utils.pipeline import ScrapingPipeline, DEFAULT_SCRAPING_QUEUE_SIZE
+from utils.search import (
+    published_since,
+    results_per_query,
+    DEFAULT_PUBLISHED_WITHIN_DAYS,
+)
+from utils.clients import get_chat_llm, MODEL_TIERS
+from utils.tracing import Tracer, LLMTracingHandler
+import time
+
+# Default number of digests written at the same time in the map-reduce synthesis mode
+DEFAULT_SYNTHESIS_WORKERS = 4
+
+# Default approximate maximum length of a digest in tokens in the map-reduce synthesis mode
+DEFAULT_DIGEST_TOKENS = 800
+
+# Result of a run that found no written content to write the unbiased news from
+NO_WRITTEN_CONTENT_MESSAGE = "No written content was found on this topic, so no unbiased news could be written. Try again later or with a different topic."
+
+
+def parse_news_urls(output) -> list:
+    """
+    Returns the URLs of written content the written content expert returned.
+
+    :param output: The TaskOutput of the written content URLs task, or the CrewOutput of a crew ending with it.
+    :return: A list of unique URLs in the order they were returned.
+    """
+
+    # Take the validated output, and parse the raw output only if the validation failed
+    if isinstance(output.pydantic, NewsUrlsList):
+        items = output.pydantic.model_dump()["items"]
+    else:
+        items = parse_json_output(output.raw)
+
+    news_urls = []
+
+    for item in items:
+        if isinstance(item, dict):
+            news_urls.extend(
+                url for url in item.get("news_urls", []) if isinstance(url, str)
+            )
+
+    return list(dict.fromkeys(news_urls))
+
+
+def format_news_content(output) -> str:
+    """
+    Returns the written content the text extraction expert returned as plain text.
+
+    :param output: The TaskOutput of the written content task, or the CrewOutput of a crew ending with it.
+    :return: The written content of all URLs, or the raw output if the validation failed.
+    """
+
+    if not isinstance(output.pydantic, NewsContentList):
+        return output.raw
+
+    return "\n\n".join(
+        news_content
+        for item in output.pydantic.items
+        for news_content in item.news_content
+    )
+
+
+def format_scraped_pages(scraped_pages: list) -> str:
+    """
+    Formats scraped pages as written content for the unbiased journalist.
+
+    Only the extracted article of every page is kept. Pages that failed to scrape or have no article body are skipped.
+
+    :param scraped_pages: A list of dictionaries as returned by UnbiasedNewsTools.scrape_urls, optionally with the "duplicates" found by deduplicate_articles.
+    :return: The written content of all scraped pages, each one preceded by its URL, headline, byline, publish date and the other media providers that published it.
+    """
+
+    return "\n\n".join(
+        format_article(
+            scraped_page["url"],
+            scraped_page["article"],
+            scraped_page.get("duplicates"),
+        )
+        for scraped_page in scraped_pages
+        if scraped_page.get("article", {}).get("body")
+    )
+
+
+def summarize_scraped_pages(scraped_pages: list) -> dict:
+    """
+    Returns the statistics of the bulk scraping stage.
+
+    :param scraped_pages: A list of dictionaries as returned by UnbiasedNewsTools.scrape_urls.
+    :return: A dictionary with the number of scraped and failed URLs, and the bytes and tokens the article extraction saved.
+    """
+
+    articles = [
+        scraped_page["article"]
+        for scraped_page in scraped_pages
+        if "article" in scraped_page
+    ]
+
+    return {
+        "scraped_urls": len(articles),
+        "failed_urls": len(scraped_pages) - len(articles),
+        "bytes_saved": sum(article["bytes_saved"] for article in articles),
+        "tokens_saved": sum(article["tokens_saved"] for article in articles),
+    }
+
+
+def format_section(media_provider: dict, written_content: str) -> str:
+    """
+    Formats the written content of a single media provider, preceded by its name and domain.
+
+    :param media_provider: A dictionary with the "name" and "domain" of the media provider.
+    :param written_content: The written content of the media provider.
+    :return: The formatted written content.
+    """
+
+    return f"Media provider: {media_provider['name']} ({media_provider['domain']})\n{written_content}"
+
+
+def merge_token_usage(crew_outputs: list) -> UsageMetrics:
+    """
+    Sums the token usage of multiple crew outputs.
+
+    :param crew_outputs: A list of CrewOutput objects.
+    :return: The summed UsageMetrics.
+    """
+
+    token_usage = UsageMetrics()
+
+    for crew_output in crew_outputs:
+        token_usage.add_usage_metrics(crew_output.token_usage)
+
+    return token_usage
 
 
 class UnbiasedNewsCrew:
-    def __init__(self, topic: str, selected_country: str):
+    def __init__(
+        self,
+        topic: str,
+        selected_country: str,
+        fan_out: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        bulk_scraping: bool = True,
+        scraping_workers: int = DEFAULT_SCRAPING_WORKERS,
+        pipelined: bool = True,
+        scraping_queue_size: int = DEFAULT_SCRAPING_QUEUE_SIZE,
+        direct_search: bool = True,
+        published_within_days: int = DEFAULT_PUBLISHED_WITHIN_DAYS,
+        search_token_budget: int = DEFAULT_SEARCH_TOKEN_BUDGET,
+        deduplicate: bool = True,
+        synthesis_mode: str = "single",
+        synthesis_workers: int = DEFAULT_SYNTHESIS_WORKERS,
+        digest_tokens: int = DEFAULT_DIGEST_TOKENS,
+        digest_group_by: str = "media_provider",
+        urls_per_provider: int = DEFAULT_URLS_PER_PROVIDER,
+        providers_per_leaning: int = DEFAULT_PROVIDERS_PER_LEANING,
+        total_articles: int = DEFAULT_TOTAL_ARTICLES,
+        role_tiers: dict = DEFAULT_ROLE_TIERS,
+        escalation: bool = True,
+        api_keys: dict = None,
+        on_progress=None,
+        on_token=None,
+    ):
         """
         Initializes the UnbiasedNewsCrew.
 
@@ -21,23 +204,105 @@ class UnbiasedNewsCrew:
 
         :param topic: The topic for which to get the unbiased news.
         :param selected_country: The country for which to get the unbiased news.
+        :param fan_out: Whether to search and scrape every media provider in its own sub-pipeline instead of one sequential chain. The direct search overrides it, so it only applies with direct_search=False or bulk_scraping=False.
+        :param max_workers: The maximum number of media provider sub-pipelines running at the same time in the fan-out mode, and of media providers searched at the same time in the direct search mode.
+        :param bulk_scraping: Whether to scrape the URLs of written content directly instead of through the text extraction expert.
+        :param scraping_workers: The maximum number of URLs scraped at the same time by the bulk scraping stage.
+        :param pipelined: Whether the bulk scraping stage starts scraping URLs while the search stage is still running, instead of after it.
+        :param scraping_queue_size: The maximum number of URLs waiting to be scraped in the pipelined mode. Once the queue is full, the search stage waits for the scraping workers.
+        :param direct_search: Whether the bulk scraping modes search every media provider with one Exa query restricted to its domain, up to max_workers at the same time, instead of through the written content expert. It overrides fan_out: with bulk_scraping, the direct search runs whether fan_out is True or False.
+        :param published_within_days: The number of days back an article may be published to be found by the direct search stage.
+        :param search_token_budget: The maximum number of tokens of a single search result listing passed to the written content expert.
+        :param deduplicate: Whether to keep only one article of near-duplicates (e.g., syndicated wire stories) scraped by the bulk scraping stage.
+        :param synthesis_mode: Either "single" to write the unbiased news in one completion from all written content, or "map_reduce" to write a digest per group of media providers in parallel first and merge the digests. Applies to the fan-out and bulk scraping modes.
+        :param synthesis_workers: The maximum number of digests written at the same time in the map-reduce synthesis mode.
+        :param digest_tokens: The approximate maximum length of a digest in tokens in the map-reduce synthesis mode.
+        :param digest_group_by: Either "media_provider" for a digest per media provider, or "leaning" for a digest per political leaning in the map-reduce synthesis mode.
+        :param urls_per_provider: The number of URLs of written content kept per media provider.
+        :param providers_per_leaning: The number of media providers kept per political leaning. The URL discovery stops as soon as every leaning has this many media providers with urls_per_provider URLs.
+        :param total_articles: The maximum number of URLs of written content kept across all media providers.
+        :param role_tiers: The model tier of every agent role, "small" or "large". Roles without a tier run on the large model.
+        :param escalation: Whether agents on the small model run a task again on the large model if their output fails validation.
+        :param api_keys: Optional API keys by name ("aiml_api_key", "exa_api_key" and "firecrawl_api_key"), so the crew can run outside of the app, e.g., from a script. Otherwise, the API keys are read from st.session_state.
+        :param on_progress: Optional function called with a short message every time a stage makes progress (media providers found, URLs found, pages scraped). It may be called from worker threads.
+        :param on_token: Optional function called with every chunk of the unbiased news as the LLM streams it. If given, the unbiased journalist's completion is streamed instead of returned at once.
 
         :return: An instance of UnbiasedNewsCrew.
         """
 
+        self.topic = topic
+        self.selected_country = selected_country
+        self.fan_out = fan_out
+        self.max_workers = max(1, max_workers)
+        self.bulk_scraping = bulk_scraping
+        self.scraping_workers = max(1, scraping_workers)
+        self.pipelined = pipelined
+        self.scraping_queue_size = scraping_queue_size
+        self.direct_search = direct_search
+        self.published_within_days = published_within_days
+        self.search_token_budget = search_token_budget
+        self.deduplicate = deduplicate
+        self.synthesis_mode = synthesis_mode
+        self.synthesis_workers = max(1, synthesis_workers)
+        self.digest_tokens = digest_tokens
+        self.digest_group_by = digest_group_by
+        self.urls_per_provider = urls_per_provider
+        self.providers_per_leaning = providers_per_leaning
+        self.total_articles = total_articles
+        self.role_tiers = role_tiers
+        self.escalation = escalation
+        self.api_keys = api_keys
+        self.on_progress = on_progress
+        self.on_token = on_token
+
+        # Scraping pipeline of the current run, if the pipelined bulk scraping stage is running
+        self.scraping_pipeline = None
+
+        # Collect run details (stage timings in milliseconds, fan-out statistics)
+        self.run_details = {}
+
+        # Start time of the current run, to measure the time to the first progress message and the first token
+        self.start_time = time.time()
+
+        # Take the media providers and their domains from the registry if it covers the country, every political leaning in turn
+        self.media_providers = interleave_by_leaning(
+            get_registry().get_media_providers(selected_country)
+        )
+
+        self.run_details["media_provider_source"] = (
+            "registry" if self.media_providers else "agents"
+        )
+
+        # Get the shared LLM of the large model tier, which writes the unbiased news
+        self.llm = get_chat_llm(
+            get_api_key("aiml_api_key", api_keys), MODEL_TIERS["large"]
+        )
+
+        # Record spans of every stage, task, LLM call and tool call of the run
+        self.tracer = Tracer()
+
+        # Track the URL quotas of the run, which also bound the iterations of the search and scraping agents
+        self.quota = self._new_quota()
+
+        self.run_details["trace_id"] = self.tracer.trace_id
+
         # Instantiate agents and tasks for the crew
-        agents = UnbiasedNewsAgents()
+        agents = self._agents()
 
-        tasks = UnbiasedNewsTasks()
+        tasks = UnbiasedNewsTasks(self.tracer)
 
         # Create agent instances for various roles
         self.media_expert = agents.media_expert_agent()
 
         self.web_domain_expert = agents.web_domain_expert_agent()
 
-        self.written_content_expert = agents.written_content_expert_agent()
+        self.written_content_expert = agents.written_content_expert_agent(
+            max_iter=self.quota.max_search_iterations(),
+        )
 
-        self.text_extraction_expert = agents.text_extraction_expert_agent()
+        self.text_extraction_expert = agents.text_extraction_expert_agent(
+            max_iter=self.quota.max_scrape_iterations(),
+        )
 
         self.unbiased_journalist = agents.unbiased_journalist_agent()
 
@@ -55,6 +320,8 @@ class UnbiasedNewsCrew:
             tasks.get_media_provider_written_content_urls_task(
                 self.written_content_expert,
                 topic,
+                media_providers=self.media_providers,
+                quota=self.quota,
             )
         )
 
@@ -66,36 +333,1341 @@ class UnbiasedNewsCrew:
             self.unbiased_journalist,
         )
 
+        # Skip the media expert and the web domain expert if the media providers are taken from the registry
+        self.discovery_agents = []
+
+        self.discovery_tasks = []
+
+        if not self.media_providers:
+            self.discovery_agents = [
+                self.media_expert,
+                self.web_domain_expert,
+            ]
+
+            self.discovery_tasks = [
+                self.get_media_providers,
+                self.get_media_provider_web_domain,
+            ]
+
         # Create the crew with the specified agents and tasks
         self.crew = Crew(
             agents=[
-                self.media_expert,
-                self.web_domain_expert,
+                *self.discovery_agents,
                 self.written_content_expert,
                 self.text_extraction_expert,
                 self.unbiased_journalist,
             ],
             tasks=[
-                self.get_media_providers,
-                self.get_media_provider_web_domain,
+                *self.discovery_tasks,
                 self.get_media_provider_written_content_urls,
                 self.get_written_content_from_url,
                 self.get_unbiased_news,
             ],
-            manager_llm=llm,
+            manager_llm=self.llm,
             process=Process.sequential,
             share_crew=False,
             verbose=True,
+            task_callback=self._sequential_task_callback,
         )
 
-    def start_news_agents(self):
+    def _agents(self) -> UnbiasedNewsAgents:
         """
-        Starts all the agents in the crew.
+        Returns the agent factory of the run, with the model tiers of the crew.
 
-        This function returns the result of the crew's kickoff function, which is a dictionary
-        containing the results of all the tasks in the crew.
+        :return: An instance of UnbiasedNewsAgents.
+        """
 
-        :return: The result of the crew's tasks.
+        return UnbiasedNewsAgents(
+            self.tracer,
+            role_tiers=self.role_tiers,
+            escalation=self.escalation,
+            api_keys=self.api_keys,
+        )
+
+    def _new_quota(self) -> DiscoveryQuota:
         """
+        Returns a fresh URL discovery quota with the quotas of the crew.
 
-        return self.crew.kickoff()
+        :return: An instance of DiscoveryQuota.
+        """
+
+        return DiscoveryQuota(
+            urls_per_provider=self.urls_per_provider,
+            providers_per_leaning=self.providers_per_leaning,
+            total_articles=self.total_articles,
+        )
+
+    def _sequential_task_callback(self, task_output):
+        """
+        Records the span of a finished task of the sequential chain and reports it as progress.
+
+        The URLs of the written content expert are counted against the quotas, so the coverage of the run is reported in the sequential chain too.
+
+        :param task_output: The TaskOutput of the finished task.
+        """
+
+        self._trace_sequential_task(task_output)
+
+        if task_output.agent == self.written_content_expert.role:
+            self.quota.add_urls(parse_news_urls(task_output))
+
+        self._report_progress(f"{task_output.agent} finished a task")
+
+    def _report_progress(self, message: str):
+        """
+        Passes a progress message to the on_progress function and records the time to the first progress message in the run details.
+
+        :param message: The progress message.
+        """
+
+        self.run_details.setdefault(
+            "first_progress_ms", int((time.time() - self.start_time) * 1000)
+        )
+
+        if self.on_progress:
+            self.on_progress(message)
+
+    def _get_media_providers_with_domains(self):
+        """
+        Returns the media providers and their domains, from the registry if it covers the country, otherwise by running the media provider and web domain tasks in their own crew.
+
+        :return: A tuple of the CrewOutput (None if the registry was used) and a list of dictionaries with the "name" and "domain" of each media provider.
+        """
+
+        if self.media_providers:
+            self._report_progress(
+                f"Found {len(self.media_providers)} media providers in the registry"
+            )
+
+            return None, self.media_providers
+
+        discovery_crew = Crew(
+            agents=[
+                self.media_expert,
+                self.web_domain_expert,
+            ],
+            tasks=[
+                self.get_media_providers,
+                self.get_media_provider_web_domain,
+            ],
+            process=Process.sequential,
+            share_crew=False,
+            verbose=True,
+            task_callback=self.tracer.task_callback(),
+        )
+
+        with self.tracer.span("stage", "Media provider discovery"):
+            discovery_output = discovery_crew.kickoff()
+
+        # Take the validated media providers, and keep only the ones with both a name and a domain if the validation failed
+        if isinstance(discovery_output.pydantic, MediaProvidersWithDomains):
+            media_providers = discovery_output.pydantic.model_dump(exclude_none=True)[
+                "items"
+            ]
+        else:
+            media_providers = [
+                media_provider
+                for media_provider in parse_json_output(discovery_output.raw)
+                if isinstance(media_provider, dict)
+                and media_provider.get("name")
+                and media_provider.get("domain")
+            ]
+
+        self._report_progress(f"Found {len(media_providers)} media providers")
+
+        return discovery_output, media_providers
+
+    def _scrape_news_urls(self, news_urls: list, media_provider: dict = None) -> list:
+        """
+        Runs the bulk scraping stage on the URLs of written content kept by the quotas.
+
+        :param news_urls: The URLs of written content.
+        :param media_provider: Optional dictionary with the "name" of the media provider all URLs belong to. Otherwise, the media provider of every URL is looked up in the registry by its domain.
+        :return: A list of scraped pages as returned by UnbiasedNewsTools.scrape_urls, each with the name of its "media_provider".
+        """
+
+        with self.tracer.span("stage", "Bulk scraping", urls=len(news_urls)):
+            scraped_pages = UnbiasedNewsTools.scrape_urls(
+                news_urls,
+                max_workers=self.scraping_workers,
+            )
+
+        self._report_progress(
+            f"Scraped {sum(1 for scraped_page in scraped_pages if 'article' in scraped_page)} of {len(news_urls)} pages"
+            + (f" from {media_provider['name']}" if media_provider else "")
+        )
+
+        return self._assign_media_providers(scraped_pages, media_provider)
+
+    def _assign_media_providers(
+        self, scraped_pages: list, media_provider: dict = None
+    ) -> list:
+        """
+        Sets the name of the "media_provider" of every scraped page.
+
+        :param scraped_pages: A list of scraped pages as returned by UnbiasedNewsTools.scrape_urls.
+        :param media_provider: Optional dictionary with the "name" of the media provider all pages belong to. Otherwise, the media provider of every page is looked up in the registry by its domain.
+        :return: The same scraped pages.
+        """
+
+        for scraped_page in scraped_pages:
+            page_media_provider = media_provider or get_registry().find_by_domain(
+                scraped_page["url"]
+            )
+
+            scraped_page["media_provider"] = (
+                page_media_provider["name"] if page_media_provider else None
+            )
+
+        return scraped_pages
+
+    @contextmanager
+    def _run_scraping_pipeline(self):
+        """
+        Runs the scraping pipeline of the run in the wrapped block, so URLs are scraped while the search stage is still finding more. The Exa custom tool puts the candidate URLs of every search on it.
+
+        :return: A context manager yielding the ScrapingPipeline, or None if the bulk scraping stage isn't pipelined.
+        """
+
+        if not (self.bulk_scraping and self.pipelined):
+            yield None
+
+            return
+
+        scraping_pipeline = ScrapingPipeline(
+            scrape_url=UnbiasedNewsTools.scrape_page,
+            workers=self.scraping_workers,
+            queue_size=self.scraping_queue_size,
+            on_page=lambda scraped_page: self._report_progress(
+                f"Scraped {scraped_page['url']}"
+                if "article" in scraped_page
+                else f"Failed to scrape {scraped_page['url']}"
+            ),
+        )
+
+        self.scraping_pipeline = scraping_pipeline
+
+        UnbiasedNewsTools.set_scraping_pipeline(scraping_pipeline)
+
+        try:
+            with scraping_pipeline:
+                yield scraping_pipeline
+        finally:
+            UnbiasedNewsTools.set_scraping_pipeline(None)
+
+            self.scraping_pipeline = None
+
+    def _finish_scraping_pipeline(
+        self, scraping_pipeline: ScrapingPipeline, search_end_time: float
+    ):
+        """
+        Waits until the scraping pipeline scraped every URL submitted, and records the scraping stage, its overlap with the search stage and the statistics of the pipeline.
+
+        :param scraping_pipeline: The ScrapingPipeline of the run.
+        :param search_end_time: The time the search stage finished.
+        """
+
+        scraping_pipeline.join()
+
+        pipeline_stats = scraping_pipeline.stats()
+
+        first_scrape_start = pipeline_stats.pop("pipeline_first_scrape_start")
+        last_scrape_end = pipeline_stats.pop("pipeline_last_scrape_end")
+
+        self.run_details.update(pipeline_stats)
+
+        if first_scrape_start is None:
+            return
+
+        self.tracer.record(
+            "stage",
+            "Pipelined scraping",
+            start=first_scrape_start,
+            wall_ms=int((last_scrape_end - first_scrape_start) * 1000),
+            attributes={"urls": pipeline_stats["pipeline_scraped_urls"]},
+        )
+
+        # Time the scraping ran while the search stage was still running
+        self.run_details["stage_overlap_ms"] = max(
+            0, int((min(search_end_time, last_scrape_end) - first_scrape_start) * 1000)
+        )
+
+    def _deduplicate_scraped_pages(self, scraped_pages: list) -> list:
+        """
+        Keeps one article of every cluster of near-duplicates and records the statistics of the stage in the run details.
+
+        :param scraped_pages: A list of scraped pages as returned by _scrape_news_urls.
+        :return: The representative pages, or all scraped articles if deduplication is disabled.
+        """
+
+        articles = [
+            scraped_page
+            for scraped_page in scraped_pages
+            if scraped_page.get("article", {}).get("body")
+        ]
+
+        if not self.deduplicate:
+            return articles
+
+        start_time = time.time()
+
+        with self.tracer.span("stage", "Deduplication", articles=len(articles)):
+            representative_pages, dedup_stats = deduplicate_articles(articles)
+
+        self.run_details.update(dedup_stats)
+
+        if dedup_stats["duplicate_articles"]:
+            self._report_progress(
+                f"Removed {dedup_stats['duplicate_articles']} near-duplicate articles"
+            )
+
+        self.run_details["dedup_ms"] = int((time.time() - start_time) * 1000)
+
+        return representative_pages
+
+    def _run_media_provider_pipeline(self, media_provider: dict):
+        """
+        Searches and scrapes the written content of a single media provider.
+
+        Every sub-pipeline gets its own agents, because agents keep state while they are executing a task. Only the URLs that fit the quotas of the run are kept, and a media provider that comes back with fewer URLs than its quota gives its slot to the next media provider of its leaning.
+
+        :param media_provider: A dictionary with the "name" and "domain" of the media provider.
+        :return: A dictionary with the media provider, its written content (or scraped pages in the bulk scraping mode), its CrewOutput, the URLs kept and the elapsed time in milliseconds.
+        """
+
+        start_time = time.time()
+
+        agents = self._agents()
+
+        tasks = UnbiasedNewsTasks(self.tracer)
+
+        written_content_expert = agents.written_content_expert_agent(
+            max_iter=self.quota.max_search_iterations(1),
+        )
+
+        media_provider_agents = [written_content_expert]
+
+        media_provider_tasks = [
+            tasks.get_media_provider_written_content_urls_task(
+                written_content_expert,
+                self.topic,
+                media_provider,
+                quota=self.quota,
+            )
+        ]
+
+        # Let the text extraction expert scrape the URLs only if the bulk scraping stage is disabled
+        if not self.bulk_scraping:
+            text_extraction_expert = agents.text_extraction_expert_agent(
+                max_iter=self.quota.max_scrape_iterations(1),
+            )
+
+            media_provider_agents.append(text_extraction_expert)
+
+            media_provider_tasks.append(
+                tasks.get_written_content_from_url_task(
+                    text_extraction_expert,
+                )
+            )
+
+        media_provider_crew = Crew(
+            agents=media_provider_agents,
+            tasks=media_provider_tasks,
+            process=Process.sequential,
+            share_crew=False,
+            verbose=True,
+            task_callback=self.tracer.task_callback(),
+        )
+
+        with self.tracer.span(
+            "stage",
+            "Media provider search",
+            media_provider=media_provider["name"],
+        ):
+            media_provider_output = media_provider_crew.kickoff()
+
+        # Keep the URLs that fit the quotas, and free the slot of the media provider if it has too few of them
+        news_urls = self.quota.add_urls(
+            parse_news_urls(media_provider_output.tasks_output[0]),
+            media_provider,
+        )
+
+        self.quota.release(media_provider)
+
+        if self.bulk_scraping:
+            self._report_progress(
+                f"Found {len(news_urls)} URLs from {media_provider['name']}"
+            )
+        else:
+            self._report_progress(
+                f"Scraped written content from {media_provider['name']}"
+            )
+
+        written_content = format_news_content(media_provider_output)
+        scraped_pages = []
+
+        # Leave the URLs to the scraping pipeline, so the worker can search the next media provider right away
+        if self.scraping_pipeline is not None:
+            self.scraping_pipeline.submit_all(news_urls)
+        elif self.bulk_scraping:
+            scraped_pages = self._scrape_news_urls(
+                news_urls,
+                media_provider,
+            )
+
+        return {
+            "media_provider": media_provider,
+            "written_content": written_content,
+            "scraped_pages": scraped_pages,
+            "crew_output": media_provider_output,
+            "news_urls": news_urls,
+            "elapsed_ms": int((time.time() - start_time) * 1000),
+        }
+
+    def _write_unbiased_news(self, written_content: str):
+        """
+        Runs the unbiased news task in its own crew on written content collected outside of the crew.
+
+        :param written_content: The written content from multiple media providers.
+        :return: The CrewOutput of the unbiased journalist.
+        """
+
+        self._report_progress("Writing the unbiased news")
+
+        if self.on_token:
+            return self._stream_unbiased_news(written_content)
+
+        unbiased_journalist_crew = Crew(
+            agents=[
+                self.unbiased_journalist,
+            ],
+            tasks=[
+                UnbiasedNewsTasks(self.tracer).get_unbiased_news_task(
+                    self.unbiased_journalist,
+                    written_content,
+                ),
+            ],
+            process=Process.sequential,
+            share_crew=False,
+            verbose=True,
+            task_callback=self.tracer.task_callback(),
+        )
+
+        return unbiased_journalist_crew.kickoff()
+
+    def _stream_unbiased_news(self, written_content: str):
+        """
+        Streams the unbiased news task straight from the LLM, passing every chunk to the on_token function.
+
+        The unbiased journalist has no tools and a single iteration, so its prompt is built the same way the crew builds it and sent in one streamed completion. The time to the first token is recorded in the run details.
+
+        :param written_content: The written content from multiple media providers.
+        :return: A CrewOutput of the unbiased journalist, in the same shape as the one of its crew.
+        """
+
+        unbiased_news_task = UnbiasedNewsTasks(self.tracer).get_unbiased_news_task(
+            self.unbiased_journalist,
+            written_content,
+        )
+
+        messages = [
+            (
+                "system",
+                f"You are {self.unbiased_journalist.role}. {self.unbiased_journalist.backstory}\nYour personal goal is: {self.unbiased_journalist.goal}",
+            ),
+            (
+                "human",
+                f"{unbiased_news_task.description}\n\nThis is the expected criteria for your final answer: {unbiased_news_task.expected_output}\nYou MUST return the actual complete content as the final answer, not a summary.",
+            ),
+        ]
+
+        chunks = []
+        usage_metadata = None
+
+        start_time = time.time()
+
+        for chunk in self.llm.stream(
+            messages,
+            config={
+                "callbacks": [
+                    LLMTracingHandler(
+                        self.tracer,
+                        self.unbiased_journalist.role,
+                        attributes={"model": self.llm.model_name, "tier": "large"},
+                    )
+                ]
+            },
+            stream_usage=True,
+        ):
+            if chunk.usage_metadata:
+                usage_metadata = chunk.usage_metadata
+
+            if not chunk.content:
+                continue
+
+            self.run_details.setdefault(
+                "first_token_ms", int((time.time() - self.start_time) * 1000)
+            )
+
+            chunks.append(chunk.content)
+
+            self.on_token(chunk.content)
+
+        raw = "".join(chunks)
+
+        self.tracer.record(
+            "task",
+            self.unbiased_journalist.role,
+            start=start_time,
+            wall_ms=int((time.time() - start_time) * 1000),
+            bytes_out=len(unbiased_news_task.description.encode("utf-8")),
+            bytes_in=len(raw.encode("utf-8")),
+            attributes={"streamed": True},
+        )
+
+        # Estimate the token usage if the API doesn't report it for streamed completions
+        if usage_metadata:
+            prompt_tokens = usage_metadata["input_tokens"]
+            completion_tokens = usage_metadata["output_tokens"]
+        else:
+            prompt_tokens = sum(estimate_tokens(content) for _, content in messages)
+            completion_tokens = estimate_tokens(raw)
+
+        return CrewOutput(
+            raw=raw,
+            tasks_output=[
+                TaskOutput(
+                    description=unbiased_news_task.description,
+                    expected_output=unbiased_news_task.expected_output,
+                    raw=raw,
+                    agent=self.unbiased_journalist.role,
+                )
+            ],
+            token_usage=UsageMetrics(
+                total_tokens=prompt_tokens + completion_tokens,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                successful_requests=1,
+            ),
+        )
+
+    def _write_digest(self, group: tuple):
+        """
+        Writes the digest of a single group of media providers, the map step of the map-reduce synthesis.
+
+        Every digest gets its own agent, because agents keep state while they are executing a task.
+
+        :param group: A tuple of the name of the group and its sections as formatted by format_section.
+        :return: A tuple of the name of the group, its CrewOutput and the elapsed time in milliseconds.
+        """
+
+        start_time = time.time()
+
+        group_name, sections = group
+
+        news_digest_agent = self._agents().news_digest_agent()
+
+        digest_crew = Crew(
+            agents=[
+                news_digest_agent,
+            ],
+            tasks=[
+                UnbiasedNewsTasks(self.tracer).get_news_digest_task(
+                    news_digest_agent,
+                    group_name,
+                    "\n\n".join(sections),
+                    self.digest_tokens,
+                ),
+            ],
+            process=Process.sequential,
+            share_crew=False,
+            verbose=True,
+            task_callback=self.tracer.task_callback(),
+        )
+
+        digest_output = digest_crew.kickoff()
+
+        self._report_progress(f"Wrote the digest of {group_name}")
+
+        return group_name, digest_output, int((time.time() - start_time) * 1000)
+
+    def _synthesize(self, sections: list) -> list:
+        """
+        Writes the unbiased news from the written content of all media providers.
+
+        In the "single" synthesis mode, all written content goes into one unbiased news completion. In the "map_reduce" synthesis mode, the media providers are grouped (per media provider or per political leaning), a digest per group is written in parallel, and the unbiased journalist merges the digests. The latency of every level is recorded in the run details.
+
+        :param sections: A list of tuples of the media provider (a dictionary with the "name", "domain" and optionally "leaning") and its written content.
+        :return: A list of the CrewOutput objects of the synthesis, the unbiased news last. If there is no written content, a single CrewOutput with NO_WRITTEN_CONTENT_MESSAGE and no token usage, without calling the LLM.
+        """
+
+        start_time = time.time()
+
+        # Don't let the unbiased journalist write from nothing, e.g., if every search failed or the topic has no results
+        if not any(written_content for _, written_content in sections):
+            self.run_details.update({"synthesis_skipped": True, "synthesis_ms": 0})
+
+            self._report_progress("Found no written content to write the news from")
+
+            if self.on_token:
+                self.on_token(NO_WRITTEN_CONTENT_MESSAGE)
+
+            return [
+                CrewOutput(
+                    raw=NO_WRITTEN_CONTENT_MESSAGE,
+                    tasks_output=[],
+                    token_usage=UsageMetrics(),
+                )
+            ]
+
+        if self.synthesis_mode != "map_reduce":
+            unbiased_news_output = self._write_unbiased_news(
+                "\n\n".join(
+                    format_section(media_provider, written_content)
+                    for media_provider, written_content in sections
+                )
+            )
+
+            self.run_details["synthesis_ms"] = int((time.time() - start_time) * 1000)
+
+            return [unbiased_news_output]
+
+        # Group the written content of the media providers
+        groups = {}
+
+        for media_provider, written_content in sections:
+            if self.digest_group_by == "leaning":
+                group_name = f"{media_provider.get('leaning', 'unknown')}-leaning media providers"
+            else:
+                group_name = media_provider["name"]
+
+            groups.setdefault(group_name, []).append(
+                format_section(media_provider, written_content)
+            )
+
+        # Map: write a digest per group on a bounded worker pool
+        with streamlit_thread_pool(self.synthesis_workers) as executor:
+            digest_results = list(executor.map(self._write_digest, groups.items()))
+
+        self.run_details["synthesis_map_ms"] = int((time.time() - start_time) * 1000)
+
+        # Reduce: merge the digests into the unbiased news
+        reduce_start_time = time.time()
+
+        unbiased_news_output = self._write_unbiased_news(
+            "\n\n".join(
+                f"Digest of {group_name}:\n{digest_output.raw}"
+                for group_name, digest_output, _ in digest_results
+            )
+        )
+
+        self.run_details.update(
+            {
+                "synthesis_mode": "map_reduce",
+                "digests": len(digest_results),
+                "synthesis_workers": self.synthesis_workers,
+                "synthesis_digest_max_ms": max(
+                    (elapsed_ms for _, _, elapsed_ms in digest_results), default=0
+                ),
+                "synthesis_reduce_ms": int((time.time() - reduce_start_time) * 1000),
+                "synthesis_ms": int((time.time() - start_time) * 1000),
+            }
+        )
+
+        return [digest_output for _, digest_output, _ in digest_results] + [
+            unbiased_news_output
+        ]
+
+    def _combine_crew_outputs(self, raw: str, crew_outputs: list):
+        """
+        Combines the outputs of multiple crews into a single CrewOutput.
+
+        :param raw: The raw output of the combined run.
+        :param crew_outputs: A list of CrewOutput objects in the order they were run. Stages that didn't run a crew are None and skipped.
+        :return: A CrewOutput with the task outputs and the token usage of all crews.
+        """
+
+        crew_outputs = [crew_output for crew_output in crew_outputs if crew_output]
+
+        return CrewOutput(
+            raw=raw,
+            tasks_output=[
+                task_output
+                for crew_output in crew_outputs
+                for task_output in crew_output.tasks_output
+            ],
+            token_usage=merge_token_usage(crew_outputs),
+        )
+
+    def _reconcile_token_usage(self, token_usage: UsageMetrics):
+        """
+        Takes the LLM calls served from the completion cache out of the token usage of the run and counts them in the run details instead.
+
+        CrewAI counts the prompt of every LLM call it makes, including cache hits, so the cached prompt tokens and requests are subtracted. It only counts completion tokens of streamed completions, so the completion tokens the API reported for the completions that weren't streamed (the agents with a cache don't stream) are added.
+
+        :param token_usage: The token usage of the run, updated in place.
+        """
+
+        llm_spans = [span for span in self.tracer.spans if span["kind"] == "llm"]
+
+        cached_spans = [span for span in llm_spans if span["attributes"].get("cached")]
+
+        cached_prompt_tokens = sum(span["prompt_tokens"] for span in cached_spans)
+        cached_completion_tokens = sum(
+            span["completion_tokens"] for span in cached_spans
+        )
+
+        token_usage.prompt_tokens = max(
+            0, token_usage.prompt_tokens - cached_prompt_tokens
+        )
+        token_usage.completion_tokens += sum(
+            span["completion_tokens"]
+            for span in llm_spans
+            if not span["attributes"].get("cached")
+            and not span["attributes"].get("streamed")
+        )
+        token_usage.total_tokens = (
+            token_usage.prompt_tokens + token_usage.completion_tokens
+        )
+        token_usage.successful_requests = max(
+            0, token_usage.successful_requests - len(cached_spans)
+        )
+
+        self.run_details.update(
+            {
+                "llm_cache_hits": len(cached_spans),
+                "llm_cache_prompt_tokens": cached_prompt_tokens,
+                "llm_cache_completion_tokens": cached_completion_tokens,
+            }
+        )
+
+    def _record_model_tiers(self):
+        """
+        Records the LLM calls, latency and tokens of every model tier in the run details.
+        """
+
+        model_tiers = {}
+
+        for tier, tier_summary in self.tracer.summary_by("tier").items():
+            model_tiers[tier] = {
+                "model": MODEL_TIERS.get(tier),
+                "calls": tier_summary["calls"],
+                "wall_ms": tier_summary["wall_ms"],
+                "avg_latency_ms": int(tier_summary["wall_ms"] / tier_summary["calls"]),
+                "prompt_tokens": tier_summary["prompt_tokens"],
+                "completion_tokens": tier_summary["completion_tokens"],
+            }
+
+        self.run_details["model_tiers"] = model_tiers
+
+    def _record_coverage(self):
+        """
+        Records the coverage of every political leaning by the URLs kept, and whether the URL quotas were met, in the run details.
+        """
+
+        coverage = self.quota.coverage()
+
+        self.run_details.update(
+            {
+                "coverage": coverage,
+                "discovery_urls": sum(
+                    leaning_coverage["urls"] for leaning_coverage in coverage.values()
+                ),
+                "discovery_quota_met": self.quota.met(),
+            }
+        )
+
+    def _record_output_validation(self):
+        """
+        Records the outcome of the output validation of every task in the run details: how many outputs were valid as is, repaired locally, valid after escalating the task to the large model, converted by the LLM or invalid, and the share of outputs that needed an LLM retry.
+        """
+
+        output_validation = {}
+
+        for span in self.tracer.spans:
+            if span["kind"] != "validation":
+                continue
+
+            task_validation = output_validation.setdefault(
+                span["name"],
+                {
+                    "outputs": 0,
+                    VALID: 0,
+                    REPAIRED: 0,
+                    ESCALATED: 0,
+                    RETRIED: 0,
+                    FAILED: 0,
+                    "escalations": 0,
+                },
+            )
+            task_validation["outputs"] += 1
+            task_validation[span["attributes"]["outcome"]] += 1
+            task_validation["escalations"] += int(
+                bool(span["attributes"].get("escalated"))
+            )
+
+        for task_validation in output_validation.values():
+            task_validation["retry_rate"] = round(
+                (
+                    task_validation["escalations"]
+                    + task_validation[RETRIED]
+                    + task_validation[FAILED]
+                )
+                / task_validation["outputs"],
+                3,
+            )
+
+        outputs = sum(
+            task_validation["outputs"] for task_validation in output_validation.values()
+        )
+
+        self.run_details.update(
+            {
+                "output_validation": output_validation,
+                "output_repairs": sum(
+                    task_validation[REPAIRED]
+                    for task_validation in output_validation.values()
+                ),
+                "output_escalations": sum(
+                    task_validation["escalations"]
+                    for task_validation in output_validation.values()
+                ),
+                "output_retry_rate": (
+                    round(
+                        sum(
+                            task_validation["escalations"]
+                            + task_validation[RETRIED]
+                            + task_validation[FAILED]
+                            for task_validation in output_validation.values()
+                        )
+                        / outputs,
+                        3,
+                    )
+                    if outputs
+                    else 0.0
+                ),
+            }
+        )
+
+    def _start_bulk_scraping(self):
+        """
+        Runs the sequential chain with the bulk scraping stage in place of the text extraction expert.
+
+        :return: A CrewOutput with the unbiased news and the token usage of all stages.
+        """
+
+        # Discover media providers, their domains and the URLs of written content, scraping the candidate URLs on the way if the stage is pipelined
+        with self._run_scraping_pipeline() as scraping_pipeline:
+            discovery_output, scraped_pages = self._discover_and_scrape(
+                scraping_pipeline
+            )
+
+        self.run_details.update(summarize_scraped_pages(scraped_pages))
+
+        # Keep one article of every cluster of near-duplicates, grouped by media provider
+        pages_by_media_provider = {}
+
+        for scraped_page in self._deduplicate_scraped_pages(scraped_pages):
+            pages_by_media_provider.setdefault(
+                scraped_page["media_provider"] or "Unknown media provider", []
+            ).append(scraped_page)
+
+        sections = [
+            (
+                get_registry().find_by_name(media_provider_name)
+                or {"name": media_provider_name, "domain": "unknown domain"},
+                format_scraped_pages(media_provider_pages),
+            )
+            for media_provider_name, media_provider_pages in pages_by_media_provider.items()
+        ]
+
+        # Write the unbiased news from the scraped written content
+        with self.tracer.span("stage", "Synthesis", mode=self.synthesis_mode):
+            synthesis_outputs = self._synthesize(sections)
+
+        return self._combine_crew_outputs(
+            synthesis_outputs[-1].raw,
+            [discovery_output, *synthesis_outputs],
+        )
+
+    def _discover_and_scrape(self, scraping_pipeline: ScrapingPipeline = None):
+        """
+        Runs the discovery crew of the sequential chain and scrapes the URLs of written content it kept.
+
+        :param scraping_pipeline: Optional ScrapingPipeline of the run. If given, the URLs found are scraped while the discovery crew is still running, and only the ones left are scraped afterwards.
+        :return: A tuple of the CrewOutput of the discovery crew and a list of the scraped pages of the URLs kept.
+        """
+
+        start_time = time.time()
+
+        discovery_crew = Crew(
+            agents=[
+                *self.discovery_agents,
+                self.written_content_expert,
+            ],
+            tasks=[
+                *self.discovery_tasks,
+                self.get_media_provider_written_content_urls,
+            ],
+            manager_llm=self.llm,
+            process=Process.sequential,
+            share_crew=False,
+            verbose=True,
+            task_callback=self.tracer.task_callback(),
+        )
+
+        with self.tracer.span("stage", "Discovery"):
+            discovery_output = discovery_crew.kickoff()
+
+        self.run_details["discovery_ms"] = int((time.time() - start_time) * 1000)
+
+        # Keep the URLs that fit the quotas
+        news_urls = self.quota.add_urls(parse_news_urls(discovery_output))
+
+        self._report_progress(f"Found {len(news_urls)} URLs")
+
+        # Scrape the URLs of written content, or wait for the pipeline to scrape the ones it hasn't yet
+        start_time = time.time()
+
+        if scraping_pipeline is None:
+            scraped_pages = self._scrape_news_urls(news_urls)
+        else:
+            search_end_time = time.time()
+
+            scraping_pipeline.submit_all(news_urls)
+
+            self._finish_scraping_pipeline(scraping_pipeline, search_end_time)
+
+            scraped_pages = self._assign_media_providers(
+                scraping_pipeline.pages(news_urls)
+            )
+
+        self.run_details["scraping_ms"] = int((time.time() - start_time) * 1000)
+
+        return discovery_output, scraped_pages
+
+    def _synthesize_media_provider_results(self, media_provider_results: list) -> list:
+        """
+        Writes the unbiased news from the results of all media providers, keeping one article of every cluster of near-duplicates across them in the bulk scraping mode.
+
+        :param media_provider_results: A list of dictionaries with the "media_provider" and its "written_content", or its "scraped_pages" in the bulk scraping mode, in the order of the media providers.
+        :return: A list of CrewOutput objects as returned by _synthesize.
+        """
+
+        # Keep one article of every cluster of near-duplicates across all media providers
+        if self.bulk_scraping:
+            scraped_pages = [
+                scraped_page
+                for result in media_provider_results
+                for scraped_page in result["scraped_pages"]
+            ]
+
+            self.run_details.update(summarize_scraped_pages(scraped_pages))
+
+            representative_pages = self._deduplicate_scraped_pages(scraped_pages)
+
+            for result in media_provider_results:
+                result["written_content"] = format_scraped_pages(
+                    [
+                        scraped_page
+                        for scraped_page in representative_pages
+                        if scraped_page["media_provider"]
+                        == result["media_provider"]["name"]
+                    ]
+                )
+
+        # Write the unbiased news from the written content of all media providers
+        with self.tracer.span("stage", "Synthesis", mode=self.synthesis_mode):
+            return self._synthesize(
+                [
+                    (result["media_provider"], result["written_content"])
+                    for result in media_provider_results
+                    if result["written_content"]
+                ]
+            )
+
+    def _search_media_provider_directly(
+        self, media_provider: dict, start_published_date: str
+    ) -> dict:
+        """
+        Searches the news articles of a single media provider with one Exa query restricted to its domain, without an agent.
+
+        Only the URLs that fit the quotas of the run are kept, and a media provider that comes back with fewer URLs than its quota gives its slot to the next media provider of its leaning. A failed search keeps no URLs, so one unreachable media provider doesn't stop the others.
+
+        :param media_provider: A dictionary with the "name" and "domain" of the media provider.
+        :param start_published_date: The earliest published date of the articles in ISO 8601 format.
+        :return: A dictionary with the media provider, the URLs found and kept, the error of the search if it failed, and the elapsed time of the search in milliseconds.
+        """
+
+        start_time = time.time()
+
+        error = None
+
+        try:
+            found_urls = UnbiasedNewsTools.search_media_provider(
+                self.topic,
+                media_provider,
+                num_results=results_per_query(self.urls_per_provider),
+                start_published_date=start_published_date,
+            )
+        except Exception as e:
+            found_urls = []
+
+            error = str(e)
+
+        # Keep the URLs that fit the quotas, and free the slot of the media provider if it has too few of them
+        news_urls = self.quota.add_urls(found_urls, media_provider)
+
+        self.quota.release(media_provider)
+
+        elapsed_ms = int((time.time() - start_time) * 1000)
+
+        self._report_progress(
+            f"Found {len(news_urls)} URLs from {media_provider['name']}"
+            if error is None
+            else f"Failed to search {media_provider['name']}"
+        )
+
+        # Start scraping the URLs right away, while the other media providers are still being searched
+        if self.scraping_pipeline is not None:
+            self.scraping_pipeline.submit_all(news_urls)
+
+        return {
+            "media_provider": media_provider,
+            "found_urls": found_urls,
+            "news_urls": news_urls,
+            "error": error,
+            "elapsed_ms": elapsed_ms,
+        }
+
+    def _search_media_providers_directly(self, media_providers: list) -> tuple:
+        """
+        Searches the media providers at the same time, one Exa query per media provider, every political leaning in turn until the URL quotas are met.
+
+        The media providers whose leaning has a free slot are searched at once, at most max_workers at a time. A media provider that comes back with too few URLs frees its slot, and the next media provider of its leaning is searched as soon as it does.
+
+        :param media_providers: A list of dictionaries with the "name" and "domain" of each media provider.
+        :return: A tuple of a list of dictionaries as returned by _search_media_provider_directly, in the order of the media providers, and the number of media providers that were never searched.
+        """
+
+        start_published_date = published_since(self.published_within_days)
+
+        pending_media_providers = interleave_by_leaning(media_providers)
+
+        media_provider_order = {
+            media_provider["name"]: index
+            for index, media_provider in enumerate(pending_media_providers)
+        }
+
+        media_provider_results = []
+
+        futures = set()
+
+        with streamlit_thread_pool(
+            max(1, min(self.max_workers, len(pending_media_providers)))
+        ) as executor:
+            while True:
+                # Search the next media providers whose leaning has a free slot
+                for media_provider in list(pending_media_providers):
+                    if len(futures) >= self.max_workers:
+                        break
+
+                    if self.quota.claim(media_provider):
+                        pending_media_providers.remove(media_provider)
+
+                        futures.add(
+                            executor.submit(
+                                self._search_media_provider_directly,
+                                media_provider,
+                                start_published_date,
+                            )
+                        )
+
+                if not futures:
+                    break
+
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+
+                media_provider_results.extend(future.result() for future in done)
+
+        # Keep the results in the order of the media providers, so the synthesis prompt doesn't depend on timing
+        media_provider_results.sort(
+            key=lambda result: media_provider_order[result["media_provider"]["name"]]
+        )
+
+        return media_provider_results, len(pending_media_providers)
+
+    def _start_direct_search(self):
+        """
+        Runs the crew with the direct search stage in place of the written content expert.
+
+        The media providers and their domains are discovered first. Then every media provider is searched with one Exa query built from the topic and restricted to its domain and to recent articles, up to max_workers at the same time, so the search stage takes about as long as its slowest queries. The URLs found are scraped directly, and the written content of all media providers is passed to the unbiased journalist.
+
+        :return: A CrewOutput with the unbiased news and the token usage of all stages.
+        """
+
+        # Discover media providers and their domains
+        start_time = time.time()
+
+        discovery_output, media_providers = self._get_media_providers_with_domains()
+
+        self.run_details["discovery_ms"] = int((time.time() - start_time) * 1000)
+
+        # Fall back to the written content expert if no media provider could be parsed
+        if not media_providers:
+            return self._start_sequential()
+
+        # Search the media providers at the same time, scraping the URLs on the way if the stage is pipelined
+        with self._run_scraping_pipeline() as scraping_pipeline:
+            start_time = time.time()
+
+            with self.tracer.span(
+                "stage", "Direct search", media_providers=len(media_providers)
+            ):
+                (
+                    media_provider_results,
+                    skipped_media_providers,
+                ) = self._search_media_providers_directly(media_providers)
+
+            search_end_time = time.time()
+
+            self.run_details["direct_search_ms"] = int(
+                (search_end_time - start_time) * 1000
+            )
+
+            news_urls = [
+                news_url
+                for result in media_provider_results
+                for news_url in result["news_urls"]
+            ]
+
+            # Scrape the URLs of written content, or wait for the pipeline to scrape the ones it hasn't yet
+            if scraping_pipeline is None:
+                scraped_pages = {
+                    scraped_page["url"]: scraped_page
+                    for scraped_page in self._scrape_news_urls(news_urls)
+                }
+            else:
+                self._finish_scraping_pipeline(scraping_pipeline, search_end_time)
+
+                scraped_pages = {
+                    scraped_page["url"]: scraped_page
+                    for scraped_page in scraping_pipeline.pages(news_urls)
+                }
+
+            for result in media_provider_results:
+                result["scraped_pages"] = self._assign_media_providers(
+                    [
+                        scraped_pages[news_url]
+                        for news_url in result["news_urls"]
+                        if news_url in scraped_pages
+                    ],
+                    result["media_provider"],
+                )
+
+            self.run_details["scraping_ms"] = int(
+                (time.time() - search_end_time) * 1000
+            )
+
+        synthesis_outputs = self._synthesize_media_provider_results(
+            media_provider_results
+        )
+
+        # Compare the wall-clock time of the search stage with the time the same queries would take one after another
+        query_ms = [result["elapsed_ms"] for result in media_provider_results]
+
+        self.run_details.update(
+            {
+                "fan_out": False,
+                "search_mode": "direct",
+                "media_providers": len(media_provider_results),
+                "skipped_media_providers": skipped_media_providers,
+                "max_workers": self.max_workers,
+                "direct_search_queries": len(media_provider_results),
+                "direct_search_errors": sum(
+                    1 for result in media_provider_results if result["error"]
+                ),
+                "direct_search_found_urls": sum(
+                    len(result["found_urls"]) for result in media_provider_results
+                ),
+                "slowest_query_ms": max(query_ms, default=0),
+                "sequential_search_estimate_ms": sum(query_ms),
+            }
+        )
+
+        return self._combine_crew_outputs(
+            synthesis_outputs[-1].raw,
+            [discovery_output, *synthesis_outputs],
+        )
+
+    def _start_fan_out(self):
+        """
+        Runs the crew in the fan-out mode.
+
+        The media providers and their domains are discovered first. Then the media providers are searched and scraped in their own sub-pipelines on a bounded worker pool, every political leaning in turn, until the URL quotas are met. A media provider only starts if its leaning has a free slot, so the media providers beyond the quotas are never searched. Finally, the written content of all media providers is merged and passed to the unbiased journalist.
+
+        :return: A CrewOutput with the unbiased news and the token usage of all stages.
+        """
+
+        # Discover media providers and their domains
+        start_time = time.time()
+
+        discovery_output, media_providers = self._get_media_providers_with_domains()
+
+        self.run_details["discovery_ms"] = int((time.time() - start_time) * 1000)
+
+        # Fall back to the sequential chain if no media provider could be parsed
+        if not media_providers:
+            return self._start_sequential()
+
+        # Search and scrape the media providers on a bounded worker pool until the quotas are met
+        start_time = time.time()
+
+        pending_media_providers = interleave_by_leaning(media_providers)
+
+        media_provider_order = {
+            media_provider["name"]: index
+            for index, media_provider in enumerate(pending_media_providers)
+        }
+
+        media_provider_results = []
+
+        futures = set()
+
+        with self._run_scraping_pipeline() as scraping_pipeline, streamlit_thread_pool(
+            self.max_workers
+        ) as executor:
+            while True:
+                # Start the next media providers whose leaning has a free slot
+                for media_provider in list(pending_media_providers):
+                    if len(futures) >= self.max_workers:
+                        break
+
+                    if self.quota.claim(media_provider):
+                        pending_media_providers.remove(media_provider)
+
+                        futures.add(
+                            executor.submit(
+                                self._run_media_provider_pipeline, media_provider
+                            )
+                        )
+
+                if not futures:
+                    break
+
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+
+                media_provider_results.extend(future.result() for future in done)
+
+            # Wait for the pipeline to scrape the URLs it hasn't yet, and hand every media provider its pages
+            if scraping_pipeline is not None:
+                self._finish_scraping_pipeline(scraping_pipeline, time.time())
+
+                for result in media_provider_results:
+                    result["scraped_pages"] = self._assign_media_providers(
+                        scraping_pipeline.pages(result["news_urls"]),
+                        result["media_provider"],
+                    )
+
+        # Keep the results in the order of the media providers, so the synthesis prompt doesn't depend on timing
+        media_provider_results.sort(
+            key=lambda result: media_provider_order[result["media_provider"]["name"]]
+        )
+
+        fan_out_ms = int((time.time() - start_time) * 1000)
+
+        synthesis_outputs = self._synthesize_media_provider_results(
+            media_provider_results
+        )
+
+        # Compare the wall-clock time of the fan-out with the time the same sub-pipelines would take one after another
+        self.run_details.update(
+            {
+                "fan_out": True,
+                "media_providers": len(media_provider_results),
+                "skipped_media_providers": len(pending_media_providers),
+                "max_workers": self.max_workers,
+                "fan_out_ms": fan_out_ms,
+                "sequential_estimate_ms": sum(
+                    result["elapsed_ms"] for result in media_provider_results
+                ),
+            }
+        )
+
+        return self._combine_crew_outputs(
+            synthesis_outputs[-1].raw,
+            [
+                discovery_output,
+                *[result["crew_output"] for result in media_provider_results],
+                *synthesis_outputs,
+            ],
+        )
+
+    def _start_sequential(self):
+        """
+        Runs the crew as one sequential chain, with the bulk scraping stage if it is enabled.
+
+        :return: The result of the crew's tasks.
+        """
+
+        self.run_details["fan_out"] = False
+
+        if self.bulk_scraping:
+            return self._start_bulk_scraping()
+
+        # Time the tasks of the sequential chain from its kickoff
+        self._trace_sequential_task = self.tracer.task_callback()
+
+        return self.crew.kickoff()
+
+    def start_news_agents(self):
+        """
+        Starts all the agents in the crew.
+
+        This function returns the result of the crew's kickoff function, which is a dictionary
+        containing the results of all the tasks in the crew. In the fan-out mode, the results of
+        all sub-pipelines are merged into a single result.
+
+        :return: The result of the crew's tasks.
+        """
+
+        # Keep the search state and the tracer of the run apart from other runs of the same session
+        with run_state_scope():
+            # Start every run with no search results listed to the agents yet
+            UnbiasedNewsTools.reset_search_state(self.search_token_budget)
+
+            # Let the tools use the API keys of the crew, if it was given any
+            UnbiasedNewsTools.set_api_keys(self.api_keys)
+
+            # Record the tool calls of the run in the tracer of the run
+            UnbiasedNewsTools.set_tracer(self.tracer)
+
+            # Start every run with no URLs counted against the quotas yet
+            self.quota = self._new_quota()
+
+            UnbiasedNewsTools.set_quota(self.quota)
+
+            self.start_time = time.time()
+
+            self.run_details["search_mode"] = "agents"
+
+            # Export the spans of the run, even if it failed
+            try:
+                if self.bulk_scraping and self.direct_search:
+                    crew_output = self._start_direct_search()
+                elif self.fan_out:
+                    crew_output = self._start_fan_out()
+                else:
+                    crew_output = self._start_sequential()
+
+                self._reconcile_token_usage(crew_output.token_usage)
+
+                self._record_coverage()
+
+                self._record_output_validation()
+
+                self._record_model_tiers()
+
+                return crew_output
+            finally:
+                self.tracer.export_jsonl()
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from urllib.parse import urlsplit
+from utils.formatting import estimate_tokens
+import heapq
+import re
+
+# Number of words per shingle
+SHINGLE_WORDS = 5
+
+# Number of smallest shingle hashes kept per article (bottom-k MinHash sketch)
+SKETCH_SIZE = 64
+
+# Minimum estimated Jaccard similarity of two articles to be near-duplicates
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+# Minimum number of shared sketch hashes for two articles to be compared at all
+MIN_SHARED_HASHES = 8
+
+
+def sketch_article(text: str) -> set:
+    """
+    Returns the bottom-k MinHash sketch of the given text: the smallest hashes of its word shingles.
+
+    Two texts share roughly as many of their smallest shingle hashes as their shingle sets overlap, so comparing sketches estimates the Jaccard similarity of the whole texts.
+
+    :param text: The text of the article.
+    :return: A set of at most SKETCH_SIZE shingle hashes.
+    """
+
+    words = re.findall(r"\w+", text.lower())
+
+    shingles = {
+        " ".join(words[index : index + SHINGLE_WORDS])
+        for index in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+
+    return set(heapq.nsmallest(SKETCH_SIZE, (hash(shingle) for shingle in shingles)))
+
+
+def estimate_similarity(sketch_a: set, sketch_b: set) -> float:
+    """
+    Estimates the Jaccard similarity of two articles from their bottom-k sketches.
+
+    :param sketch_a: The sketch of the first article.
+    :param sketch_b: The sketch of the second article.
+    :return: The estimated Jaccard similarity between 0 and 1.
+    """
+
+    if not sketch_a or not sketch_b:
+        return 0.0
+
+    # The bottom-k of the union, and how many of them both articles have
+    union_sketch = heapq.nsmallest(SKETCH_SIZE, sketch_a | sketch_b)
+
+    return sum(
+        1
+        for shingle_hash in union_sketch
+        if shingle_hash in sketch_a and shingle_hash in sketch_b
+    ) / len(union_sketch)
+
+
+def deduplicate_articles(
+    scraped_pages: list,
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+):
+    """
+    Clusters near-duplicate articles, e.g., syndicated wire stories published by several media providers, and keeps one representative per cluster.
+
+    Candidate pairs are found through an inverted index of sketch hashes instead of comparing every pair, so thousands of articles are clustered in near-linear time. The longest article of a cluster is kept as its representative, and every other media provider that carried it is recorded under "duplicates" so the attribution in the Sources section is kept.
+
+    :param scraped_pages: A list of scraped pages with a "url", an extracted "article" and optionally a "media_provider".
+    :param similarity_threshold: The minimum estimated Jaccard similarity of two near-duplicate articles.
+    :return: A tuple of the representative pages, each with a "duplicates" list of {"url", "media_provider"} dictionaries, and the statistics of the stage.
+    """
+
+    sketches = [
+        sketch_article(scraped_page["article"]["body"])
+        for scraped_page in scraped_pages
+    ]
+
+    # Find candidate pairs that share enough sketch hashes
+    index = defaultdict(list)
+    shared_hashes = defaultdict(int)
+
+    for page_index, sketch in enumerate(sketches):
+        for shingle_hash in sketch:
+            for other_index in index[shingle_hash]:
+                shared_hashes[(other_index, page_index)] += 1
+
+            index[shingle_hash].append(page_index)
+
+    # Cluster the near-duplicates with union-find
+    parents = list(range(len(scraped_pages)))
+
+    def find(page_index):
+        while parents[page_index] != page_index:
+            parents[page_index] = parents[parents[page_index]]
+            page_index = parents[page_index]
+
+        return page_index
+
+    for (page_index, other_index), shared in shared_hashes.items():
+        if shared >= MIN_SHARED_HASHES and (
+            estimate_similarity(sketches[page_index], sketches[other_index])
+            >= similarity_threshold
+        ):
+            parents[find(other_index)] = find(page_index)
+
+    clusters = defaultdict(list)
+
+    for page_index in range(len(scraped_pages)):
+        clusters[find(page_index)].append(page_index)
+
+    # Keep the longest article of every cluster, in the order the clusters first appear, and record who else carried it
+    representative_pages = []
+    removed_tokens = 0
+
+    for cluster in sorted(clusters.values(), key=min):
+        cluster_pages = sorted(
+            (scraped_pages[page_index] for page_index in cluster),
+            key=lambda scraped_page: len(scraped_page["article"]["body"]),
+            reverse=True,
+        )
+
+        representative_page = dict(cluster_pages[0])
+        representative_page["duplicates"] = [
+            {
+                "url": scraped_page["url"],
+                "media_provider": scraped_page.get("media_provider")
+                or urlsplit(scraped_page["url"]).netloc,
+            }
+            for scraped_page in cluster_pages[1:]
+        ]
+
+        removed_tokens += sum(
+            estimate_tokens(scraped_page["article"]["body"])
+            for scraped_page in cluster_pages[1:]
+        )
+
+        representative_pages.append(representative_page)
+
+    total_tokens = sum(
+        estimate_tokens(scraped_page["article"]["body"])
+        for scraped_page in scraped_pages
+    )
+
+    return representative_pages, {
+        "articles": len(scraped_pages),
+        "duplicate_articles": len(scraped_pages) - len(representative_pages),
+        "duplicate_clusters": sum(
+            1 for cluster in clusters.values() if len(cluster) > 1
+        ),
+        "duplicate_tokens_removed": removed_tokens,
+        "duplicate_tokens_removed_share": (
+            removed_tokens / total_tokens if total_tokens else 0.0
+        ),
+    }
@@ -0,0 +1,92 @@
+import json
+
+# Default number of tokens a single search result listing may take in the agent's context
+DEFAULT_SEARCH_TOKEN_BUDGET = 600
+
+# Number of characters of a summary that is always kept, even on a tight budget
+MIN_SUMMARY_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of LLM tokens of the given text.
+
+    Llama 3.1 averages roughly four characters per token on English news text, which is good enough for budgeting without loading a tokenizer.
+
+    :param text: The text.
+    :return: The estimated number of tokens.
+    """
+
+    return (len(text) + 3) // 4
+
+
+def compact_search_results(
+    response: dict,
+    token_budget: int = DEFAULT_SEARCH_TOKEN_BUDGET,
+    seen_urls: set = None,
+) -> str:
+    """
+    Formats a search response as compact records within the given token budget.
+
+    Every result becomes a record with its URL, title, published date and summary, in the order of relevance. The full text is left out. Results whose URL is in seen_urls are skipped, and the URLs of the listed results are added to it. Summaries are shortened, and the least relevant results dropped, until the records fit the budget.
+
+    :param response: The search response as a dictionary with a "results" list.
+    :param token_budget: The maximum number of tokens of the formatted records.
+    :param seen_urls: Optional set of URLs already listed to the agent, updated in place.
+    :return: The records as a JSON array, followed by a note on skipped results.
+    """
+
+    if seen_urls is None:
+        seen_urls = set()
+
+    records = []
+    skipped_seen = 0
+
+    for result in response.get("results", []):
+        url = result.get("url")
+
+        if not url:
+            continue
+
+        if url in seen_urls:
+            skipped_seen += 1
+
+            continue
+
+        records.append(
+            {
+                "url": url,
+                "title": (result.get("title") or "").strip(),
+                "published_date": (result.get("published_date") or "")[:10],
+                "summary": " ".join((result.get("summary") or "").split()),
+            }
+        )
+
+    # Shorten the longest summaries first, then drop the least relevant records, until the records fit the budget
+    while records and estimate_tokens(json.dumps(records)) > token_budget:
+        longest_record = max(records, key=lambda record: len(record["summary"]))
+
+        summary = longest_record["summary"].removesuffix("...")
+
+        if len(summary) > MIN_SUMMARY_CHARS:
+            overflow_chars = (estimate_tokens(json.dumps(records)) - token_budget) * 4
+
+            longest_record["summary"] = (
+                summary[
+                    : max(MIN_SUMMARY_CHARS, len(summary) - overflow_chars - 3)
+                ].rstrip()
+                + "..."
+            )
+        else:
+            records.pop()
+
+    seen_urls.update(record["url"] for record in records)
+
+    formatted_records = json.dumps(records, ensure_ascii=False)
+
+    if skipped_seen:
+        formatted_records += (
+            f"\n({skipped_seen} result(s) skipped because they were already listed.)"
+        )
+
+    return formatted_records
@@ -0,0 +1,102 @@
+from requests.adapters import HTTPAdapter
+from utils.ratelimit import RateLimiter
+import requests
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, rate_limiter: RateLimiter = None, **kwargs):
+        """
+        Initializes an HTTPAdapter that sends every request through the shared rate limiter of its provider.
+
+        :param rate_limiter: Optional RateLimiter of the provider. Without one, requests are sent as is.
+        :param kwargs: The keyword arguments of HTTPAdapter, e.g., pool_maxsize.
+
+        :return: An instance of RateLimitedAdapter.
+        """
+
+        self.rate_limiter = rate_limiter
+
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        """
+        Sends a request, waiting for the rate limit and retrying it with backoff on 429 and 5xx responses.
+
+        :param request: The PreparedRequest.
+        :param kwargs: The keyword arguments of HTTPAdapter.send, e.g., timeout.
+        :return: The Response.
+        """
+
+        if self.rate_limiter is None:
+            return super().send(request, **kwargs)
+
+        return self.rate_limiter.send(
+            lambda: super(RateLimitedAdapter, self).send(request, **kwargs),
+            close_response=lambda response: response.close(),
+        )
+
+
+def pooled_session(
+    headers: dict = None,
+    pool_maxsize: int = 16,
+    rate_limiter: RateLimiter = None,
+) -> requests.Session:
+    """
+    Returns a requests Session that keeps its HTTP connections alive and reuses them between requests.
+
+    :param headers: Optional headers sent with every request.
+    :param pool_maxsize: The maximum number of connections kept alive per host.
+    :param rate_limiter: Optional RateLimiter every request is sent through.
+    :return: A requests Session.
+    """
+
+    session = requests.Session()
+
+    if headers:
+        session.headers.update(headers)
+
+    for prefix in ("https://", "http://"):
+        session.mount(
+            prefix,
+            RateLimitedAdapter(
+                rate_limiter=rate_limiter,
+                pool_connections=4,
+                pool_maxsize=max(1, pool_maxsize),
+            ),
+        )
+
+    return session
+
+
+def session_stats(session: requests.Session) -> dict:
+    """
+    Returns the connection statistics of a requests Session.
+
+    :param session: The requests Session.
+    :return: A dictionary with the number of requests sent, connections opened, idle connections and the connection reuse rate.
+    """
+
+    stats = {"requests": 0, "connections": 0, "idle_connections": 0}
+
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+
+            if pool is None:
+                continue
+
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+            stats["idle_connections"] += sum(
+                1
+                for connection in list(pool.pool.queue if pool.pool else [])
+                if connection
+            )
+
+    stats["reuse_rate"] = (
+        1 - stats["connections"] / stats["requests"] if stats["requests"] else 0.0
+    )
+
+    return stats
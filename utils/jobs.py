@@ -0,0 +1,352 @@
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.cache import ArticleCache
+import threading
+import time
+import uuid
+
+# Default maximum number of crew runs executing at the same time in the whole process
+DEFAULT_MAX_CONCURRENT_JOBS = 4
+
+# How long finished jobs are kept for their sessions to read the results in seconds
+DEFAULT_FINISHED_JOB_TTL_SECONDS = 60 * 60
+
+# Initialize the persistent cache of finished articles, shared by all sessions
+article_cache = ArticleCache()
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Statuses of jobs that won't change anymore
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Output of a crew whose agents stopped due to their iteration or time limit
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+# AgentOps end states of the job statuses
+AGENTOPS_END_STATES = {
+    SUCCEEDED: "Success",
+    FAILED: "Fail",
+    CANCELLED: "Indeterminate",
+}
+
+
+def is_cacheable_article(crew_output, crew) -> bool:
+    """
+    Returns whether the output of a finished crew run is an article worth caching for the next runs of similar topics.
+
+    :param crew_output: The CrewOutput of the run.
+    :param crew: The UnbiasedNewsCrew of the run.
+    :return: False if the output is empty, the agents stopped due to their iteration or time limit, or the synthesis was skipped for lack of written content, True otherwise.
+    """
+
+    return bool(
+        crew_output.raw
+        and crew_output.raw != AGENT_STOPPED_OUTPUT
+        and not crew.run_details.get("synthesis_skipped")
+    )
+
+
+class JobCancelledError(Exception):
+    """
+    Raised inside a running job, at its next progress message or streamed token, after it was cancelled.
+    """
+
+
+class NewsJob:
+    def __init__(self, crew_kwargs: dict, agentops_session=None):
+        """
+        Initializes a background crew run and the state the page polls: status, progress messages, streamed tokens and the result.
+
+        :param crew_kwargs: The keyword arguments of UnbiasedNewsCrew, without the on_progress and on_token functions.
+        :param agentops_session: Optional AgentOps session of the run, ended once the job is finished.
+
+        :return: An instance of NewsJob.
+        """
+
+        self.id = uuid.uuid4().hex
+        self.crew_kwargs = crew_kwargs
+        self.status = QUEUED
+        self.progress = []
+        self.chunks = []
+        self.crew = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.agentops_session = agentops_session
+
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the job succeeded, failed or was cancelled.
+
+        :return: True if the status of the job won't change anymore.
+        """
+
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def streamed_text(self) -> str:
+        """
+        The unbiased news streamed so far.
+
+        :return: All streamed tokens joined.
+        """
+
+        return "".join(self.chunks)
+
+    @property
+    def elapsed_ms(self) -> int:
+        """
+        The time from submitting the job until it finished, or until now if it is still queued or running.
+
+        :return: The elapsed time in milliseconds.
+        """
+
+        return int(((self.finished_at or time.time()) - self.submitted_at) * 1000)
+
+    def add_progress(self, message: str):
+        """
+        Records a progress message of the crew, stopping the crew if the job was cancelled.
+
+        :param message: The progress message.
+        """
+
+        if self.cancel_event.is_set():
+            raise JobCancelledError(self.id)
+
+        self.progress.append(message)
+
+    def add_token(self, chunk: str):
+        """
+        Records a streamed chunk of the unbiased news, stopping the crew if the job was cancelled.
+
+        :param chunk: The chunk of the unbiased news.
+        """
+
+        if self.cancel_event.is_set():
+            raise JobCancelledError(self.id)
+
+        self.chunks.append(chunk)
+
+    def end_agentops_session(self):
+        """
+        Ends the AgentOps session of the finished job with the end state of its status, once.
+
+        Every job ends its own session, since AgentOps can't tell which session to end through its module-level end_session once several jobs run at the same time.
+        """
+
+        agentops_session, self.agentops_session = self.agentops_session, None
+
+        if agentops_session is None:
+            return
+
+        agentops_session.end_session(
+            end_state=AGENTOPS_END_STATES[self.status],
+            end_state_reason=self.error,
+        )
+
+
+class JobManager:
+    def __init__(
+        self,
+        max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+        finished_job_ttl_seconds: int = DEFAULT_FINISHED_JOB_TTL_SECONDS,
+    ):
+        """
+        Initializes a manager that runs crews in the background on a bounded worker pool, shared by all sessions in the process.
+
+        A crew run no longer lives inside the Streamlit script run, so reruns of the page (e.g., widget interactions) don't abort it and don't pin a server thread while polling. Jobs beyond the concurrency cap wait in the queue of the pool.
+
+        :param max_concurrent_jobs: The maximum number of crew runs executing at the same time.
+        :param finished_job_ttl_seconds: How long finished jobs are kept in seconds.
+
+        :return: An instance of JobManager.
+        """
+
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.finished_job_ttl_seconds = finished_job_ttl_seconds
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_jobs,
+            thread_name_prefix="news-job",
+        )
+
+    def submit(self, crew_kwargs: dict, agentops_session=None) -> str:
+        """
+        Submits a crew run and returns immediately.
+
+        The job runs with the Streamlit script run context of the calling session, so the crew can read the session's API keys from st.session_state.
+
+        :param crew_kwargs: The keyword arguments of UnbiasedNewsCrew, without the on_progress and on_token functions.
+        :param agentops_session: Optional AgentOps session of the run, ended by the job once it is finished or cancelled.
+        :return: The ID of the job.
+        """
+
+        job = NewsJob(crew_kwargs, agentops_session)
+
+        ctx = get_script_run_ctx()
+
+        with self._lock:
+            self._prune()
+
+            self._jobs[job.id] = job
+
+            job.future = self._executor.submit(self._run, job, ctx)
+
+        return job.id
+
+    def get(self, job_id: str):
+        """
+        Returns the job with the given ID.
+
+        :param job_id: The ID of the job.
+        :return: The NewsJob, or None if the ID is unknown or the job was pruned.
+        """
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels the job with the given ID.
+
+        A queued job is removed from the queue. A running job stops at its next progress message or streamed token, because Python threads can't be stopped from the outside.
+
+        :param job_id: The ID of the job.
+        :return: True if the job was queued or running, False otherwise.
+        """
+
+        job = self.get(job_id)
+
+        if job is None or job.finished:
+            return False
+
+        job.cancel_event.set()
+
+        # A queued job never runs, so it ends its AgentOps session here
+        if job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+
+            job.end_agentops_session()
+
+        return True
+
+    def queue_position(self, job_id: str) -> int:
+        """
+        Returns the number of queued jobs submitted before the job with the given ID.
+
+        :param job_id: The ID of the job.
+        :return: The number of jobs ahead in the queue, 0 if the job isn't queued.
+        """
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is None or job.status != QUEUED:
+                return 0
+
+            return sum(
+                1
+                for other_job in self._jobs.values()
+                if other_job.status == QUEUED
+                and other_job.submitted_at < job.submitted_at
+            )
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of the jobs kept by the manager.
+
+        :return: A dictionary with the concurrency cap, the queue depth and the number of jobs per status.
+        """
+
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+
+        return {
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+            "queue_depth": statuses.count(QUEUED),
+            **{
+                status: statuses.count(status)
+                for status in (RUNNING, SUCCEEDED, FAILED, CANCELLED)
+            },
+        }
+
+    def _run(self, job: NewsJob, ctx):
+        """
+        Runs the crew of a job on a worker thread of the pool.
+
+        :param job: The job.
+        :param ctx: The Streamlit script run context of the session that submitted the job.
+        """
+
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+        job.status = RUNNING
+        job.started_at = time.time()
+
+        try:
+            if job.cancel_event.is_set():
+                raise JobCancelledError(job.id)
+
+            # Import the crew in the job, so the page doesn't pay for importing CrewAI and LangChain until the first search
+            from utils.crews import UnbiasedNewsCrew
+
+            job.crew = UnbiasedNewsCrew(
+                **job.crew_kwargs,
+                on_progress=job.add_progress,
+                on_token=job.add_token,
+            )
+
+            job.result = job.crew.start_news_agents()
+
+            # Cache the finished article for the next runs of similar topics
+            if is_cacheable_article(job.result, job.crew):
+                article_cache.set_article(
+                    job.crew_kwargs["topic"],
+                    job.crew_kwargs["selected_country"],
+                    job.result.raw,
+                    job.result.token_usage.model_dump(),
+                )
+
+            job.status = SUCCEEDED
+        except JobCancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+            job.end_agentops_session()
+
+    def _prune(self):
+        """
+        Removes finished jobs older than the TTL. The caller must hold the lock.
+        """
+
+        now = time.time()
+
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.finished_job_ttl_seconds
+        ]:
+            del self._jobs[job_id]
+
+
+# Initialize the job manager, shared by all sessions
+job_manager = JobManager()
@@ -0,0 +1,241 @@
+from crewai import Task
+from pydantic import BaseModel, PrivateAttr, ValidationError
+from pydantic import field_validator, model_validator
+from typing import List, Optional
+from utils.parsing import repair_json
+from utils.registry import LEANINGS
+import json
+
+# Outcomes of the validation of a task output
+VALID = "valid"
+REPAIRED = "repaired"
+ESCALATED = "escalated"
+RETRIED = "retried"
+FAILED = "failed"
+
+
+class OutputList(BaseModel):
+    """
+    The output of a task that returns a JSON array, e.g., [{"news_urls": [...]}]. Subclasses set the type of the items.
+
+    The array is kept in the items field, since CrewAI can only store task outputs that are models with fields. A single object is taken as an array of one.
+    """
+
+    items: list
+
+    @model_validator(mode="before")
+    @classmethod
+    def wrap_array(cls, data):
+        if isinstance(data, list):
+            return {"items": data}
+
+        if isinstance(data, dict) and "items" not in data:
+            return {"items": [data]}
+
+        return data
+
+    def to_json(self) -> str:
+        """
+        Returns the output as the compact JSON array the task asked for.
+
+        :return: The JSON array.
+        """
+
+        return json.dumps(self.model_dump(exclude_none=True)["items"])
+
+    def __str__(self) -> str:
+        return self.to_json()
+
+
+class MediaProvider(BaseModel):
+    name: str
+    domain: Optional[str] = None
+    leaning: Optional[str] = None
+
+    @field_validator("name")
+    @classmethod
+    def name_is_not_blank(cls, name: str) -> str:
+        if not name.strip():
+            raise ValueError("The name of the media provider is blank.")
+
+        return name.strip()
+
+    @field_validator("leaning")
+    @classmethod
+    def leaning_is_known(cls, leaning: Optional[str]) -> Optional[str]:
+        leaning = (leaning or "").strip().lower()
+
+        return leaning if leaning in LEANINGS else None
+
+
+class MediaProviderWithDomain(MediaProvider):
+    domain: str
+
+
+class MediaProviders(OutputList):
+    items: List[MediaProvider]
+
+
+class MediaProvidersWithDomains(OutputList):
+    items: List[MediaProviderWithDomain]
+
+
+class NewsUrls(BaseModel):
+    news_urls: List[str]
+
+    @field_validator("news_urls")
+    @classmethod
+    def keep_web_urls(cls, news_urls: List[str]) -> List[str]:
+        return list(
+            dict.fromkeys(
+                news_url.strip()
+                for news_url in news_urls
+                if news_url.strip().startswith(("http://", "https://"))
+            )
+        )
+
+
+class NewsUrlsList(OutputList):
+    items: List[NewsUrls]
+
+
+class NewsContent(BaseModel):
+    news_content: List[str]
+
+
+class NewsContentList(OutputList):
+    items: List[NewsContent]
+
+
+def validate_output(raw: str, model: type):
+    """
+    Validates the raw output of an agent against the output model of its task, repairing the JSON locally if it doesn't validate as is.
+
+    :param raw: The raw output of the agent.
+    :param model: The output model, e.g., NewsUrlsList.
+    :return: A tuple of the validated output (None if it couldn't be validated) and the outcome, VALID or REPAIRED (None if it couldn't be validated).
+    """
+
+    try:
+        return model.model_validate_json(raw), VALID
+    except ValidationError:
+        pass
+
+    parsed = repair_json(raw)
+
+    if parsed is None:
+        return None, None
+
+    try:
+        return model.model_validate(parsed), REPAIRED
+    except ValidationError:
+        return None, None
+
+
+class ValidatedTask(Task):
+    """
+    A Task whose output is validated against its output_pydantic model in-process.
+
+    If the output doesn't validate as is, it is repaired locally first. If the repair fails and the agent runs on a small model that can escalate (see TieredAgent), the task is run again on the large model. Only if that output doesn't validate either, CrewAI's converter asks the LLM to convert the output. The outcome of every validation is recorded as a "validation" span in the tracer of the run, and the validated output is passed to the next tasks as compact JSON instead of the agent's raw text.
+    """
+
+    _tracer = PrivateAttr(default=None)
+    _tools = PrivateAttr(default=None)
+
+    def set_tracer(self, tracer):
+        """
+        Sets the tracer the validation spans are recorded in.
+
+        :param tracer: The tracer of the run, or None.
+        :return: The Task, for chaining.
+        """
+
+        self._tracer = tracer
+
+        return self
+
+    def _validate(self, result: str):
+        """
+        Validates the raw output of the agent, escalating the task to the large model or asking the LLM to convert the output only if the local repair fails.
+
+        :param result: The raw output of the agent.
+        :return: A tuple of the validated output (None if it couldn't be validated), the outcome and whether the task was escalated.
+        """
+
+        pydantic_output, outcome = validate_output(result, self.output_pydantic)
+
+        escalated = False
+
+        # Run the task again on the large model if the small model's output can't be repaired
+        if pydantic_output is None and getattr(self.agent, "can_escalate", None):
+            if self.agent.can_escalate():
+                result = self.agent.execute_task_escalated(
+                    self, self.prompt_context, self._tools
+                )
+
+                escalated = True
+
+                pydantic_output, outcome = validate_output(result, self.output_pydantic)
+
+                outcome = ESCALATED if pydantic_output is not None else None
+
+        if pydantic_output is None:
+            pydantic_output, _ = super()._export_output(result)
+
+            outcome = RETRIED if isinstance(pydantic_output, BaseModel) else FAILED
+
+        return pydantic_output, outcome, escalated
+
+    def _export_output(self, result: str):
+        """
+        Exports the output of the agent as the validated output model.
+
+        :param result: The raw output of the agent.
+        :return: A tuple of the validated output and no JSON output, as CrewAI expects.
+        """
+
+        if self.output_pydantic is None:
+            return super()._export_output(result)
+
+        if self._tracer is None:
+            return self._validate(result)[0], None
+
+        with self._tracer.span("validation", self.name) as span:
+            pydantic_output, outcome, escalated = self._validate(result)
+
+            span["attributes"]["outcome"] = outcome
+            span["attributes"]["escalated"] = escalated
+            span["retries"] = int(escalated) + (
+                1 if outcome in (RETRIED, FAILED) else 0
+            )
+            span["error"] = (
+                f"The output didn't validate against {self.output_pydantic.__name__}"
+                if outcome == FAILED
+                else None
+            )
+
+        return pydantic_output, None
+
+    def _execute_core(self, agent, context, tools):
+        """
+        Runs the task and passes its validated output to the next tasks as compact JSON.
+
+        :param agent: The Agent executing the task.
+        :param context: The context from the previous tasks.
+        :param tools: The tools of the task.
+        :return: The TaskOutput.
+        """
+
+        # Keep the tools, in case the task is escalated to the large model
+        self._tools = tools
+
+        task_output = super()._execute_core(agent, context, tools)
+
+        if task_output.pydantic is not None:
+            task_output.raw = (
+                task_output.pydantic.to_json()
+                if isinstance(task_output.pydantic, OutputList)
+                else task_output.pydantic.model_dump_json(exclude_none=True)
+            )
+
+        return task_output
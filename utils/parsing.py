@@ -0,0 +1,175 @@
+import ast
+import json
+import re
+
+# Typographic quotes LLMs put around JSON strings, mapped to plain quotes
+TYPOGRAPHIC_QUOTES = {"“": '"', "”": '"', "‘": "'", "’": "'"}
+
+# Typographic quotes opening or closing a JSON string, i.e., right after or before a bracket, comma or colon. Quotes inside strings are left alone
+TYPOGRAPHIC_DELIMITER_PATTERN = re.compile(
+    r"(?<=[\[{,:])(\s*)([“”‘’])|([“”‘’])(?=\s*[\]},:])"
+)
+
+# Markdown code fences around JSON, e.g., ```json
+CODE_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*")
+
+# Commas right before a closing bracket
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([\]}])")
+
+# Opening brackets a JSON array or object can start with
+OPENING_BRACKET_PATTERN = re.compile(r"[\[{]")
+
+# Closing bracket of every opening bracket
+CLOSING_BRACKETS = {"[": "]", "{": "}"}
+
+
+def _extract_json_value(text: str, start: int) -> str:
+    """
+    Returns the JSON array or object starting at the given position of the text, dropping any prose after it. The brackets a truncated output left open are closed.
+
+    :param text: The text.
+    :param start: The position of the opening bracket.
+    :return: The JSON-like value.
+    """
+
+    stack = []
+    quote = None
+    escaped = False
+
+    for index in range(start, len(text)):
+        char = text[index]
+
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in CLOSING_BRACKETS:
+            stack.append(CLOSING_BRACKETS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+
+            if not stack:
+                return text[start : index + 1]
+
+    # Close an unterminated string and the open brackets of a truncated output
+    value = text[start:].rstrip().rstrip(",")
+
+    return value + (quote or "") + "".join(reversed(stack))
+
+
+def _normalize_typographic_delimiters(text: str) -> str:
+    """
+    Replaces the typographic quotes that open or close JSON strings with plain quotes, keeping the ones inside strings, e.g., in quoted speech.
+
+    :param text: The text.
+    :return: The text with plain quotes as string delimiters.
+    """
+
+    return TYPOGRAPHIC_DELIMITER_PATTERN.sub(
+        lambda match: (match.group(1) or "")
+        + TYPOGRAPHIC_QUOTES[match.group(2) or match.group(3)],
+        text,
+    )
+
+
+def _parse_json_value(value: str):
+    """
+    Parses a JSON-like array or object, dropping trailing commas and accepting single-quoted strings and Python literals.
+
+    :param value: The JSON-like value.
+    :return: The parsed list or dictionary, or None if the value couldn't be parsed.
+    """
+
+    value = TRAILING_COMMA_PATTERN.sub(r"\1", value)
+
+    try:
+        parsed = json.loads(value, strict=False)
+    except json.JSONDecodeError:
+        # Parse single-quoted strings and Python literals (True, False, None)
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+
+    return parsed if isinstance(parsed, (list, dict)) else None
+
+
+def _largest_json_value(text: str) -> tuple:
+    """
+    Returns the largest JSON array or object in the text that can be parsed.
+
+    Every opening bracket is tried in turn, since the prose around the JSON can have brackets too, e.g., "Sources [1], [2]". Brackets nested in a value that was already parsed are skipped. Of values of the same size, the last one is taken.
+
+    :param text: The text.
+    :return: A tuple of the parsed list or dictionary (None if nothing could be parsed) and the length of its text.
+    """
+
+    parsed_value = None
+    parsed_length = -1
+    parsed_end = 0
+
+    for match in OPENING_BRACKET_PATTERN.finditer(text):
+        if match.start() < parsed_end:
+            continue
+
+        value = _extract_json_value(text, match.start())
+
+        parsed = _parse_json_value(value)
+
+        if parsed is None:
+            continue
+
+        parsed_end = match.start() + len(value)
+
+        if len(value) >= parsed_length:
+            parsed_value = parsed
+            parsed_length = len(value)
+
+    return parsed_value, parsed_length
+
+
+def repair_json(raw: str):
+    """
+    Parses the JSON value an agent returned, with cheap local repairs instead of asking the LLM again.
+
+    The repairs cover the usual ways LLMs break JSON: prose and markdown code fences around it, typographic quotes as string delimiters, trailing commas, single-quoted strings and Python literals, and output truncated before the closing brackets. If the prose has brackets too, the largest value that parses is taken as the answer.
+
+    :param raw: The raw output of the agent.
+    :return: The parsed list or dictionary, or None if the output couldn't be repaired.
+    """
+
+    text = CODE_FENCE_PATTERN.sub("", raw or "")
+
+    # Parse the text as is and with typographic delimiters replaced, and keep the larger value, so typographic quotes inside strings never break a value that parses as is
+    parsed_value, parsed_length = _largest_json_value(text)
+
+    normalized_text = _normalize_typographic_delimiters(text)
+
+    if normalized_text != text:
+        normalized_value, normalized_length = _largest_json_value(normalized_text)
+
+        if normalized_length > parsed_length:
+            parsed_value = normalized_value
+
+    return parsed_value
+
+
+def parse_json_output(raw: str) -> list:
+    """
+    Parses the JSON array an agent returned, ignoring any prose around it.
+
+    :param raw: The raw output of the agent.
+    :return: The parsed list (a single object is wrapped in a list), or an empty list if no JSON could be parsed.
+    """
+
+    parsed = repair_json(raw)
+
+    if isinstance(parsed, dict):
+        return [parsed]
+
+    return parsed if isinstance(parsed, list) else []
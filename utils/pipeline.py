@@ -0,0 +1,283 @@
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+from utils.concurrency import streamlit_thread_pool
+from utils.scraping import DEFAULT_PER_HOST_LIMIT
+import queue
+import threading
+import time
+
+# Default maximum number of URLs waiting to be scraped. Once the queue is full, the search stage waits for the scraping workers
+DEFAULT_SCRAPING_QUEUE_SIZE = 8
+
+# Marker telling a scraping worker to stop
+_STOP = object()
+
+
+class ScrapingPipeline:
+    def __init__(
+        self,
+        scrape_url,
+        workers: int = 8,
+        queue_size: int = DEFAULT_SCRAPING_QUEUE_SIZE,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        on_page=None,
+    ):
+        """
+        Initializes a pipeline between the search and the scraping stage: URLs are put on a bounded queue as soon as they are found, and a pool of scraping workers takes them off right away.
+
+        If scraping falls behind, the queue fills up and submit blocks, so the search stage slows down instead of piling up URLs (backpressure). Every URL is scraped once, however often it is submitted. A URL whose host is already scraped per_host_limit times is set aside for that host, so the worker takes the next URL instead of waiting for the host.
+
+        If on_page raises (e.g., JobCancelledError once the job is cancelled), the URLs left are skipped and the exception is raised in the thread calling submit or join, or leaving the pipeline's with block.
+
+        :param scrape_url: A function scraping a single URL and returning its page, e.g., UnbiasedNewsTools.scrape_page.
+        :param workers: The number of scraping workers.
+        :param queue_size: The maximum number of URLs waiting to be scraped.
+        :param per_host_limit: The maximum number of pages scraped at the same time from the same host.
+        :param on_page: Optional function called with every scraped page. It is called from the scraping workers, outside of the scraping's error handling.
+
+        :return: An instance of ScrapingPipeline.
+        """
+
+        self.scrape_url = scrape_url
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.per_host_limit = max(1, per_host_limit)
+        self.on_page = on_page
+
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._running_per_host = defaultdict(int)
+        self._deferred_per_host = defaultdict(deque)
+        self._submitted = set()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # Exception that stopped the pipeline, raised in the calling thread
+        self._error = None
+        self._stopped = threading.Event()
+
+        # Statistics of the pipeline
+        self.max_queue_depth = 0
+        self.blocked_submits = 0
+        self.backpressure_ms = 0
+        self.first_scrape_start = None
+        self.last_scrape_end = None
+
+    def start(self):
+        """
+        Starts the scraping workers. They share the Streamlit script run context and the run state of the calling thread.
+
+        :return: The pipeline itself.
+        """
+
+        self._executor = streamlit_thread_pool(self.workers)
+
+        for _ in range(self.workers):
+            self._executor.submit(self._work)
+
+        return self
+
+    def submit(self, url: str) -> bool:
+        """
+        Puts a URL on the queue, waiting while the queue is full.
+
+        :param url: The URL to scrape.
+        :return: True if the URL was queued, False if it was submitted before.
+        """
+
+        self._raise_error()
+
+        with self._lock:
+            if url in self._submitted:
+                return False
+
+            self._submitted.add(url)
+
+        start_time = time.time()
+
+        try:
+            self._queue.put_nowait(url)
+        except queue.Full:
+            self._queue.put(url)
+
+            with self._lock:
+                self.blocked_submits += 1
+                self.backpressure_ms += int((time.time() - start_time) * 1000)
+
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+        return True
+
+    def submit_all(self, urls: list) -> int:
+        """
+        Puts all given URLs on the queue, in order.
+
+        :param urls: The URLs to scrape.
+        :return: The number of URLs queued that weren't submitted before.
+        """
+
+        return sum(1 for url in urls if self.submit(url))
+
+    def _work(self):
+        """
+        Scrapes the URLs of the queue until the pipeline is closed, at most per_host_limit pages from the same host at a time.
+
+        A URL whose host has no free slot is set aside, and the worker freeing a slot of the host scrapes it next. Its queue task is only done once it is scraped, so join still waits for it.
+        """
+
+        while True:
+            url = self._queue.get()
+
+            if url is _STOP:
+                self._queue.task_done()
+
+                return
+
+            host = urlsplit(url).netloc.lower()
+
+            with self._lock:
+                if self._running_per_host[host] >= self.per_host_limit:
+                    self._deferred_per_host[host].append(url)
+
+                    continue
+
+                self._running_per_host[host] += 1
+
+            # Scrape the URL, then the URLs set aside for its host, one after another in this slot
+            while url is not None:
+                try:
+                    self._scrape(url)
+                finally:
+                    self._queue.task_done()
+
+                with self._lock:
+                    if self._deferred_per_host[host]:
+                        url = self._deferred_per_host[host].popleft()
+                    else:
+                        url = None
+
+                        self._running_per_host[host] -= 1
+
+    def _scrape(self, url: str):
+        """
+        Scrapes a single URL and passes its page to on_page, unless the pipeline was stopped. An exception of on_page stops the pipeline.
+
+        :param url: The URL to scrape.
+        """
+
+        if self._stopped.is_set():
+            return
+
+        start_time = time.time()
+
+        try:
+            page = self.scrape_url(url)
+        except Exception as e:
+            page = {"url": url, "error": str(e)}
+
+        with self._lock:
+            self._pages[url] = page
+
+            self.first_scrape_start = min(
+                self.first_scrape_start or start_time, start_time
+            )
+            self.last_scrape_end = time.time()
+
+        if not self.on_page:
+            return
+
+        try:
+            self.on_page(page)
+        except Exception as e:
+            self.cancel(e)
+
+    def cancel(self, error: Exception = None):
+        """
+        Stops the pipeline: the URLs left are skipped instead of scraped.
+
+        :param error: Optional exception that stopped the pipeline, raised in the thread calling submit or join, or leaving the pipeline's with block.
+        """
+
+        with self._lock:
+            if self._error is None:
+                self._error = error
+
+        self._stopped.set()
+
+    def _raise_error(self):
+        """
+        Raises the exception that stopped the pipeline, if any.
+        """
+
+        if self._error is not None:
+            raise self._error
+
+    def join(self):
+        """
+        Waits until every URL submitted so far is scraped or skipped.
+        """
+
+        self._queue.join()
+
+        self._raise_error()
+
+    def close(self):
+        """
+        Scrapes the URLs left on the queue, or skips them if the pipeline was stopped, and stops the scraping workers.
+        """
+
+        if self._executor is None:
+            return
+
+        for _ in range(self.workers):
+            self._queue.put(_STOP)
+
+        self._executor.shutdown(wait=True)
+
+        self._executor = None
+
+    def pages(self, urls: list) -> list:
+        """
+        Returns the scraped pages of the given URLs.
+
+        :param urls: The URLs.
+        :return: A list of the scraped pages, in the order of the given URLs. URLs that were never submitted are left out.
+        """
+
+        with self._lock:
+            return [
+                self._pages[url] for url in dict.fromkeys(urls) if url in self._pages
+            ]
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of the pipeline.
+
+        :return: A dictionary with the number of URLs submitted and scraped, the size and maximum depth of the queue, how often and how long the search stage waited for the scraping workers in milliseconds, and the start and end time of the scraping.
+        """
+
+        with self._lock:
+            return {
+                "pipeline_submitted_urls": len(self._submitted),
+                "pipeline_scraped_urls": len(self._pages),
+                "pipeline_queue_size": self.queue_size,
+                "pipeline_max_queue_depth": self.max_queue_depth,
+                "pipeline_blocked_submits": self.blocked_submits,
+                "pipeline_backpressure_ms": self.backpressure_ms,
+                "pipeline_first_scrape_start": self.first_scrape_start,
+                "pipeline_last_scrape_end": self.last_scrape_end,
+            }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Skip the URLs left if the wrapped block failed, e.g., because the job was cancelled
+        if exc_value is not None:
+            self.cancel()
+
+        self.close()
+
+        if exc_value is None:
+            self._raise_error()
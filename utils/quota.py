@@ -0,0 +1,353 @@
+from utils.registry import get_registry, normalize_domain, LEANINGS
+import threading
+
+# Default number of URLs of written content kept per media provider
+DEFAULT_URLS_PER_PROVIDER = 3
+
+# Default number of media providers kept per political leaning
+DEFAULT_PROVIDERS_PER_LEANING = 3
+
+# Default maximum number of articles of a run across all media providers
+DEFAULT_TOTAL_ARTICLES = 27
+
+# Number of searches the written content expert gets per media provider, as a search lists up to 5 results
+SEARCHES_PER_PROVIDER = 2
+
+# Leaning of media providers that are not in the registry, e.g., discovered by the agents
+UNKNOWN_LEANING = "unknown"
+
+
+def get_leaning(media_provider: dict) -> str:
+    """
+    Returns the political leaning of the given media provider.
+
+    :param media_provider: A dictionary with the "name" and optionally the "leaning" of the media provider.
+    :return: The leaning, or UNKNOWN_LEANING if the media provider has none.
+    """
+
+    return media_provider.get("leaning") or UNKNOWN_LEANING
+
+
+def interleave_by_leaning(media_providers: list) -> list:
+    """
+    Orders the media providers round-robin by political leaning (left, center, right, left, ...), so every leaning is covered as early as possible when the media providers are searched in order.
+
+    :param media_providers: A list of dictionaries with the "name" and optionally the "leaning" of each media provider.
+    :return: The same media providers, interleaved by leaning. Within a leaning, the given order is kept.
+    """
+
+    by_leaning = {}
+
+    for media_provider in media_providers:
+        by_leaning.setdefault(get_leaning(media_provider), []).append(media_provider)
+
+    return [
+        leaning_media_providers[index]
+        for index in range(max(map(len, by_leaning.values()), default=0))
+        for leaning_media_providers in by_leaning.values()
+        if index < len(leaning_media_providers)
+    ]
+
+
+class DiscoveryQuota:
+    def __init__(
+        self,
+        urls_per_provider: int = DEFAULT_URLS_PER_PROVIDER,
+        providers_per_leaning: int = DEFAULT_PROVIDERS_PER_LEANING,
+        total_articles: int = DEFAULT_TOTAL_ARTICLES,
+    ):
+        """
+        Initializes the quotas of the URL discovery stage of a run.
+
+        A media provider claims a slot of its political leaning before it is searched and keeps it once it has urls_per_provider URLs. A media provider that comes back with fewer URLs gives its slot up, so the next media provider of the same leaning can be searched. The stage is done as soon as every leaning has providers_per_leaning full media providers, or total_articles URLs were kept. Media providers with an unknown leaning, e.g., discovered by the agents, share the slots of all leanings.
+
+        The quota is shared by the worker threads of a run, so all methods are thread-safe.
+
+        :param urls_per_provider: The number of URLs of written content kept per media provider.
+        :param providers_per_leaning: The number of media providers kept per political leaning.
+        :param total_articles: The maximum number of URLs kept across all media providers.
+
+        :return: An instance of DiscoveryQuota.
+        """
+
+        self.urls_per_provider = max(1, urls_per_provider)
+        self.providers_per_leaning = max(1, providers_per_leaning)
+        self.total_articles = max(1, total_articles)
+
+        # Slots of every leaning, held by the media providers being searched or already full
+        self._slots = {}
+
+        # URLs kept per media provider, and the leaning of every media provider
+        self._urls = {}
+        self._leanings = {}
+
+        # URLs listed by the search tool per media provider, to tell the agent when to stop searching
+        self._candidates = {}
+
+        self._lock = threading.Lock()
+
+    def _media_provider_of(self, url: str, media_provider: dict = None) -> dict:
+        """
+        Returns the media provider of the given URL.
+
+        :param url: The URL.
+        :param media_provider: Optional media provider all URLs belong to.
+        :return: The given media provider, the one of the URL's domain in the registry, or a media provider named after the domain with an unknown leaning.
+        """
+
+        return (
+            media_provider
+            or get_registry().find_by_domain(url)
+            or {"name": normalize_domain(url), "domain": normalize_domain(url)}
+        )
+
+    def _is_full(self, name: str) -> bool:
+        """
+        Returns whether the media provider has urls_per_provider URLs. The caller holds the lock.
+
+        :param name: The name of the media provider.
+        :return: True if the media provider is full, False otherwise.
+        """
+
+        return len(self._urls.get(name, [])) >= self.urls_per_provider
+
+    def _total_urls(self) -> int:
+        """
+        Returns the number of URLs kept across all media providers. The caller holds the lock.
+
+        :return: The number of URLs.
+        """
+
+        return sum(len(urls) for urls in self._urls.values())
+
+    def _slot_limit(self, leaning: str) -> int:
+        """
+        Returns the number of slots of the given leaning.
+
+        :param leaning: The political leaning.
+        :return: providers_per_leaning, or the slots of all leanings for media providers with an unknown leaning.
+        """
+
+        if leaning == UNKNOWN_LEANING:
+            return self.providers_per_leaning * len(LEANINGS)
+
+        return self.providers_per_leaning
+
+    def _leaning_met(self, leaning: str) -> bool:
+        """
+        Returns whether all slots of the leaning are held by full media providers. The caller holds the lock.
+
+        :param leaning: The political leaning.
+        :return: True if the quota of the leaning is met, False otherwise.
+        """
+
+        return sum(
+            1 for name in self._slots.get(leaning, set()) if self._is_full(name)
+        ) >= self._slot_limit(leaning)
+
+    def _met(self) -> bool:
+        """
+        Returns whether the discovery stage can stop. The caller holds the lock.
+
+        :return: True if the quotas are met, False otherwise.
+        """
+
+        return (
+            self._total_urls() >= self.total_articles
+            or all(self._leaning_met(leaning) for leaning in LEANINGS)
+            or self._leaning_met(UNKNOWN_LEANING)
+        )
+
+    def _claim(self, media_provider: dict) -> bool:
+        """
+        Reserves a slot of the media provider's leaning, as claim does. The caller holds the lock.
+
+        :param media_provider: A dictionary with the "name" and optionally the "leaning" of the media provider.
+        :return: True if the media provider holds a slot, False otherwise.
+        """
+
+        name = media_provider["name"]
+        leaning = get_leaning(media_provider)
+
+        slots = self._slots.setdefault(leaning, set())
+
+        if name in slots:
+            return True
+
+        if self._met() or len(slots) >= self._slot_limit(leaning):
+            return False
+
+        slots.add(name)
+
+        self._leanings[name] = leaning
+
+        return True
+
+    def met(self) -> bool:
+        """
+        Returns whether the discovery stage can stop.
+
+        :return: True if every leaning has enough full media providers or the total number of articles is reached, False otherwise.
+        """
+
+        with self._lock:
+            return self._met()
+
+    def claim(self, media_provider: dict) -> bool:
+        """
+        Reserves a slot of the media provider's leaning before the media provider is searched.
+
+        :param media_provider: A dictionary with the "name" and optionally the "leaning" of the media provider.
+        :return: True if the media provider should be searched, False if its leaning has no free slot or the quotas are already met.
+        """
+
+        with self._lock:
+            return self._claim(media_provider)
+
+    def release(self, media_provider: dict):
+        """
+        Gives up the slot of a media provider that has fewer URLs than its quota, so another media provider of its leaning can be searched. Its URLs are kept.
+
+        :param media_provider: A dictionary with the "name" and optionally the "leaning" of the media provider.
+        """
+
+        with self._lock:
+            if not self._is_full(media_provider["name"]):
+                self._slots.get(get_leaning(media_provider), set()).discard(
+                    media_provider["name"]
+                )
+
+    def add_urls(self, urls: list, media_provider: dict = None) -> list:
+        """
+        Keeps the URLs of written content that fit the quotas, in the given order.
+
+        A URL is dropped if its media provider already has urls_per_provider URLs, if the leaning of its media provider has no free slot, or if total_articles URLs were already kept.
+
+        :param urls: The URLs returned by the written content expert.
+        :param media_provider: Optional dictionary with the "name" and "leaning" of the media provider all URLs belong to. Otherwise, the media provider of every URL is looked up in the registry by its domain.
+        :return: The URLs that were kept.
+        """
+
+        kept_urls = []
+
+        with self._lock:
+            for url in dict.fromkeys(urls):
+                if self._total_urls() >= self.total_articles:
+                    break
+
+                url_media_provider = self._media_provider_of(url, media_provider)
+                name = url_media_provider["name"]
+
+                media_provider_urls = self._urls.get(name, [])
+
+                if (
+                    url in media_provider_urls
+                    or len(media_provider_urls) >= self.urls_per_provider
+                    or not self._claim(url_media_provider)
+                ):
+                    continue
+
+                self._urls.setdefault(name, []).append(url)
+
+                kept_urls.append(url)
+
+        return kept_urls
+
+    def note_search_results(self, urls: list) -> str:
+        """
+        Counts the URLs a search listed to the written content expert and returns a note telling it when it has enough of them.
+
+        :param urls: The URLs of the search results.
+        :return: A note to append to the search results, or an empty string if the agent should keep searching.
+        """
+
+        with self._lock:
+            full_names = []
+
+            for url in urls:
+                name = self._media_provider_of(url)["name"]
+
+                candidates = self._candidates.setdefault(name, set())
+
+                if len(candidates) < self.urls_per_provider:
+                    candidates.add(url)
+
+                    if len(candidates) == self.urls_per_provider:
+                        full_names.append(name)
+
+            listed_urls = sum(
+                len(candidates) for candidates in self._candidates.values()
+            )
+
+        if listed_urls >= self.total_articles or self.met():
+            return "\n\nThe URL quotas of this run are met. Don't search again, give your final answer now."
+
+        if full_names:
+            return f"\n\nYou have {self.urls_per_provider} URLs from {', '.join(full_names)} now, which is enough. Don't search {'it' if len(full_names) == 1 else 'them'} again, give your final answer if there is no other media provider left to search."
+
+        return ""
+
+    def candidates_of(self, urls: list) -> list:
+        """
+        Returns the given URLs that were counted as candidates by note_search_results, i.e., the first urls_per_provider URLs listed per media provider. They are the URLs the agent most likely keeps, so they can be scraped before it gives its final answer.
+
+        :param urls: The URLs of the search results.
+        :return: The candidate URLs, in the given order.
+        """
+
+        with self._lock:
+            return [
+                url
+                for url in dict.fromkeys(urls)
+                if url in self._candidates.get(self._media_provider_of(url)["name"], ())
+            ]
+
+    def coverage(self) -> dict:
+        """
+        Returns the coverage of every political leaning by the URLs kept so far.
+
+        :return: A dictionary with the number of media providers with URLs, the number of URLs and whether the quota is met per leaning. Media providers with an unknown leaning are reported under UNKNOWN_LEANING.
+        """
+
+        with self._lock:
+            coverage = {
+                leaning: {"providers": 0, "urls": 0, "met": self._leaning_met(leaning)}
+                for leaning in LEANINGS
+            }
+
+            for name, urls in self._urls.items():
+                leaning = self._leanings.get(name, UNKNOWN_LEANING)
+
+                leaning_coverage = coverage.setdefault(
+                    leaning, {"providers": 0, "urls": 0, "met": False}
+                )
+                leaning_coverage["providers"] += 1
+                leaning_coverage["urls"] += len(urls)
+
+        return coverage
+
+    def max_search_iterations(self, media_providers: int = None) -> int:
+        """
+        Returns the iteration limit of a written content expert searching the given number of media providers, a couple of searches per media provider and the final answer.
+
+        :param media_providers: The number of media providers the agent searches, defaults to the number of media providers the quotas keep.
+        :return: The maximum number of iterations.
+        """
+
+        if media_providers is None:
+            media_providers = self.providers_per_leaning * len(LEANINGS)
+
+        return media_providers * SEARCHES_PER_PROVIDER + 1
+
+    def max_scrape_iterations(self, media_providers: int = None) -> int:
+        """
+        Returns the iteration limit of a text extraction expert scraping the URLs of the given number of media providers, one scrape per URL and the final answer.
+
+        :param media_providers: The number of media providers whose URLs the agent scrapes, defaults to all URLs the quotas keep.
+        :return: The maximum number of iterations.
+        """
+
+        if media_providers is None:
+            return self.total_articles + 1
+
+        return min(media_providers * self.urls_per_provider, self.total_articles) + 1
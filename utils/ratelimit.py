@@ -0,0 +1,479 @@
+import os
+import random
+import threading
+import time
+
+# Default requests per second and burst size of every provider, overridden by the CREW_NEWS_RATE_LIMITS environment variable, e.g., "exa=5:5,firecrawl=2:10"
+DEFAULT_RATE_LIMITS = {
+    "aiml": (10.0, 20),
+    "exa": (5.0, 5),
+    "firecrawl": (5.0, 10),
+}
+
+# Status codes worth retrying: rate limited or a temporary server error
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Default maximum number of retries of a request
+DEFAULT_MAX_RETRIES = 4
+
+# Default first backoff and maximum backoff in seconds
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 20.0
+
+# Default number of failed requests in a row that open the circuit of a provider, and how long it stays open in seconds
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+
+# Default maximum time a request waits for a token of its bucket in seconds
+DEFAULT_MAX_WAIT_SECONDS = 60.0
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request to a provider whose circuit is open, i.e., which failed too often in a row.
+    """
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        Initializes a token bucket that lets rate requests per second through on average, and up to burst requests at once.
+
+        :param rate: The number of tokens added per second.
+        :param burst: The maximum number of tokens in the bucket.
+
+        :return: An instance of TokenBucket.
+        """
+
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS) -> float:
+        """
+        Takes a token from the bucket, waiting for the next token if the bucket is empty.
+
+        Tokens are reserved in the order requests arrive, so waiting requests are served first in, first out.
+
+        :param max_wait_seconds: The maximum time to wait for a token in seconds.
+        :return: The time waited in seconds.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+
+            # Reserve the token now, and wait until it is refilled if the bucket is in debt
+            self._tokens -= 1
+
+            wait_seconds = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+            if wait_seconds > max_wait_seconds:
+                self._tokens += 1
+
+                raise TimeoutError(
+                    f"Waited more than {max_wait_seconds:.0f} s for the rate limit."
+                )
+
+        if wait_seconds:
+            time.sleep(wait_seconds)
+
+        return wait_seconds
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds: float = DEFAULT_RESET_SECONDS,
+    ):
+        """
+        Initializes a circuit breaker that fails fast once a provider failed failure_threshold times in a row.
+
+        After reset_seconds, a single trial request is let through (half-open): if it succeeds, the circuit closes again, otherwise it stays open for another reset_seconds. A trial request that ends without a verdict, e.g., throttled or never sent, gives its slot back, and one that doesn't report back within reset_seconds is replaced by a new one, so the circuit can't get stuck half-open.
+
+        :param failure_threshold: The number of failed requests in a row that open the circuit.
+        :param reset_seconds: How long the circuit stays open in seconds.
+
+        :return: An instance of CircuitBreaker.
+        """
+
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+
+        # Start time of the trial request of the half-open circuit, None if no trial request is running
+        self.trial_started_at = None
+
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Checks whether a request may be sent.
+
+        :raises CircuitOpenError: If the circuit is open, or half-open with its trial request still running.
+        """
+
+        with self._lock:
+            if self.state == "closed":
+                return
+
+            now = time.monotonic()
+
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self.trial_started_at = None
+
+            # Let a trial request through, unless one is running and hasn't timed out yet
+            if self.state == "half_open" and (
+                self.trial_started_at is None
+                or now - self.trial_started_at >= self.reset_seconds
+            ):
+                self.trial_started_at = now
+
+                return
+
+            raise CircuitOpenError(
+                f"The provider failed {self.failures} times in a row, not sending requests for {self.reset_seconds:.0f} s."
+            )
+
+    def record_success(self):
+        """
+        Closes the circuit after a successful request.
+        """
+
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.trial_started_at = None
+
+    def release(self):
+        """
+        Ends a request without a verdict on the provider, e.g., a throttled request or one that was never sent. If it was the trial request of the half-open circuit, the next request becomes the trial request.
+        """
+
+        with self._lock:
+            if self.state == "half_open":
+                self.trial_started_at = None
+
+    def record_failure(self):
+        """
+        Counts a failed request and opens the circuit if the provider failed too often in a row, or if the trial request failed.
+        """
+
+        with self._lock:
+            self.failures += 1
+
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.trial_started_at = None
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        provider: str,
+        rate: float,
+        burst: int,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds: float = DEFAULT_RESET_SECONDS,
+    ):
+        """
+        Initializes the rate limiter of a provider, shared by all sessions in the process: a token bucket, retries with jittered exponential backoff on 429 and 5xx responses, and a circuit breaker.
+
+        :param provider: The name of the provider, e.g., "exa".
+        :param rate: The number of requests per second.
+        :param burst: The maximum number of requests sent at once.
+        :param max_retries: The maximum number of retries of a request.
+        :param base_delay: The backoff before the first retry in seconds, doubled on every retry.
+        :param max_delay: The maximum backoff in seconds.
+        :param failure_threshold: The number of failed requests in a row that open the circuit.
+        :param reset_seconds: How long the circuit stays open in seconds.
+
+        :return: An instance of RateLimiter.
+        """
+
+        self.provider = provider
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+
+        # Counters exposed as metrics
+        self.requests = 0
+        self.queued_requests = 0
+        self.queue_wait_seconds = 0.0
+        self.throttled = 0
+        self.server_errors = 0
+        self.network_errors = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Returns the backoff before the given retry, with full jitter so concurrent sessions don't retry in lockstep.
+
+        :param attempt: The number of the retry, starting at 0.
+        :param retry_after: Optional value of the Retry-After header of the response, in seconds.
+        :return: The backoff in seconds.
+        """
+
+        try:
+            return min(self.max_delay, max(0.0, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _count(self, **increments):
+        """
+        Adds the given increments to the counters of the rate limiter.
+
+        :param increments: The counters to increment, e.g., throttled=1.
+        """
+
+        with self._lock:
+            for counter, increment in increments.items():
+                setattr(self, counter, getattr(self, counter) + increment)
+
+    def send(self, send_request, close_response=None):
+        """
+        Sends a request through the rate limiter: waits for a token, sends it, and retries it with backoff while the provider is throttling or failing.
+
+        :param send_request: A function sending the request and returning the response, which has a status_code and headers.
+        :param close_response: Optional function closing a response that is retried, to release its connection.
+        :return: The response of the last attempt, which may still have a retryable status code if all retries were used.
+        :raises CircuitOpenError: If the provider failed too often in a row.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_request()
+            except CircuitOpenError:
+                self._count(rejected=1)
+
+                raise
+
+            # A request that times out waiting for its token was never sent, so it says nothing about the provider
+            try:
+                wait_seconds = self.bucket.acquire()
+            except TimeoutError:
+                self.breaker.release()
+
+                raise
+
+            self._count(
+                requests=1,
+                queued_requests=1 if wait_seconds else 0,
+                queue_wait_seconds=wait_seconds,
+            )
+
+            try:
+                response = send_request()
+            except Exception:
+                self.breaker.record_failure()
+
+                self._count(network_errors=1)
+
+                if attempt == self.max_retries:
+                    raise
+
+                backoff_seconds = self._backoff(attempt)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_success()
+
+                    return response
+
+                # A throttled request means the provider is up, so only server errors count towards the circuit
+                if response.status_code == 429:
+                    self.breaker.release()
+
+                    self._count(throttled=1)
+                else:
+                    self.breaker.record_failure()
+
+                    self._count(server_errors=1)
+
+                if attempt == self.max_retries:
+                    return response
+
+                backoff_seconds = self._backoff(
+                    attempt, response.headers.get("Retry-After")
+                )
+
+                if close_response:
+                    close_response(response)
+
+            self._count(retries=1, backoff_seconds=backoff_seconds)
+
+            time.sleep(backoff_seconds)
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the rate limiter.
+
+        :return: A dictionary with the provider, its limits, the state of its circuit, the number of requests, queued requests, throttled, failed, retried and rejected requests, and the time spent waiting for a token and backing off in seconds.
+        """
+
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "rate": self.bucket.rate,
+                "burst": self.bucket.burst,
+                "circuit": self.breaker.state,
+                "requests": self.requests,
+                "queued_requests": self.queued_requests,
+                "queue_wait_seconds": round(self.queue_wait_seconds, 3),
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+                "network_errors": self.network_errors,
+                "retries": self.retries,
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "rejected": self.rejected,
+            }
+
+
+def parse_rate_limits(value: str) -> dict:
+    """
+    Parses rate limits given as "provider=rate:burst" pairs separated by commas, e.g., "exa=5:5,firecrawl=2:10".
+
+    :param value: The rate limits.
+    :return: A dictionary of the requests per second and the burst size by provider.
+    """
+
+    rate_limits = {}
+
+    for pair in filter(None, (pair.strip() for pair in (value or "").split(","))):
+        provider, _, limit = pair.partition("=")
+        rate, _, burst = limit.partition(":")
+
+        rate_limits[provider.strip()] = (
+            float(rate),
+            int(burst) if burst else max(1, int(float(rate))),
+        )
+
+    return rate_limits
+
+
+# Initialize the rate limiters, shared by all sessions
+rate_limiters = {
+    provider: RateLimiter(provider, rate, burst)
+    for provider, (rate, burst) in {
+        **DEFAULT_RATE_LIMITS,
+        **parse_rate_limits(os.environ.get("CREW_NEWS_RATE_LIMITS")),
+    }.items()
+}
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    Returns the shared rate limiter of the given provider.
+
+    :param provider: The name of the provider, e.g., "exa".
+    :return: An instance of RateLimiter.
+    """
+
+    return rate_limiters[provider]
+
+
+def render_metrics() -> str:
+    """
+    Renders the counters of all rate limiters in the Prometheus text exposition format.
+
+    :return: The metrics as text.
+    """
+
+    metrics = [
+        (
+            "crew_news_rate_limit_requests_total",
+            "counter",
+            "Requests sent.",
+            "requests",
+        ),
+        (
+            "crew_news_rate_limit_queued_requests_total",
+            "counter",
+            "Requests that waited for a token.",
+            "queued_requests",
+        ),
+        (
+            "crew_news_rate_limit_queue_wait_seconds_total",
+            "counter",
+            "Time requests waited for a token.",
+            "queue_wait_seconds",
+        ),
+        (
+            "crew_news_rate_limit_throttled_total",
+            "counter",
+            "Responses with status 429.",
+            "throttled",
+        ),
+        (
+            "crew_news_rate_limit_server_errors_total",
+            "counter",
+            "Responses with status 5xx.",
+            "server_errors",
+        ),
+        (
+            "crew_news_rate_limit_network_errors_total",
+            "counter",
+            "Requests that failed without a response.",
+            "network_errors",
+        ),
+        ("crew_news_rate_limit_retries_total", "counter", "Retries.", "retries"),
+        (
+            "crew_news_rate_limit_backoff_seconds_total",
+            "counter",
+            "Time spent backing off before retries.",
+            "backoff_seconds",
+        ),
+        (
+            "crew_news_rate_limit_rejected_total",
+            "counter",
+            "Requests rejected by an open circuit.",
+            "rejected",
+        ),
+    ]
+
+    all_stats = [rate_limiter.stats() for rate_limiter in rate_limiters.values()]
+
+    lines = []
+
+    for metric, metric_type, description, field in metrics:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+
+        for stats in all_stats:
+            lines.append(f'{metric}{{provider="{stats["provider"]}"}} {stats[field]}')
+
+    lines.append(
+        "# HELP crew_news_rate_limit_circuit_open Whether the circuit of the provider is open."
+    )
+    lines.append("# TYPE crew_news_rate_limit_circuit_open gauge")
+
+    for stats in all_stats:
+        lines.append(
+            f'crew_news_rate_limit_circuit_open{{provider="{stats["provider"]}"}} {int(stats["circuit"] != "closed")}'
+        )
+
+    return "\n".join(lines) + "\n"
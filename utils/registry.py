@@ -0,0 +1,247 @@
+from functools import lru_cache
+from urllib.parse import urlsplit
+from utils.parsing import parse_json_output
+import argparse
+import datetime
+import json
+import os
+
+# Location of the versioned media provider registry
+REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "media_providers.json",
+)
+
+# Political leanings a media provider can have
+LEANINGS = ("left", "center", "right")
+
+
+def normalize_domain(domain: str) -> str:
+    """
+    Returns the bare domain of the given domain or URL, without the scheme, the "www." prefix and the path.
+
+    :param domain: The domain or URL, e.g., "https://www.cnn.com/politics".
+    :return: The bare domain, e.g., "cnn.com".
+    """
+
+    domain = domain.strip().lower()
+
+    if "//" not in domain:
+        domain = f"//{domain}"
+
+    host = urlsplit(domain).hostname or ""
+
+    return host[len("www.") :] if host.startswith("www.") else host
+
+
+class MediaProviderRegistry:
+    def __init__(self, path: str = REGISTRY_PATH):
+        """
+        Loads the media provider registry and indexes it for lookup by country, name and domain.
+
+        The registry is a JSON file with a version, the date it was last updated, and a list of media providers per country. Every media provider has a name, a political leaning (left, center or right) and a canonical domain.
+
+        :param path: The path of the registry file.
+
+        :return: An instance of MediaProviderRegistry.
+        """
+
+        with open(path, encoding="utf-8") as registry_file:
+            registry = json.load(registry_file)
+
+        self.path = path
+        self.version = registry["version"]
+        self.updated_at = registry["updated_at"]
+        self.countries = registry["countries"]
+
+        # Index media providers for lookup by name and domain
+        self._by_country = {
+            country.lower(): media_providers
+            for country, media_providers in self.countries.items()
+        }
+        self._by_name = {}
+        self._by_domain = {}
+
+        for media_providers in self.countries.values():
+            for media_provider in media_providers:
+                self._by_name[media_provider["name"].lower()] = media_provider
+                self._by_domain[normalize_domain(media_provider["domain"])] = (
+                    media_provider
+                )
+
+    def covers(self, selected_country: str) -> bool:
+        """
+        Returns whether the registry has media providers for the given country.
+
+        :param selected_country: The country.
+        :return: True if the country is covered, False otherwise.
+        """
+
+        return bool(self._by_country.get(selected_country.lower()))
+
+    def get_media_providers(self, selected_country: str) -> list:
+        """
+        Returns the media providers of the given country.
+
+        :param selected_country: The country.
+        :return: A list of dictionaries with the "name", "leaning" and "domain" of each media provider, or an empty list if the country is not covered.
+        """
+
+        return list(self._by_country.get(selected_country.lower(), []))
+
+    def find_by_name(self, name: str):
+        """
+        Returns the media provider with the given name, ignoring case.
+
+        :param name: The name of the media provider.
+        :return: A dictionary with the "name", "leaning" and "domain" of the media provider, or None if it is not in the registry.
+        """
+
+        return self._by_name.get(name.strip().lower())
+
+    def find_by_domain(self, domain: str):
+        """
+        Returns the media provider with the given domain.
+
+        :param domain: The domain or any URL of the media provider.
+        :return: A dictionary with the "name", "leaning" and "domain" of the media provider, or None if it is not in the registry.
+        """
+
+        return self._by_domain.get(normalize_domain(domain))
+
+
+@lru_cache(maxsize=None)
+def get_registry(path: str = REGISTRY_PATH) -> MediaProviderRegistry:
+    """
+    Returns the media provider registry, loaded once per process.
+
+    :param path: The path of the registry file.
+    :return: An instance of MediaProviderRegistry.
+    """
+
+    return MediaProviderRegistry(path)
+
+
+def refresh_registry(
+    selected_country: str,
+    api_key: str,
+    path: str = REGISTRY_PATH,
+) -> list:
+    """
+    Rebuilds the media providers of the given country with the LLM and writes them to the registry with a new version.
+
+    This is meant to be run offline, not while generating the news. The media expert agent runs on the shared LLM of the large model tier, through the AIML rate limiter.
+
+    :param selected_country: The country for which to rebuild the media providers.
+    :param api_key: The AIML API key.
+    :param path: The path of the registry file.
+    :return: The list of media providers written to the registry.
+    """
+
+    from crewai import Crew, Process
+    from utils.agents import UnbiasedNewsAgents
+    from utils.tasks import UnbiasedNewsTasks
+
+    # Get the media expert on the shared LLM of the large model tier, bypassing the completion cache so the media providers are looked up again
+    media_expert = UnbiasedNewsAgents(
+        cached_roles={},
+        role_tiers={},
+        api_keys={"aiml_api_key": api_key},
+    ).media_expert_agent()
+
+    registry_crew = Crew(
+        agents=[media_expert],
+        tasks=[
+            UnbiasedNewsTasks().get_media_provider_registry_task(
+                media_expert,
+                selected_country,
+            )
+        ],
+        process=Process.sequential,
+        share_crew=False,
+        verbose=True,
+    )
+
+    registry_output = registry_crew.kickoff()
+
+    # Take the validated media providers, and parse the raw output only if the validation failed
+    if registry_output.pydantic is not None:
+        raw_media_providers = registry_output.pydantic.model_dump()["items"]
+    else:
+        raw_media_providers = parse_json_output(registry_output.raw)
+
+    # Keep only media providers with a name, a known leaning and a domain, once per domain
+    media_providers = {}
+
+    for media_provider in raw_media_providers:
+        if not isinstance(media_provider, dict):
+            continue
+
+        name = str(media_provider.get("name", "")).strip()
+        leaning = str(media_provider.get("leaning", "")).strip().lower()
+        domain = normalize_domain(str(media_provider.get("domain", "")))
+
+        if name and leaning in LEANINGS and domain:
+            media_providers.setdefault(
+                domain,
+                {"name": name, "leaning": leaning, "domain": domain},
+            )
+
+    if not media_providers:
+        raise ValueError(
+            f"The LLM didn't return any valid media provider for {selected_country}."
+        )
+
+    # Write the media providers to the registry with a new version
+    with open(path, encoding="utf-8") as registry_file:
+        registry = json.load(registry_file)
+
+    registry["version"] += 1
+    registry["updated_at"] = datetime.date.today().isoformat()
+    registry["countries"][selected_country] = sorted(
+        media_providers.values(),
+        key=lambda media_provider: LEANINGS.index(media_provider["leaning"]),
+    )
+
+    with open(path, "w", encoding="utf-8") as registry_file:
+        json.dump(registry, registry_file, indent=4, ensure_ascii=False)
+        registry_file.write("\n")
+
+    get_registry.cache_clear()
+
+    return registry["countries"][selected_country]
+
+
+# Rebuild the registry from the command line, e.g.: python -m utils.registry refresh --country "United States"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage the CrewNews media provider registry."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = subparsers.add_parser(
+        "refresh",
+        help="Rebuild the media providers of a country with the LLM.",
+    )
+    refresh_parser.add_argument(
+        "--country",
+        default="United States",
+        help="The country for which to rebuild the media providers.",
+    )
+    refresh_parser.add_argument(
+        "--api-key",
+        default=os.environ.get("AIML_API_KEY"),
+        help="The AIML API key, defaults to the AIML_API_KEY environment variable.",
+    )
+
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("The AIML API key is missing. Pass --api-key or set AIML_API_KEY.")
+
+    refreshed_media_providers = refresh_registry(args.country, args.api_key)
+
+    print(
+        f"Wrote {len(refreshed_media_providers)} media providers for {args.country} to {REGISTRY_PATH} (version {get_registry().version})."
+    )
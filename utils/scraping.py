@@ -0,0 +1,179 @@
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from utils.http import pooled_session, session_stats
+from utils.ratelimit import RateLimiter
+import os
+import time
+
+# Default Firecrawl API URL, overridden by the FIRECRAWL_API_URL environment variable (e.g., a self-hosted Firecrawl)
+DEFAULT_FIRECRAWL_API_URL = os.environ.get(
+    "FIRECRAWL_API_URL", "https://api.firecrawl.dev"
+)
+
+# Default maximum number of pages scraped at the same time from the same host
+DEFAULT_PER_HOST_LIMIT = 2
+
+
+class FirecrawlBulkScraper:
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = DEFAULT_FIRECRAWL_API_URL,
+        max_workers: int = 8,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        timeout: int = 60,
+        rate_limiter: RateLimiter = None,
+    ):
+        """
+        Initializes a bulk scraper that talks to the Firecrawl scrape API over one pooled HTTP session.
+
+        Unlike FirecrawlApp, the scraper keeps its HTTP connections alive between pages, so only the first request per connection pays for the TLS handshake.
+
+        :param api_key: The Firecrawl API key.
+        :param api_url: The Firecrawl API URL, e.g., the URL of a local test double.
+        :param max_workers: The default maximum number of pages scraped at the same time, also the size of the HTTP connection pool.
+        :param per_host_limit: The default maximum number of pages scraped at the same time from the same host.
+        :param timeout: The timeout of a single scrape request in seconds.
+        :param rate_limiter: Optional RateLimiter every scrape request is sent through.
+
+        :return: An instance of FirecrawlBulkScraper.
+        """
+
+        self.api_url = api_url.rstrip("/")
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout = timeout
+
+        # Pool the HTTP connections, one slot per worker
+        self.session = pooled_session(
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            pool_maxsize=self.max_workers,
+            rate_limiter=rate_limiter,
+        )
+
+    def scrape_url(self, url: str) -> dict:
+        """
+        Scrapes a single URL.
+
+        :param url: The URL to scrape.
+        :return: A dictionary with the markdown and metadata of the scraped URL.
+        """
+
+        response = self.session.post(
+            f"{self.api_url}/v1/scrape",
+            json={"url": url, "formats": ["markdown"]},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+        response_json = response.json()
+
+        if not response_json.get("success"):
+            raise RuntimeError(
+                f"Failed to scrape {url}: {response_json.get('error', 'unknown error')}"
+            )
+
+        return response_json["data"]
+
+    def _scrape_job(self, url: str) -> dict:
+        """
+        Scrapes a single URL as a job, catching its error so one broken page doesn't stop the others.
+
+        :param url: The URL to scrape.
+        :return: A dictionary with the "url", the elapsed time in milliseconds, and either the "content" and "metadata" or the "error" of the URL.
+        """
+
+        start_time = time.time()
+
+        try:
+            data = self.scrape_url(url)
+        except Exception as e:
+            return {
+                "url": url,
+                "error": str(e),
+                "elapsed_ms": int((time.time() - start_time) * 1000),
+            }
+
+        return {
+            "url": url,
+            "content": data.get("markdown", ""),
+            "metadata": data.get("metadata", {}),
+            "elapsed_ms": int((time.time() - start_time) * 1000),
+        }
+
+    def scrape_urls(
+        self,
+        urls: list,
+        max_workers: int = None,
+        per_host_limit: int = None,
+        poll_interval: float = 0.5,
+    ):
+        """
+        Scrapes all given URLs concurrently and yields every page as soon as it finishes.
+
+        URLs are submitted as jobs in batches: every time a job finishes, all waiting URLs whose host is below the per-host limit are submitted, up to the worker limit. Pages are yielded in the order they finish, not in the order of the given URLs.
+
+        :param urls: The URLs to scrape. Duplicate URLs are scraped once.
+        :param max_workers: Optional maximum number of pages scraped at the same time, defaults to the one of the scraper.
+        :param per_host_limit: Optional maximum number of pages scraped at the same time from the same host, defaults to the one of the scraper.
+        :param poll_interval: How often to poll the running jobs for completions in seconds.
+        :return: A generator of dictionaries as returned by _scrape_job.
+        """
+
+        max_workers = max(1, max_workers or self.max_workers)
+        per_host_limit = max(1, per_host_limit or self.per_host_limit)
+
+        waiting_urls = deque(dict.fromkeys(urls))
+        running_per_host = defaultdict(int)
+        running_jobs = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while waiting_urls or running_jobs:
+                # Submit a batch of jobs for every URL whose host has a free slot
+                for _ in range(len(waiting_urls)):
+                    if len(running_jobs) >= max_workers:
+                        break
+
+                    url = waiting_urls.popleft()
+                    host = urlsplit(url).netloc.lower()
+
+                    if running_per_host[host] >= per_host_limit:
+                        waiting_urls.append(url)
+
+                        continue
+
+                    running_per_host[host] += 1
+
+                    running_jobs[executor.submit(self._scrape_job, url)] = host
+
+                # Poll the running jobs and yield the finished ones
+                finished_jobs, _ = wait(
+                    running_jobs,
+                    timeout=poll_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+
+                for finished_job in finished_jobs:
+                    running_per_host[running_jobs.pop(finished_job)] -= 1
+
+                    yield finished_job.result()
+
+    def connection_stats(self) -> dict:
+        """
+        Returns the connection statistics of the pooled HTTP session.
+
+        :return: A dictionary as returned by session_stats.
+        """
+
+        return session_stats(self.session)
+
+    def close(self):
+        """
+        Closes the pooled HTTP session.
+        """
+
+        self.session.close()
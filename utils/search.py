@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit
+from utils.registry import normalize_domain
+import re
+
+# Default number of days back a search result may be published to count as current news
+DEFAULT_PUBLISHED_WITHIN_DAYS = 30
+
+# Number of search results requested per URL kept, so the results dropped by the ranking (off-domain pages, section fronts) don't leave a media provider short
+RESULTS_PER_URL = 2
+
+# Maximum number of search results requested per media provider
+MAX_RESULTS_PER_QUERY = 10
+
+# Minimum number of words in the slug of an article path without digits, e.g., "/politics/senate-passes-budget-bill". Shorter paths like "/politics" or "/us-news" are section fronts
+MIN_ARTICLE_SLUG_WORDS = 3
+
+
+def published_since(days: int) -> str:
+    """
+    Returns the start of the published date filter of a search, at the start of the day the given number of days ago.
+
+    The date is rounded to the day, so the searches of the same day share their cache entries.
+
+    :param days: The number of days back.
+    :return: The date in ISO 8601 format, e.g., "2024-08-12T00:00:00.000Z".
+    """
+
+    start_date = datetime.now(timezone.utc) - timedelta(days=max(1, days))
+
+    return start_date.strftime("%Y-%m-%dT00:00:00.000Z")
+
+
+def news_query(topic: str) -> str:
+    """
+    Returns the search query for news articles on the given topic.
+
+    Exa's neural search works best with the text that would come right before a link to the page searched for, rather than with keywords.
+
+    :param topic: The topic of the news.
+    :return: The search query.
+    """
+
+    return f"Here is a news article about {topic.strip()}:"
+
+
+def results_per_query(urls_per_provider: int) -> int:
+    """
+    Returns the number of search results to request for a media provider.
+
+    :param urls_per_provider: The number of URLs kept per media provider.
+    :return: The number of search results.
+    """
+
+    return min(MAX_RESULTS_PER_QUERY, max(1, urls_per_provider) * RESULTS_PER_URL)
+
+
+def is_article_path(path: str) -> bool:
+    """
+    Returns whether the given URL path points to an article rather than to the homepage or a section front, e.g., "/politics" or "/world/europe/".
+
+    Article paths carry a date or an ID (e.g., "/2024/09/10/politics/debate" or "/news/article-123"), a file name (e.g., "/politics/debate.html"), or a slug of several words.
+
+    :param path: The path of the URL.
+    :return: True if the path points to an article, False otherwise.
+    """
+
+    segments = [segment for segment in path.split("/") if segment]
+
+    if not segments:
+        return False
+
+    if any(char.isdigit() for char in path) or "." in segments[-1]:
+        return True
+
+    return any(
+        len(re.split(r"[-_]+", segment)) >= MIN_ARTICLE_SLUG_WORDS
+        for segment in segments
+    )
+
+
+def rank_news_urls(response: dict, domain: str) -> list:
+    """
+    Returns the URLs of the articles of a search response on the given domain, the most relevant first.
+
+    Results are ranked by their score and then by their published date, so equally relevant articles are taken newest first. Results off the domain or without an article path (e.g., the homepage or a section front like "https://cnn.com/politics") are dropped, and URLs differing only in their fragment are kept once.
+
+    :param response: The search response as a dictionary with a "results" list.
+    :param domain: The domain of the media provider, e.g., "cnn.com". Its subdomains match too.
+    :return: The ranked URLs.
+    """
+
+    domain = normalize_domain(domain)
+
+    ranked_results = sorted(
+        response.get("results", []),
+        key=lambda result: (
+            result.get("score") or 0,
+            result.get("published_date") or result.get("publishedDate") or "",
+        ),
+        reverse=True,
+    )
+
+    ranked_urls = {}
+
+    for result in ranked_results:
+        url = result.get("url")
+
+        if not url:
+            continue
+
+        split_url = urlsplit(url)
+        host = normalize_domain(url)
+
+        if not (host == domain or host.endswith(f".{domain}")):
+            continue
+
+        if not is_article_path(split_url.path):
+            continue
+
+        ranked_urls.setdefault(
+            urlunsplit(
+                (
+                    split_url.scheme,
+                    split_url.netloc,
+                    split_url.path,
+                    split_url.query,
+                    "",
+                )
+            ),
+            None,
+        )
+
+    return list(ranked_urls)
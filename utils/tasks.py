@@ -1,7 +1,36 @@
-from crewai import Task
+from utils.outputs import (
+    ValidatedTask,
+    MediaProviders,
+    MediaProvidersWithDomains,
+    NewsUrlsList,
+    NewsContentList,
+)
 
 
 class UnbiasedNewsTasks:
+    def __init__(self, tracer=None):
+        """
+        Initializes the UnbiasedNewsTasks.
+
+        Every Task with a JSON output has a typed output model. Its output is validated in-process, repaired locally if needed, and only converted by the LLM as a last resort.
+
+        :param tracer: Optional Tracer of the run, to record the validation of every task output.
+
+        :return: An instance of UnbiasedNewsTasks.
+        """
+
+        self.tracer = tracer
+
+    def _task(self, **fields):
+        """
+        Returns a Task whose output is validated against its output model and recorded in the tracer of the run.
+
+        :param fields: The fields of the Task, e.g., the description, expected output, agent and output_pydantic model.
+        :return: The ValidatedTask.
+        """
+
+        return ValidatedTask(**fields).set_tracer(self.tracer)
+
     def get_media_providers_task(self, agent, selected_country):
         """
         Returns a Task that will get all media providers you can find in the given country.
@@ -17,10 +46,12 @@ class UnbiasedNewsTasks:
         :return: The Task.
         """
 
-        return Task(
+        return self._task(
             description=f"Get all media providers you can find in {selected_country}. At least 20 media providers should be returned. The number of all results should be equally divided into left, center and right media providers. So, 33.33% should be left, 33.33% center and 33.33% right media providers.",
             expected_output='JSON representing an array of objects as follows: [{"name": "Media Provider 1"}]',
             agent=agent,
+            name="Get media providers",
+            output_pydantic=MediaProviders,
         )
 
     def get_media_provider_web_domain_task(self, agent):
@@ -28,18 +59,47 @@ class UnbiasedNewsTasks:
         Returns a Task that will get the domain for the given media provider.
 
         The Task will return the domain for the given media provider.
+        The name of the media provider is kept next to the domain so the providers can be searched one by one in the fan-out mode.
 
         :param agent: The Agent to which the Task should be assigned.
         :return: The Task.
         """
 
-        return Task(
+        return self._task(
             description="Get the domain for the given media provider.",
-            expected_output='JSON representing an array of objects as follows: [{"domain": "https://www.mediaprovider1.com"}]',
+            expected_output='JSON representing an array of objects as follows: [{"name": "Media Provider 1", "domain": "https://www.mediaprovider1.com"}]',
             agent=agent,
+            name="Get media provider web domains",
+            output_pydantic=MediaProvidersWithDomains,
         )
 
-    def get_media_provider_written_content_urls_task(self, agent, topic):
+    def get_media_provider_registry_task(self, agent, selected_country):
+        """
+        Returns a Task that will get media providers in the given country together with their political leaning and domain.
+
+        The Task is used offline to rebuild the media provider registry, not while generating the news.
+
+        :param agent: The Agent to which the Task should be assigned.
+        :param selected_country: The country for which to get the media providers.
+        :return: The Task.
+        """
+
+        return self._task(
+            description=f"Get the most widely read media providers in {selected_country}. At least 24 media providers should be returned, equally divided into left, center and right media providers. For each media provider, get its political leaning and the domain of its website without the scheme and the www prefix.",
+            expected_output='JSON representing an array of objects as follows: [{"name": "Media Provider 1", "leaning": "left", "domain": "mediaprovider1.com"}]',
+            agent=agent,
+            name="Get media provider registry",
+            output_pydantic=MediaProvidersWithDomains,
+        )
+
+    def get_media_provider_written_content_urls_task(
+        self,
+        agent,
+        topic,
+        media_provider=None,
+        media_providers=None,
+        quota=None,
+    ):
         """
         Returns a Task that will get multiple URLs of written content from multiple media providers on the given topic.
 
@@ -50,16 +110,60 @@ class UnbiasedNewsTasks:
         Skip all non-written URLs. If you get a video URL (e.g., YouTube URL) or image URL, skip it.
         In the end, you should have multiple URLs of written content per media provider and multiple media providers.
         When using the search tool never search for multiple media providers at the same time, but only one at a time.
+        If the URL quotas of the run are given, the Task asks for exactly that many URLs per media provider and media providers per political leaning, and to stop as soon as they are met.
 
         :param agent: The Agent to which the Task should be assigned.
         :param topic: The topic for which to get the URLs of written content.
+        :param media_provider: Optional dictionary with the "name" and "domain" of a single media provider. If given, the Task will only search this media provider.
+        :param media_providers: Optional list of dictionaries with the "name" and "domain" of the media providers to search. If given, the media providers don't have to be taken from the previous Task.
+        :param quota: Optional DiscoveryQuota of the run.
         :return: The Task.
         """
 
-        return Task(
-            description=f"Get multiple URLs of written content from multiple media providers on the following topic: {topic}. Skip all non-written URLs. If you get a video URL (e.g., YouTube URL) or image URL, skip it. In the end, you should have multiple URLs of written content per media provider and multiple media providers. When using the search tool never search for multiple media providers at the same time, but only one at a time.",
+        # Ask for an explicit number of URLs if the quotas of the run are given
+        urls_description = (
+            f"{quota.urls_per_provider} URLs" if quota else "multiple URLs"
+        )
+
+        # Scope the Task to a single media provider in the fan-out mode
+        if media_provider:
+            return self._task(
+                description=f"Get {urls_description} of written content from the media provider {media_provider['name']} ({media_provider['domain']}) on the following topic: {topic}. Skip all non-written URLs. If you get a video URL (e.g., YouTube URL) or image URL, skip it. Only return URLs from the {media_provider['domain']} domain.",
+                expected_output='JSON representing an array of objects as follows: [{"news_urls":["https://www.mediaprovider1.com/news_1","https://www.mediaprovider1.com/news_2","https://www.mediaprovider1.com/news_3"]}]',
+                agent=agent,
+                name="Get written content URLs",
+                output_pydantic=NewsUrlsList,
+            )
+
+        # List the media providers to search if they are already known
+        media_providers_description = ""
+
+        if media_providers:
+            media_providers_description = (
+                f" Search the following media providers{' in this order' if quota else ''}: "
+                + ", ".join(
+                    (
+                        f"{media_provider['name']} ({media_provider['domain']}, {media_provider['leaning']})"
+                        if media_provider.get("leaning")
+                        else f"{media_provider['name']} ({media_provider['domain']})"
+                    )
+                    for media_provider in media_providers
+                )
+                + "."
+            )
+
+        # State when to stop searching if the quotas of the run are given
+        if quota:
+            goal_description = f"Stop as soon as you have {quota.urls_per_provider} URLs of written content from each of {quota.providers_per_leaning} media providers per political leaning (left, center and right), and never return more than {quota.total_articles} URLs in total."
+        else:
+            goal_description = "In the end, you should have multiple URLs of written content per media provider and multiple media providers."
+
+        return self._task(
+            description=f"Get {urls_description} of written content{' per media provider' if quota else ''} from multiple media providers on the following topic: {topic}.{media_providers_description} Skip all non-written URLs. If you get a video URL (e.g., YouTube URL) or image URL, skip it. {goal_description} When using the search tool never search for multiple media providers at the same time, but only one at a time.",
             expected_output='JSON representing an array of objects as follows: [{"news_urls":["https://www.mediaprovider1.com/news_1","https://www.mediaprovider1.com/news_2","https://www.mediaprovider1.com/news_3","https://www.mediaprovider1.com/news_4","https://www.mediaprovider1.com/news_5"]}]',
             agent=agent,
+            name="Get written content URLs",
+            output_pydantic=NewsUrlsList,
         )
 
     def get_written_content_from_url_task(self, agent):
@@ -77,13 +181,46 @@ class UnbiasedNewsTasks:
         :return: The Task.
         """
 
-        return Task(
+        return self._task(
             description="Get all written content for the given content URL. Don't summarize it, just take it all. Do this for every content URL.",
             expected_output='JSON representing an array of objects as follows: [{"news_content":["This is content from the news 1.","This is content from the news 2.","This is content from the news 3.","This is content from the news 4.","This is content from the news 5."]}]',
             agent=agent,
+            name="Get written content",
+            output_pydantic=NewsContentList,
         )
 
-    def get_unbiased_news_task(self, agent):
+    def get_news_digest_task(self, agent, group_name, written_content, digest_tokens):
+        """
+        Returns a Task that will condense the written content of a group of media providers into a digest.
+
+        The Task is the map step of the map-reduce synthesis: every group of media providers gets its own digest, and the digests are merged by the unbiased news Task.
+        Every claim in the digest has to stay attributed to its media provider, and all source URLs have to be kept.
+
+        :param agent: The Agent to which the Task should be assigned.
+        :param group_name: The name of the group of media providers, e.g., a media provider or a political leaning.
+        :param written_content: The written content of the group of media providers.
+        :param digest_tokens: The approximate maximum length of the digest in tokens.
+        :return: The Task.
+        """
+
+        return self._task(
+            description=f"""
+                Condense the following written content from {group_name} into a digest of at most {digest_tokens} tokens.
+                Keep every distinct fact, claim and view. Drop repetitions.
+                Attribute every claim to the media provider that made it, e.g., 'Media provider 1 reports X.'
+                At the end of the digest, list all content URLs of the written content, formatted as:
+                - Media Provider: https://www.mediaprovider1.com/news_1
+
+                Here is the written content:
+
+                {written_content}
+            """,
+            expected_output="Markdown",
+            agent=agent,
+            name="Get news digest",
+        )
+
+    def get_unbiased_news_task(self, agent, written_content=None):
         """
         Returns a Task that will get all written content from multiple media providers for the given topic and make an unbiased version of the news.
 
@@ -97,11 +234,11 @@ class UnbiasedNewsTasks:
         At the bottom, add the 'Sources' section where you list all content URLs that were used to write the unbised version of the news as follows: - Media provider: https://www.mediaprovider1.com/news_1
 
         :param agent: The Agent to which the Task should be assigned.
+        :param written_content: Optional written content collected outside of the crew (e.g., merged from the fan-out sub-pipelines). If given, it is appended to the description.
         :return: The Task.
         """
 
-        return Task(
-            description="""
+        description = """
                 Collect and analyze all written content from multiple media providers on the given topic to create a comprehensive, unbiased news article. 
                 Ensure the final version is highly detailed and thorough, incorporating all available content without omitting any relevant information. 
                 Do not hesitate to make the article long; the goal is to provide a full, nuanced picture of the topic.
@@ -114,7 +251,19 @@ class UnbiasedNewsTasks:
 
                 At the end of the article, create a 'Sources' section listing all the content URLs used in the report, formatted as: 
                 - Media Provider: https://www.mediaprovider1.com/news_1
-            """,
+            """
+
+        # Append the written content collected outside of the crew
+        if written_content:
+            description += f"""
+                Here is all written content from multiple media providers:
+
+                {written_content}
+            """
+
+        return self._task(
+            description=description,
             expected_output="Markdown",
             agent=agent,
+            name="Get unbiased news",
         )
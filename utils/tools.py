@@ -1,74 +1,482 @@
 from crewai_tools import tool
-from exa_py import Exa
-from firecrawl.firecrawl import FirecrawlApp
-import streamlit as st
+from utils.cache import ScrapeCache, SearchCache
+from utils.clients import get_exa_client, get_firecrawl_client
+from utils.concurrency import get_api_key, get_run_state
+from utils.formatting import compact_search_results, DEFAULT_SEARCH_TOKEN_BUDGET
+from utils.extraction import extract_article, format_article
+from utils.ratelimit import CircuitOpenError
+from utils.registry import normalize_domain
+from utils.scraping import DEFAULT_PER_HOST_LIMIT
+from utils.search import news_query, rank_news_urls
+from utils.tracing import Tracer
+import dataclasses
+import functools
+import json
+import time
+
+# Default number of URLs scraped at the same time by the bulk scraping stage
+DEFAULT_SCRAPING_WORKERS = 8
+
+# Initialize the persistent cache of scraped pages, shared by all sessions
+scrape_cache = ScrapeCache()
+
+# Initialize the persistent cache of search responses, shared by all sessions
+search_cache = SearchCache()
+
+
+def traced_tool(tool_name: str):
+    """
+    Returns a decorator that records a tool span with the bytes in and out of every call of the tool in the tracer of the session.
+
+    If the provider behind the tool is down, the tool fails fast with a message telling the agent to give its final answer, instead of an error the agent retries until it runs out of iterations.
+
+    :param tool_name: The name of the tool.
+    :return: The decorator.
+    """
+
+    def decorator(tool_function):
+        @functools.wraps(tool_function)
+        def traced_tool_function(*args, **kwargs):
+            with UnbiasedNewsTools._tracer().span("tool", tool_name) as span:
+                span["bytes_out"] = len(
+                    json.dumps([args, kwargs], default=str).encode("utf-8")
+                )
+
+                try:
+                    result = tool_function(*args, **kwargs)
+                except CircuitOpenError as e:
+                    span["error"] = str(e)
+
+                    result = f"The {tool_name} is unavailable right now. {e} Don't use it again, give your final answer with what you have."
+
+                span["bytes_in"] = len(str(result).encode("utf-8"))
+
+                return result
+
+        return traced_tool_function
+
+    return decorator
 
 
 class UnbiasedNewsTools:
     def _exa():
         """
-        Returns an instance of the Exa search engine with the given API key.
+        Returns the shared instance of the Exa search engine for the given API key.
 
-        :return: An instance of Exa.
+        :return: An instance of PooledExa.
         """
 
-        return Exa(api_key=st.session_state["exa_api_key"])
+        return get_exa_client(get_api_key("exa_api_key"))
 
     def _firecrawl():
         """
-        Returns an instance of FirecrawlScrapeWebsiteTool with the given API key.
+        Returns the shared Firecrawl client for the given API key.
+
+        :return: An instance of FirecrawlBulkScraper.
+        """
+
+        return get_firecrawl_client(get_api_key("firecrawl_api_key"))
+
+    def _search_state():
+        """
+        Returns the search state of the current run: the URLs already listed to the agents, the full texts of the listed results and the token budget of a search result listing.
+
+        :return: A dictionary with the "seen_urls", "texts" and "token_budget" of the run.
+        """
+
+        return get_run_state().setdefault(
+            "search_state",
+            {
+                "seen_urls": set(),
+                "texts": {},
+                "token_budget": DEFAULT_SEARCH_TOKEN_BUDGET,
+            },
+        )
+
+    @staticmethod
+    def reset_search_state(token_budget: int = DEFAULT_SEARCH_TOKEN_BUDGET):
+        """
+        Resets the search state at the start of a run.
+
+        :param token_budget: The maximum number of tokens of a single search result listing.
+        """
+
+        get_run_state()["search_state"] = {
+            "seen_urls": set(),
+            "texts": {},
+            "token_budget": token_budget,
+        }
+
+    def _tracer():
+        """
+        Returns the tracer of the current run.
+
+        :return: An instance of Tracer.
+        """
+
+        return get_run_state().setdefault("tracer", Tracer())
+
+    @staticmethod
+    def set_tracer(tracer: Tracer):
+        """
+        Sets the tracer at the start of a run, so tool calls are recorded in the spans of the run.
+
+        :param tracer: The tracer of the run.
+        """
+
+        get_run_state()["tracer"] = tracer
+
+    @staticmethod
+    def set_api_keys(api_keys: dict):
+        """
+        Sets the API keys of a run that wasn't started from a session of the app, e.g., a batch run from a script.
+
+        :param api_keys: The API keys by name, or None to read them from st.session_state.
+        """
+
+        get_run_state()["api_keys"] = api_keys or {}
+
+    @staticmethod
+    def set_quota(quota):
+        """
+        Sets the URL discovery quota at the start of a run, so the search tool can tell the written content expert when it has enough URLs.
+
+        :param quota: The DiscoveryQuota of the run, or None to search without quotas.
+        """
+
+        get_run_state()["quota"] = quota
+
+    @staticmethod
+    def set_scraping_pipeline(scraping_pipeline):
+        """
+        Sets the scraping pipeline of the run, which the Exa custom tool puts the candidate URLs of every search on.
 
-        :return: An instance of FirecrawlScrapeWebsiteTool.
+        :param scraping_pipeline: The ScrapingPipeline of the run, or None to scrape only after the search stage.
         """
 
-        return FirecrawlApp(api_key=st.session_state["firecrawl_api_key"])
+        get_run_state()["scraping_pipeline"] = scraping_pipeline
+
+    def _scrape_url(url, firecrawl=None):
+        """
+        Scrapes the given URL through Firecrawl, serving it from the scrape cache when possible.
+
+        :param url: The URL to scrape.
+        :param firecrawl: Optional Firecrawl client to scrape with, defaults to the shared one.
+        :return: A dictionary with the markdown and metadata of the scraped URL.
+        """
+
+        cached_page = scrape_cache.get_page(url)
+
+        if cached_page is not None:
+            markdown, metadata = cached_page
+
+            return {"markdown": markdown, "metadata": json.loads(metadata or "{}")}
+
+        response = (firecrawl or UnbiasedNewsTools._firecrawl()).scrape_url(url)
+
+        # Only cache pages that actually have content
+        if response.get("markdown"):
+            scrape_cache.set_page(
+                url,
+                response["markdown"],
+                json.dumps(response.get("metadata", {})),
+            )
+
+        return response
 
     @tool("Exa custom tool")
+    @traced_tool("Exa custom tool")
     def exa_search_and_get_contents_tool(
         question: str,
     ) -> str:
         """
-        Searches the web for relevant content given a question and returns the contents of the most relevant result.
+        Searches the web for relevant content given a question and returns the URL, title, published date and summary of the most relevant results.
+
+        Results already listed in this run are skipped. Use the Exa full text tool to get the full text of a result. Once the URL quotas of the run are met, the results end with a note to stop searching.
 
         :param question: The question to search for.
-        :return: The HTML contents of the most relevant result.
+        :return: The most relevant results as a JSON array.
         """
 
-        response = UnbiasedNewsTools._exa().search_and_contents(
-            query=question,
-            type="neural",
-            use_autoprompt=False,
-            num_results=5,
-            text=True,
-            summary=True,
+        # Near-identical questions (e.g., with the same words in a different order) are served from the search cache without a network call
+
+        search_params = {
+            "type": "neural",
+            "use_autoprompt": False,
+            "num_results": 5,
+            "text": True,
+            "summary": True,
+        }
+
+        response = search_cache.get_response(question, search_params)
+
+        if response is None:
+            response = dataclasses.asdict(
+                UnbiasedNewsTools._exa().search_and_contents(
+                    query=question,
+                    **search_params,
+                )
+            )
+
+            search_cache.set_response(question, search_params, response)
+
+        # Keep the full texts for the Exa full text tool, but list only compact records within the token budget
+        search_state = UnbiasedNewsTools._search_state()
+
+        for result in response.get("results", []):
+            if result.get("url") and result.get("text"):
+                search_state["texts"][result["url"]] = result["text"]
+
+        search_results = compact_search_results(
+            response,
+            token_budget=search_state["token_budget"],
+            seen_urls=search_state["seen_urls"],
         )
 
-        return response
+        # Tell the agent to stop searching as soon as it has enough URLs
+        quota = get_run_state().get("quota")
+
+        if quota is not None:
+            result_urls = [
+                result["url"]
+                for result in response.get("results", [])
+                if result.get("url")
+            ]
+
+            search_results += quota.note_search_results(result_urls)
+
+            # Start scraping the URLs the agent will most likely keep, waiting here if the scraping workers fall behind
+            scraping_pipeline = get_run_state().get("scraping_pipeline")
+
+            if scraping_pipeline is not None:
+                scraping_pipeline.submit_all(quota.candidates_of(result_urls))
+
+        return search_results
+
+    @staticmethod
+    def search_media_provider(
+        topic: str,
+        media_provider: dict,
+        num_results: int,
+        start_published_date: str = None,
+    ) -> list:
+        """
+        Searches the news articles of a single media provider on the given topic directly through Exa, without an LLM writing the query.
+
+        The search is restricted to the domain of the media provider and, optionally, to the articles published since the given date. Responses are served from the search cache when possible.
+
+        :param topic: The topic of the news.
+        :param media_provider: A dictionary with the "name" and "domain" of the media provider.
+        :param num_results: The number of search results to request.
+        :param start_published_date: Optional earliest published date of the articles in ISO 8601 format.
+        :return: The URLs of the articles on the domain of the media provider, ranked as by rank_news_urls.
+        """
+
+        query = news_query(topic)
+
+        search_params = {
+            "type": "neural",
+            "use_autoprompt": False,
+            "category": "news",
+            "num_results": num_results,
+            "include_domains": [normalize_domain(media_provider["domain"])],
+        }
+
+        if start_published_date:
+            search_params["start_published_date"] = start_published_date
+
+        with UnbiasedNewsTools._tracer().span(
+            "tool",
+            "Exa domain search",
+            media_provider=media_provider["name"],
+        ) as span:
+            response = search_cache.get_response(query, search_params)
+
+            span["attributes"]["cached"] = response is not None
+
+            if response is None:
+                response = dataclasses.asdict(
+                    UnbiasedNewsTools._exa().search(query=query, **search_params)
+                )
+
+                search_cache.set_response(query, search_params, response)
+
+            span["bytes_in"] = len(json.dumps(response, default=str).encode("utf-8"))
+
+            return rank_news_urls(response, media_provider["domain"])
+
+    @tool("Exa full text tool")
+    @traced_tool("Exa full text tool")
+    def exa_get_full_text_tool(
+        url: str,
+    ) -> str:
+        """
+        Returns the full text of a search result given its URL. Only use it if the summary of the result is not enough to decide whether the result is relevant.
+
+        :param url: The URL of the search result.
+        :return: The full text of the search result.
+        """
+
+        text = UnbiasedNewsTools._search_state()["texts"].get(url)
+
+        if text is None:
+            response = UnbiasedNewsTools._exa().get_contents([url], text=True)
+
+            text = response.results[0].text if response.results else ""
+
+        return text
 
     @tool("Firecrawl custom tool")
+    @traced_tool("Firecrawl custom tool")
     def firecrawl_scrape_tool(
         url: str,
     ) -> str:
         """
-        Scrapes the given URL and returns the HTML content.
+        Scrapes the given URL and returns the written content of the article on it.
 
         :param url: The URL to scrape.
-        :return: The HTML content of the scraped URL.
+        :return: The headline, byline, publish date and body of the article on the scraped URL.
         """
 
-        response = UnbiasedNewsTools._firecrawl().scrape_url(url)
+        response = UnbiasedNewsTools._scrape_url(url)
 
-        return response
+        # Reduce the page to its article, dropping navigation, links and footers
+        return format_article(
+            url,
+            extract_article(
+                response.get("markdown", ""),
+                response.get("metadata", {}),
+            ),
+        )
+
+    @staticmethod
+    def bulk_scrape_urls(
+        urls: list,
+        max_workers: int = DEFAULT_SCRAPING_WORKERS,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    ):
+        """
+        Scrapes all given URLs directly through Firecrawl and yields every page as soon as it finishes.
+
+        Cached pages are yielded first without a network call. The remaining URLs are submitted concurrently as jobs over one pooled HTTP session, with at most per_host_limit pages from the same host at a time.
+
+        :param urls: The URLs to scrape. Duplicate URLs are scraped once.
+        :param max_workers: The maximum number of pages scraped at the same time.
+        :param per_host_limit: The maximum number of pages scraped at the same time from the same host.
+        :return: A generator of dictionaries with the "url" and either the "content", "metadata" and extracted "article" or the "error" of each URL, in the order the pages finish.
+        """
+
+        tracer = UnbiasedNewsTools._tracer()
+
+        uncached_urls = []
+
+        for url in dict.fromkeys(urls):
+            start_time = time.time()
+
+            cached_page = scrape_cache.get_page(url)
+
+            if cached_page is None:
+                uncached_urls.append(url)
+
+                continue
+
+            markdown, metadata = cached_page
+
+            tracer.record(
+                "tool",
+                "Scrape cache",
+                start=start_time,
+                wall_ms=int((time.time() - start_time) * 1000),
+                bytes_in=len(markdown.encode("utf-8")),
+            )
+
+            yield {
+                "url": url,
+                "content": markdown,
+                "metadata": json.loads(metadata or "{}"),
+                "article": extract_article(markdown, json.loads(metadata or "{}")),
+                "cached": True,
+            }
+
+        if not uncached_urls:
+            return
+
+        for scraped_page in UnbiasedNewsTools._firecrawl().scrape_urls(
+            uncached_urls,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+        ):
+            tracer.record(
+                "tool",
+                "Firecrawl bulk scrape",
+                start=time.time() - scraped_page["elapsed_ms"] / 1000,
+                wall_ms=scraped_page["elapsed_ms"],
+                bytes_in=len(scraped_page.get("content", "").encode("utf-8")),
+                error=scraped_page.get("error"),
+            )
+
+            # Only cache pages that actually have content
+            if scraped_page.get("content"):
+                scrape_cache.set_page(
+                    scraped_page["url"],
+                    scraped_page["content"],
+                    json.dumps(scraped_page.get("metadata", {})),
+                )
+
+            # Reduce the page to its article, keeping the whole page in the cache
+            if "content" in scraped_page:
+                scraped_page["article"] = extract_article(
+                    scraped_page["content"],
+                    scraped_page.get("metadata", {}),
+                )
+
+            yield scraped_page
+
+    @staticmethod
+    def scrape_urls(urls: list, max_workers: int = DEFAULT_SCRAPING_WORKERS) -> list:
+        """
+        Scrapes all given URLs directly through Firecrawl, without an LLM deciding which URL to scrape next.
+
+        This is the blocking form of bulk_scrape_urls. A URL that fails to scrape is returned with an error instead of the content, so one broken page doesn't stop the whole stage.
+
+        :param urls: The URLs to scrape.
+        :param max_workers: The maximum number of URLs scraped at the same time.
+        :return: A list of dictionaries with the "url" and either the "content" or the "error" of each URL, in the order of the given URLs.
+        """
+
+        scraped_pages = {
+            scraped_page["url"]: scraped_page
+            for scraped_page in UnbiasedNewsTools.bulk_scrape_urls(
+                urls,
+                max_workers=max_workers,
+            )
+        }
+
+        return [scraped_pages[url] for url in dict.fromkeys(urls)]
+
+    @staticmethod
+    def scrape_page(url: str) -> dict:
+        """
+        Scrapes a single URL directly through Firecrawl, e.g., as a job of the scraping pipeline.
+
+        :param url: The URL to scrape.
+        :return: A dictionary as returned by scrape_urls.
+        """
+
+        return UnbiasedNewsTools.scrape_urls([url], max_workers=1)[0]
 
     @staticmethod
     def get_all_search_tools():
         """
         Returns all search tools available.
 
-        :return: A list of search tools, currently only ExaSearchAndGetContentsTool.
+        :return: A list of search tools, currently ExaSearchAndGetContentsTool and ExaGetFullTextTool.
         """
 
-        return [UnbiasedNewsTools.exa_search_and_get_contents_tool]
+        return [
+            UnbiasedNewsTools.exa_search_and_get_contents_tool,
+            UnbiasedNewsTools.exa_get_full_text_tool,
+        ]
 
     @staticmethod
     def get_all_scraping_tools():
@@ -0,0 +1,575 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+from utils.ratelimit import render_metrics as render_rate_limit_metrics
+import json
+import os
+import threading
+import time
+import uuid
+
+# Default location of the exported spans, one JSON object per line
+DEFAULT_TRACE_PATH = os.path.join(".cache", "traces.jsonl")
+
+# Default maximum size of the exported spans in bytes. Once an export would exceed it, the file is moved to a ".1" backup, replacing the previous one
+DEFAULT_TRACE_MAX_BYTES = 32 * 1024 * 1024
+
+# Lock serializing the exports of concurrent runs, so their lines don't interleave and only one of them rotates the file
+_export_lock = threading.Lock()
+
+# Default port of the Prometheus metrics endpoint, overridden by the CREW_NEWS_METRICS_PORT environment variable
+DEFAULT_METRICS_PORT = 9464
+
+# Numeric fields every span records
+SPAN_FIELDS = (
+    "wall_ms",
+    "prompt_tokens",
+    "completion_tokens",
+    "bytes_in",
+    "bytes_out",
+    "retries",
+)
+
+
+def _empty_group() -> dict:
+    """
+    Returns an empty group of spans.
+
+    :return: A dictionary with the number of calls, errors and every numeric field set to zero.
+    """
+
+    return {"calls": 0, "errors": 0, **{field: 0 for field in SPAN_FIELDS}}
+
+
+def _add_to_group(group: dict, span: dict):
+    """
+    Adds a span to a group of spans.
+
+    :param group: The group, as returned by _empty_group.
+    :param span: The span.
+    """
+
+    group["calls"] += 1
+    group["errors"] += 1 if span.get("error") else 0
+
+    for field in SPAN_FIELDS:
+        group[field] += span.get(field, 0)
+
+
+class SpanMetrics:
+    def __init__(self):
+        """
+        Initializes the process-wide aggregates of all finished spans, grouped by kind and name, exposed in the Prometheus text format. LLM calls are also aggregated by model tier, under the kind "llm_tier".
+
+        :return: An instance of SpanMetrics.
+        """
+
+        self._lock = threading.Lock()
+        self._aggregates = defaultdict(lambda: defaultdict(int))
+
+    def observe(self, span: dict):
+        """
+        Adds a finished span to the aggregates.
+
+        :param span: The finished span.
+        """
+
+        keys = [(span["kind"], span["name"])]
+
+        if span["kind"] == "llm" and span["attributes"].get("tier"):
+            keys.append(("llm_tier", span["attributes"]["tier"]))
+
+        with self._lock:
+            for key in keys:
+                aggregate = self._aggregates[key]
+
+                aggregate["count"] += 1
+                aggregate["errors"] += 1 if span.get("error") else 0
+
+                for field in SPAN_FIELDS:
+                    aggregate[field] += span.get(field, 0)
+
+    def render(self) -> str:
+        """
+        Renders the aggregates in the Prometheus text exposition format.
+
+        :return: The metrics as text.
+        """
+
+        with self._lock:
+            aggregates = {
+                key: dict(aggregate) for key, aggregate in self._aggregates.items()
+            }
+
+        metrics = [
+            ("crew_news_span_seconds", "summary", "Wall time of traced spans."),
+            ("crew_news_span_prompt_tokens_total", "counter", "Prompt tokens."),
+            ("crew_news_span_completion_tokens_total", "counter", "Completion tokens."),
+            ("crew_news_span_bytes_in_total", "counter", "Bytes received."),
+            ("crew_news_span_bytes_out_total", "counter", "Bytes sent."),
+            ("crew_news_span_retries_total", "counter", "Retries."),
+            ("crew_news_span_errors_total", "counter", "Spans that failed."),
+        ]
+
+        lines = []
+
+        for metric, metric_type, description in metrics:
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+
+            for (kind, name), aggregate in sorted(aggregates.items()):
+                labels = 'kind="{}",name="{}"'.format(
+                    kind, name.replace("\\", "\\\\").replace('"', '\\"')
+                )
+
+                if metric == "crew_news_span_seconds":
+                    lines.append(f"{metric}_count{{{labels}}} {aggregate['count']}")
+                    lines.append(
+                        f"{metric}_sum{{{labels}}} {aggregate['wall_ms'] / 1000:.3f}"
+                    )
+                else:
+                    field = metric[len("crew_news_span_") :].removesuffix("_total")
+
+                    lines.append(f"{metric}{{{labels}}} {aggregate[field]}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Initialize the span metrics, shared by all sessions
+span_metrics = SpanMetrics()
+
+
+class Tracer:
+    def __init__(self):
+        """
+        Initializes a tracer that records the spans of a single run: stages, tasks, LLM calls and tool calls.
+
+        Every span records its wall time, prompt and completion tokens, bytes in and out, and retries. Finished spans are also added to the process-wide span metrics.
+
+        :return: An instance of Tracer.
+        """
+
+        self.trace_id = uuid.uuid4().hex
+
+        self._spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        """
+        Records a span around the wrapped block. The block can add tokens, bytes and retries to the yielded span.
+
+        :param kind: The kind of the span, e.g., "stage", "task", "llm" or "tool".
+        :param name: The name of the span, e.g., the role of the agent or the name of the tool.
+        :param attributes: Optional attributes of the span.
+        :return: A context manager yielding the span as a dictionary.
+        """
+
+        stack = self._local.__dict__.setdefault("stack", [])
+
+        span = self._new_span(kind, name, stack[-1]["span_id"] if stack else None)
+        span["attributes"] = attributes
+
+        stack.append(span)
+
+        start_time = time.time()
+
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = str(e)
+
+            raise
+        finally:
+            stack.pop()
+
+            span["start"] = start_time
+            span["wall_ms"] = int((time.time() - start_time) * 1000)
+
+            self._finish(span)
+
+    def record(self, kind: str, name: str, start: float, wall_ms: int, **fields):
+        """
+        Records a span that was measured elsewhere, e.g., a page scraped by a worker of the bulk scraper.
+
+        :param kind: The kind of the span.
+        :param name: The name of the span.
+        :param start: The start time of the span.
+        :param wall_ms: The wall time of the span in milliseconds.
+        :param fields: Optional numeric fields (e.g., bytes_in), "error" and "attributes" of the span.
+        """
+
+        span = self._new_span(kind, name, None)
+        span.update(fields)
+        span["start"] = start
+        span["wall_ms"] = wall_ms
+
+        self._finish(span)
+
+    def task_callback(self):
+        """
+        Returns a task callback for a crew that records a span per finished task.
+
+        A task starts when the crew is kicked off or when the previous task of the crew finished, so the callback must be created right before the crew is kicked off.
+
+        :return: A function taking a TaskOutput.
+        """
+
+        last_finished = [time.time()]
+
+        def callback(task_output):
+            now = time.time()
+
+            self.record(
+                "task",
+                task_output.agent,
+                start=last_finished[0],
+                wall_ms=int((now - last_finished[0]) * 1000),
+                bytes_out=len(task_output.description.encode("utf-8")),
+                bytes_in=len((task_output.raw or "").encode("utf-8")),
+            )
+
+            last_finished[0] = now
+
+        return callback
+
+    @property
+    def spans(self) -> list:
+        """
+        The finished spans of the run.
+
+        :return: A list of span dictionaries in the order they finished.
+        """
+
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self) -> list:
+        """
+        Returns the spans of the run grouped by kind and name, slowest first.
+
+        :return: A list of dictionaries with the kind, name, number of calls, errors and the summed numeric fields of each group.
+        """
+
+        groups = {}
+
+        for span in self.spans:
+            group = groups.setdefault(
+                (span["kind"], span["name"]),
+                {"kind": span["kind"], "name": span["name"], **_empty_group()},
+            )
+
+            _add_to_group(group, span)
+
+        return sorted(groups.values(), key=lambda group: group["wall_ms"], reverse=True)
+
+    def summary_by(self, attribute: str, kind: str = "llm") -> dict:
+        """
+        Returns the spans of the given kind grouped by one of their attributes, e.g., the model tier of the LLM calls.
+
+        :param attribute: The name of the attribute, e.g., "tier".
+        :param kind: The kind of the spans.
+        :return: A dictionary with the number of calls, errors and the summed numeric fields by value of the attribute. Spans without the attribute are left out.
+        """
+
+        groups = {}
+
+        for span in self.spans:
+            value = span["attributes"].get(attribute)
+
+            if span["kind"] != kind or value is None:
+                continue
+
+            _add_to_group(groups.setdefault(value, _empty_group()), span)
+
+        return groups
+
+    def timeline(self, kind: str = "stage") -> list:
+        """
+        Returns the spans of the given kind as a timeline of the run, so overlapping stages can be seen.
+
+        :param kind: The kind of the spans.
+        :return: A list of dictionaries with the name of every span (with its media provider, if any), and its start and end in milliseconds since the first span started, ordered by start.
+        """
+
+        spans = [span for span in self.spans if span["kind"] == kind]
+
+        if not spans:
+            return []
+
+        run_start = min(span["start"] for span in spans)
+
+        timeline = []
+
+        for span in sorted(spans, key=lambda span: span["start"]):
+            start_ms = int((span["start"] - run_start) * 1000)
+
+            media_provider = span["attributes"].get("media_provider")
+
+            timeline.append(
+                {
+                    "name": (
+                        f"{span['name']} ({media_provider})"
+                        if media_provider
+                        else span["name"]
+                    ),
+                    "start_ms": start_ms,
+                    "end_ms": start_ms + span["wall_ms"],
+                }
+            )
+
+        return timeline
+
+    def export_jsonl(
+        self, path: str = DEFAULT_TRACE_PATH, max_bytes: int = DEFAULT_TRACE_MAX_BYTES
+    ):
+        """
+        Appends the spans of the run to a JSON-lines file, in a single write.
+
+        If the spans would grow the file beyond max_bytes, the file is moved to a ".1" backup first, so the exported spans take at most twice max_bytes.
+
+        :param path: The path of the JSON-lines file.
+        :param max_bytes: The maximum size of the file in bytes.
+        """
+
+        lines = "".join(json.dumps(span, default=str) + "\n" for span in self.spans)
+
+        if not lines:
+            return
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with _export_lock:
+            # Rotate the file if the spans of the run don't fit anymore
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+
+            if size and size + len(lines.encode("utf-8")) > max_bytes:
+                os.replace(path, f"{path}.1")
+
+            with open(path, "a", encoding="utf-8") as file:
+                file.write(lines)
+
+    def _new_span(self, kind: str, name: str, parent_id: str) -> dict:
+        """
+        Returns a new span with all numeric fields set to zero.
+
+        :param kind: The kind of the span.
+        :param name: The name of the span.
+        :param parent_id: The ID of the enclosing span on the same thread, or None.
+        :return: The span as a dictionary.
+        """
+
+        return {
+            "trace_id": self.trace_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent_id,
+            "kind": kind,
+            "name": name,
+            "thread": threading.current_thread().name,
+            **{field: 0 for field in SPAN_FIELDS},
+            "error": None,
+            "attributes": {},
+        }
+
+    def _finish(self, span: dict):
+        """
+        Stores a finished span and adds it to the span metrics.
+
+        :param span: The finished span.
+        """
+
+        with self._lock:
+            self._spans.append(span)
+
+        span_metrics.observe(span)
+
+
+class LLMTracingHandler(BaseCallbackHandler):
+    def __init__(self, tracer: Tracer, name: str, attributes: dict = None):
+        """
+        Initializes a LangChain callback handler that records a span per LLM call.
+
+        :param tracer: The tracer of the run.
+        :param name: The name of the spans, e.g., the role of the agent the LLM belongs to.
+        :param attributes: Optional attributes of every span, e.g., the model and its tier.
+
+        :return: An instance of LLMTracingHandler.
+        """
+
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes or {}
+
+        self._calls = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        """
+        Starts the span of a chat completion.
+        """
+
+        self._calls[run_id] = {
+            "start": time.time(),
+            "bytes_out": sum(
+                len(str(message.content).encode("utf-8"))
+                for message_list in messages
+                for message in message_list
+            ),
+            "retries": 0,
+            "streamed": False,
+        }
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        """
+        Marks the LLM call as streamed.
+        """
+
+        if run_id in self._calls:
+            self._calls[run_id]["streamed"] = True
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        """
+        Counts a retry of the LLM call.
+        """
+
+        if run_id in self._calls:
+            self._calls[run_id]["retries"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        """
+        Finishes the span of a completion with its token usage and size.
+        """
+
+        call = self._calls.pop(run_id, None)
+
+        if call is None:
+            return
+
+        generations = [
+            generation
+            for generation_list in response.generations
+            for generation in generation_list
+        ]
+
+        # Take the token usage from the API response, or from the usage metadata of streamed completions
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+
+        if not token_usage:
+            for generation in generations:
+                usage_metadata = (
+                    getattr(
+                        getattr(generation, "message", None), "usage_metadata", None
+                    )
+                    or {}
+                )
+
+                prompt_tokens += usage_metadata.get("input_tokens", 0)
+                completion_tokens += usage_metadata.get("output_tokens", 0)
+
+        # Mark completions served from the completion cache, whose tokens were not sent to the API
+        cached = any(
+            getattr(generation, "message", None) is not None
+            and generation.message.response_metadata.get("cached")
+            for generation in generations
+        )
+
+        self.tracer.record(
+            "llm",
+            self.name,
+            start=call["start"],
+            wall_ms=int((time.time() - call["start"]) * 1000),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            bytes_out=call["bytes_out"],
+            bytes_in=sum(
+                len(generation.text.encode("utf-8")) for generation in generations
+            ),
+            retries=call["retries"],
+            attributes={
+                **self.attributes,
+                "cached": cached,
+                "streamed": call["streamed"],
+            },
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        """
+        Finishes the span of a failed completion.
+        """
+
+        call = self._calls.pop(run_id, None)
+
+        if call is None:
+            return
+
+        self.tracer.record(
+            "llm",
+            self.name,
+            start=call["start"],
+            wall_ms=int((time.time() - call["start"]) * 1000),
+            bytes_out=call["bytes_out"],
+            retries=call["retries"],
+            error=str(error),
+            attributes=dict(self.attributes),
+        )
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        """
+        Serves the span and rate limit metrics on /metrics.
+        """
+
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+
+            return
+
+        body = (span_metrics.render() + render_rate_limit_metrics()).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """
+        Keeps scrapes of the endpoint out of the Streamlit logs.
+        """
+
+
+@lru_cache(maxsize=None)
+def start_metrics_server(port: int = None, host: str = "127.0.0.1"):
+    """
+    Starts the Prometheus metrics endpoint on http://<host>:<port>/metrics in a background thread, once per process.
+
+    :param port: Optional port, defaults to the CREW_NEWS_METRICS_PORT environment variable or DEFAULT_METRICS_PORT.
+    :param host: The host to listen on.
+    :return: The running ThreadingHTTPServer, or None if the port is already taken.
+    """
+
+    if port is None:
+        port = int(os.environ.get("CREW_NEWS_METRICS_PORT", DEFAULT_METRICS_PORT))
+
+    try:
+        metrics_server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    except OSError:
+        return None
+
+    threading.Thread(
+        target=metrics_server.serve_forever,
+        name="metrics-server",
+        daemon=True,
+    ).start()
+
+    return metrics_server